@@ -0,0 +1,574 @@
+# -*- coding: utf-8 -*-
+
+import Layout
+import Screenshot
+
+from os import makedirs
+from Capture import list_screenshots
+from time import perf_counter, sleep
+from statistics import mean, median
+from argparse import ArgumentParser
+
+def print_timings(label, timings):
+    # Timings are in seconds, printed in milliseconds
+    print(f"{label:<24}{len(timings):>6} runs   mean {mean(timings)*1000:>9.2f}ms   median {median(timings)*1000:>9.2f}ms   max {max(timings)*1000:>9.2f}ms")
+
+def benchmark_ocr(path_directory, backends):
+    # Per-question OCR latency (question + three answers) for each backend
+    from Quiz import Question
+
+    screenshots = [Screenshot.load_image(path) for path in list_screenshots(path_directory)]
+    if not screenshots:
+        exit(f"No Question-N.png found in {path_directory}")
+
+    for name in backends:
+        # Engines are created here, outside of the measured loop
+        Screenshot.set_ocr_backend(name)
+        timings = list()
+        for screenshot in screenshots:
+            start = perf_counter()
+            question = Question(Screenshot.extract_question(screenshot))
+            for position in range(3):
+                Screenshot.extract_answer(screenshot, question, position)
+            timings.append(perf_counter() - start)
+        print_timings(name, timings)
+    Screenshot.ocr_backend.close()
+
+def benchmark_http(num_questions, delay):
+    # Latency of the four searches of a question (plain + three concat) through
+    # a fresh urlopen for each request, as before, and through the pooled client
+    import Scraping
+    import LocalServer
+    from urllib.request import Request, urlopen
+    from concurrent.futures import ThreadPoolExecutor
+
+    server = LocalServer.start(delay=delay)
+    Scraping.google_url = LocalServer.search_url(server)
+    urls = [
+        [Scraping.define_url(f"Domanda numero {i}", answer) for answer in (None, "prima", "seconda", "terza")]
+        for i in range(num_questions)
+    ]
+
+    def fetch_urlopen(url):
+        return urlopen(Request(url, headers=Scraping.headers)).read()
+
+    pool = ThreadPoolExecutor(max_workers=Screenshot.OCR_POOL_SIZE)
+    for label, fetch in (("urlopen", fetch_urlopen), ("pooled client", Scraping.client.get)):
+        sequential, concurrent = list(), list()
+        for question_urls in urls:
+            start = perf_counter()
+            for url in question_urls:
+                fetch(url)
+            sequential.append(perf_counter() - start)
+            start = perf_counter()
+            list(pool.map(fetch, question_urls))
+            concurrent.append(perf_counter() - start)
+        print_timings(f"{label} (serial)", sequential)
+        print_timings(f"{label} (threads)", concurrent)
+    pool.shutdown()
+    server.shutdown()
+
+def benchmark_hedge(num_searches, delay, tail, tail_delay, rate):
+    # Search latency against a local server where a <tail> fraction of the replies
+    # is <tail_delay> seconds late: every search sent once, against searches hedged
+    # to a second local server, a mirror with the same latencies
+    import Search
+    import Scraping
+    import LocalServer
+
+    server = LocalServer.start(delay=delay, tail=tail, tail_delay=tail_delay)
+    mirror = LocalServer.start(delay=delay, tail=tail, tail_delay=tail_delay)
+    for label, hedge in (("single request", False), ("hedged", True)):
+        providers = [Search.local(server, rate), Search.local(mirror, rate, name="mirror")]
+        backend = Search.SearchBackend(providers, hedge=hedge, hedge_delay=tail_delay / 2)
+        # Searches one after another, each question gives no time to recover from a slow reply
+        for i in range(num_searches):
+            backend.get(Scraping.client, Scraping.define_url(f"{label} numero {i}"))
+        print(f"\n{label}")
+        print(backend.stats())
+        backend.close()
+    server.shutdown()
+    mirror.shutdown()
+
+def benchmark_planner(num_questions, sessions, delay, rate):
+    # Decision latency and requests of each question against a local server, rate limited
+    # like a real search engine, with <sessions> questions at a time: every query fired at
+    # once (Scheduler.Speculation) against the plan of Planner, here always the OR query
+    # (the canned pages never match the answers)
+    import Search
+    import Planner
+    import Sanitize
+    import Scraping
+    import Scheduler
+    import LocalServer
+    from Quiz import Question
+    from concurrent.futures import ThreadPoolExecutor
+
+    Sanitize.set_language("ita")
+    server = LocalServer.start(delay=delay)
+    Scraping.set_client(max_connections_per_host=4 * sessions)
+    model = Planner.CostModel({"matches": {}, "no_matches": {"or": {"samples": 1, "accuracy": 1.0, "requests": 1}}}, min_samples=1)
+
+    def decide(label, pool, index):
+        question = Question(f"{label} domanda numero {index}")
+        for position in range(3):
+            question.add_answer(f"risposta {position}", f"risposta {position}", position)
+        start = perf_counter()
+        speculation = Planner.PlannedSearch(pool, question, model) if label == "planned" else Scheduler.Speculation(pool, question)
+        speculation.result()
+        return perf_counter() - start, speculation.requests
+
+    for label in ("speculation", "planned"):
+        Scraping.backend = Search.SearchBackend([Search.local(server, rate)], hedge=False)
+        pool = ThreadPoolExecutor(max_workers=4 * sessions)
+        with ThreadPoolExecutor(max_workers=sessions) as questions:
+            results = list(questions.map(lambda index: decide(label, pool, index), range(num_questions)))
+        pool.shutdown()
+        Scraping.backend.close()
+        print_timings(label, [elapsed for elapsed, _ in results])
+        print(f"{'':<24}{sum(requests for _, requests in results) / num_questions:.2f} requests per question")
+    Scraping.backend = None
+    server.shutdown()
+
+def first_decision(command):
+    # Seconds from starting the <command> to the first decided question, when its
+    # "Search:" line is printed: enter for the first question, 1 as its correct answer, then exit
+    import subprocess
+    from os import environ
+
+    start = perf_counter()
+    process = subprocess.Popen(
+        command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        env={**environ, "PYTHONUNBUFFERED": "1"}, text=True
+    )
+    process.stdin.write("\n1\ne\n")
+    process.stdin.flush()
+    elapsed = None
+    for line in process.stdout:
+        if elapsed is None and "Search:" in line:
+            elapsed = perf_counter() - start
+    process.wait()
+    if elapsed is None:
+        raise RuntimeError(f"{' '.join(command)} exited without deciding a question")
+    return elapsed
+
+def benchmark_startup(path_directory, repeat, offline):
+    # Time from the command line to the first decided question of a replayed quiz:
+    # Main.py importing and warming up everything each time, against Client.py and a warm Daemon.py
+    import sys
+    import socket
+    import subprocess
+    from os.path import join, dirname
+    from tempfile import mkdtemp
+
+    source = dirname(__file__)
+    flags = ["--offline"] if offline else []
+    cold = [sys.executable, join(source, "Main.py"), "-d", path_directory, "-n", "1"] + flags
+    print_timings("Main.py (cold)", [first_decision(cold) for _ in range(repeat)])
+
+    socket_path = join(mkdtemp(), "Daemon.sock")
+    start = perf_counter()
+    daemon = subprocess.Popen([sys.executable, join(source, "Daemon.py"), "--socket", socket_path] + flags, stdout=subprocess.DEVNULL)
+    # Ready when it accepts connections
+    while True:
+        try:
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            probe.connect(socket_path)
+            probe.close()
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            if daemon.poll() is not None:
+                raise RuntimeError("the daemon did not start")
+            sleep(0.01)
+    print(f"{'Daemon.py start':<24}{(perf_counter() - start)*1000:>9.2f}ms, once")
+    warm = [sys.executable, join(source, "Client.py"), "--socket", socket_path, "-d", path_directory, "-n", "1"]
+    print_timings("Client.py (warm)", [first_decision(warm) for _ in range(repeat)])
+    subprocess.run([sys.executable, join(source, "Client.py"), "--socket", socket_path, "--shutdown"])
+    daemon.wait()
+
+def benchmark_parse(path_directory, repeat):
+    # Parse time and peak memory per result page, PyQuery DOM against the streaming extractor
+    import Extract
+    import Scraping
+    import tracemalloc
+    from glob import glob
+
+    pages = [open(path, "rb").read() for path in sorted(glob(f"{path_directory}/*.html"))]
+    if not pages:
+        exit(f"No .html page found in {path_directory}")
+
+    for label, extract in (("pyquery", Scraping.extract_results_pyquery), ("streaming lxml", Extract.extract)):
+        timings, peaks = list(), list()
+        for page in pages:
+            # Both must extract exactly the same results
+            if extract(page) != Scraping.extract_results_pyquery(page):
+                print(f"{label}: different results!")
+            for _ in range(repeat):
+                start = perf_counter()
+                extract(page)
+                timings.append(perf_counter() - start)
+            tracemalloc.start()
+            extract(page)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        print_timings(label, timings)
+        # Reminder: tracemalloc only sees the Python heap, not what libxml2 allocates for the DOM
+        print(f"{'':<24}peak Python heap per page: mean {mean(peaks)/1024:.1f}KiB, max {max(peaks)/1024:.1f}KiB")
+
+def legacy_clean(question_text, answers_text):
+    # The cleaning as it was before Sanitize.Normalizer: one str.replace for each
+    # OCR error, uncompiled regexes and stopwords removed from lists, kept as baseline
+    from re import search
+    from Sanitize import load_profile
+    profile = load_profile("ita")
+
+    def fix(text):
+        for find, replace in profile["ocr_common_errors"].items():
+            text = text.replace(find, replace)
+        return text
+
+    text = fix(question_text).replace("come si chiama", "nome")
+    four_digit_match = search(r"\d{4}7", text)
+    if four_digit_match:
+        span = four_digit_match.span()
+        text = text[:span[0]] + str(text[span[0]:span[1]].replace('7','')) + text[span[1]:]
+    accent_match = search(r"\s(é|è)[a-zA-Zèé]+", text)
+    if accent_match:
+        span = accent_match.span()
+        text = text[:span[0] + 2] + ' ' + text[span[0] + 2:]
+    words = text.split(' ')
+    for word in words[:]:
+        if word in profile["question_stopwords"]:
+            words.remove(word)
+
+    answers = list()
+    for answer in answers_text:
+        if answer == '':
+            answers.append("OCR Failed")
+            continue
+        answer_words = fix(answer).split(' ')
+        for word in answer_words[:]:
+            if word in profile["answer_stopwords"]:
+                answer_words.remove(word)
+        answers.append(' '.join(answer_words))
+    return ' '.join(words), answers
+
+def benchmark_sanitize(repeat):
+    # Time to clean a question and its three answers, before and after the compiled normalizer
+    import Sanitize
+
+    samples = [
+        ("Qual è la città più popolosa\ndel mondo nel 20197", ["tokyo", "la nuova delhi", "shanghai"]),
+        ("Chi ha scritto \"I promessi sposi\"?", ["alessandro manzoni", "ugo foscolo", "giacomo leopardi"]),
+        ("Quale di questi NON è un fiume\nitaliano?", ["il po", "la senna", "l'adige"]),
+        ("Come si chiama il cane di Topolino?", ["pluto", "pippo", ""]),
+    ]
+    normalizer = Sanitize.normalizer
+    different = sum(legacy_clean(*sample) != normalizer.clean(*sample) for sample in samples)
+    print(f"{different} of {len(samples)} samples cleaned differently")
+
+    for label, clean in (("str.replace chain", legacy_clean), ("compiled normalizer", normalizer.clean)):
+        timings = list()
+        for _ in range(repeat):
+            for sample in samples:
+                start = perf_counter()
+                clean(*sample)
+                timings.append(perf_counter() - start)
+        print_timings(label, timings)
+
+def benchmark_knowledge(num_questions, num_lookups):
+    # Build and lookup time of the knowledge base, on a synthetic archive
+    # of <num_questions> questions of 8-14 words
+    import Knowledge
+    from random import Random
+    from tempfile import TemporaryDirectory
+
+    random = Random(42)
+    vocabulary = [f"parola{index}" for index in range(20_000)]
+    archive = [
+        (' '.join(random.sample(vocabulary, random.randint(8, 14))), random.sample(vocabulary, 3), random.randrange(3))
+        for _ in range(num_questions)
+    ]
+
+    with TemporaryDirectory() as directory:
+        knowledge_base = Knowledge.KnowledgeBase(f"{directory}/Knowledge.sqlite")
+        start = perf_counter()
+        for question, answers, correct in archive:
+            knowledge_base.add(question, answers, correct)
+        knowledge_base.connection.commit()
+        print(f"Index of {len(knowledge_base)} questions built in {perf_counter() - start:.2f}s")
+
+        # The same question, a question with a word less, a question never seen
+        samples = random.sample(archive, num_lookups)
+        lookups = {
+            "exact": [question for question, _, _ in samples],
+            "near duplicate": [' '.join(question.split()[1:]) for question, _, _ in samples],
+            "miss": [' '.join(random.sample(vocabulary, 10)) for _ in range(num_lookups)],
+        }
+        for label, questions in lookups.items():
+            timings, hits = list(), 0
+            for question in questions:
+                start = perf_counter()
+                hits += knowledge_base.find(question) is not None
+                timings.append(perf_counter() - start)
+            print_timings(f"{label} ({hits} hits)", timings)
+        knowledge_base.close()
+
+def benchmark_reports(num_quizzes):
+    # Time to append each question to the report, and to load the reports
+    # of <num_quizzes> synthetic quizzes of 12 questions, row by row with
+    # csv.DictReader against the columnar Report.load_reports
+    import tracemalloc
+    from csv import DictReader
+    from random import Random
+    from Quiz import CSV_HEADERS
+    from Report import ReportWriter, load_reports
+    from tempfile import TemporaryDirectory
+
+    random = Random(42)
+    words = [f"parola{index}" for index in range(2_000)]
+    with TemporaryDirectory() as directory:
+        directories, timings = list(), list()
+        for quiz in range(num_quizzes):
+            path_directory = f"{directory}/{quiz}"
+            makedirs(path_directory)
+            directories.append(path_directory)
+            writer = ReportWriter(f"{path_directory}/Report.csv", CSV_HEADERS)
+            for _ in range(12):
+                answers = random.sample(words, 3)
+                row = [' '.join(random.sample(words, 10)), *answers, ' '.join(random.sample(words, 6)), *answers,
+                       random.randint(1, 3), random.randint(1, 3), True, False,
+                       *(random.randrange(10**8) for _ in range(3)), False, "complete"]
+                start = perf_counter()
+                writer.append(row)
+                timings.append(perf_counter() - start)
+            writer.close()
+        print_timings("append (batched fsync)", timings)
+
+        def dict_reader(directories):
+            rows = list()
+            for path_directory in directories:
+                with open(f"{path_directory}/Report.csv", newline='') as report_file:
+                    rows.extend(DictReader(report_file))
+            return rows
+
+        for label, load in (("csv.DictReader", dict_reader), ("Report.load_reports", load_reports)):
+            start = perf_counter()
+            load(directories)
+            elapsed = perf_counter() - start
+            # Memory is measured apart, tracemalloc slows down the allocations
+            tracemalloc.start()
+            reports = load(directories)
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del reports
+            print(f"{label:<24}{num_quizzes * 12:>6} rows   {elapsed*1000:>9.1f}ms   {size / 2**20:>7.1f}MB")
+
+def benchmark_model(num_questions):
+    # Memory to hold <num_questions> questions with their answers: the old
+    # dict-backed objects, the slotted Question and Answer, and a QuestionBatch
+    import tracemalloc
+    from random import Random
+    from Quiz import Question, QuestionBatch
+
+    class LegacyAnswer:
+        def __init__(self, text, cleaned_text):
+            self.text, self.cleaned_text = text, cleaned_text
+            self.score = self.matches = self.results = self.total_results = 0
+
+    class LegacyQuestion:
+        def __init__(self, text):
+            self.text = text
+            self.cleaned_text = str()
+            self.answers = [None] * 3
+            self.guessed_answer = self.correct_answer = int()
+            self.usual_question, self.one_match = True, False
+            self.stop_reason, self.shift = str(), 0
+
+        def add_answer(self, text, cleaned_text, position):
+            self.answers[position] = LegacyAnswer(text, cleaned_text)
+
+    random = Random(42)
+    words = [f"parola{index}" for index in range(5_000)]
+    # The texts are the same for every container, only the containers are measured
+    samples = [(' '.join(random.sample(words, 10)), random.sample(words, 3)) for _ in range(num_questions)]
+
+    def objects(question_class):
+        questions = list()
+        for text, answers in samples:
+            question = question_class(text)
+            for position, answer in enumerate(answers):
+                question.add_answer(answer, answer, position)
+            questions.append(question)
+        return questions
+
+    def batch():
+        questions = QuestionBatch()
+        for question in objects(Question):
+            questions.append(question)
+        return questions
+
+    for label, build in (("dict-backed objects", lambda: objects(LegacyQuestion)), ("slotted objects", lambda: objects(Question)), ("QuestionBatch", batch)):
+        tracemalloc.start()
+        start = perf_counter()
+        questions = build()
+        elapsed = perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del questions
+        print(f"{label:<24}{num_questions:>7} questions   {elapsed:>6.2f}s   {size / 2**20:>7.1f}MB   {size / num_questions:>6.0f} bytes/question")
+
+def benchmark_layout(path_directory):
+    # Time to find the answers' shift on each screenshot: counting the rows of the
+    # question from the pixels, against relocating a detected layout (see Layout)
+    screenshots = [Screenshot.load_image(path) for path in list_screenshots(path_directory)]
+    if not screenshots:
+        exit(f"No Question-N.png found in {path_directory}")
+    start = perf_counter()
+    profile = Layout.detect(screenshots[0], Screenshot.question_shift(screenshots[0]))
+    print(f"Layout detected in {(perf_counter() - start)*1000:.1f}ms")
+
+    for label, shift in (("rows of the question", Screenshot.question_shift), ("layout relocation", profile.relocate)):
+        timings = list()
+        for screenshot in screenshots:
+            start = perf_counter()
+            shift(screenshot)
+            timings.append(perf_counter() - start)
+        print_timings(label, timings)
+
+def benchmark_pipeline(path_directory, offline):
+    # Question-to-decision latency: reading the question, then the answers, then searching,
+    # against the Pipeline, where every stage starts as soon as its inputs are ready
+    import Cache
+    import Pipeline
+    import Sanitize
+    import Scraping
+    import Scheduler
+    from Quiz import Question
+    from concurrent.futures import ThreadPoolExecutor, wait
+
+    class ReplayQuiz:
+        def new_question(self, text):
+            return Question(text)
+
+    def sequential(pool, screenshot):
+        question = Question(Screenshot.extract_question(screenshot))
+        wait([pool.submit(Screenshot.extract_answer, screenshot, question, position) for position in range(3)])
+        Sanitize.clean_question(question)
+        return Scheduler.Speculation(pool, question).result()
+
+    def pipelined(pool, screenshot):
+        _, speculation = Pipeline.start(pool, ReplayQuiz(), screenshot)
+        return speculation.result()
+
+    screenshots = [Screenshot.load_image(path) for path in list_screenshots(path_directory)]
+    if not screenshots:
+        exit(f"No Question-N.png found in {path_directory}")
+    # Searches come from the cache (filled by the first run, if not offline), so only the pipeline is compared
+    Scraping.cache = Cache.SearchCache()
+    Scraping.offline = offline
+    Screenshot.set_ocr_backend()
+    pool = ThreadPoolExecutor(max_workers=Screenshot.OCR_POOL_SIZE)
+    for label, run in (("sequential", sequential), ("pipeline", pipelined)):
+        timings = list()
+        for screenshot in screenshots:
+            start = perf_counter()
+            run(pool, screenshot)
+            timings.append(perf_counter() - start)
+        print_timings(label, timings)
+    pool.shutdown()
+    Screenshot.ocr_backend.close()
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(prog="Benchmark", description="Micro-benchmarks of the hot paths of Guess the answer!")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    # OCR latency per question, on a saved quiz folder
+    ocr_parser = subparsers.add_parser("ocr", help="per-question OCR latency of each backend")
+    ocr_parser.add_argument("-d","--directory",required=True,type=str,help="path to a quiz folder")
+    ocr_parser.add_argument("-b","--backends",nargs='+',default=["pytesseract","tesserocr"],help="OCR backends to compare")
+
+    # Search latency per question, against the local stand-in server
+    http_parser = subparsers.add_parser("http", help="per-question search latency, urlopen vs pooled client")
+    http_parser.add_argument("-n","--questions",default=50,type=int,help="number of questions to simulate")
+    http_parser.add_argument("--delay",default=0.0,type=float,help="server think time, in seconds")
+
+    # Parse time and memory per result page, on the fixture corpus
+    parse_parser = subparsers.add_parser("parse", help="result page parsing, PyQuery vs streaming extractor")
+    parse_parser.add_argument("-d","--directory",default="fixtures/results",type=str,help="path to a folder of saved result pages")
+    parse_parser.add_argument("-r","--repeat",default=100,type=int,help="runs for each page")
+
+    # Time to clean a question and its answers
+    sanitize_parser = subparsers.add_parser("sanitize", help="question and answers cleaning, before and after the compiled normalizer")
+    sanitize_parser.add_argument("-r","--repeat",default=1000,type=int,help="runs for each sample")
+
+    # Question-to-decision latency, on a saved quiz folder
+    pipeline_parser = subparsers.add_parser("pipeline", help="question-to-decision latency, sequential stages vs Pipeline")
+    pipeline_parser.add_argument("-d","--directory",required=True,type=str,help="path to a quiz folder")
+    pipeline_parser.add_argument("--offline",action="store_true",help="answer every search from the cache only")
+
+    # Build and lookup time of the knowledge base of past questions
+    knowledge_parser = subparsers.add_parser("knowledge", help="knowledge base build and lookup time, on a synthetic archive")
+    knowledge_parser.add_argument("-n","--questions",default=50_000,type=int,help="number of questions in the archive")
+    knowledge_parser.add_argument("-l","--lookups",default=1000,type=int,help="lookups of each kind")
+
+    # Append and bulk load time of the reports
+    reports_parser = subparsers.add_parser("reports", help="report append latency and bulk loading, on synthetic quizzes")
+    reports_parser.add_argument("-n","--quizzes",default=1000,type=int,help="number of quizzes of 12 questions")
+
+    # Memory of the data model, with many questions
+    model_parser = subparsers.add_parser("model", help="memory of many questions: dict-backed, slotted objects and QuestionBatch")
+    model_parser.add_argument("-n","--questions",default=100_000,type=int,help="number of questions")
+
+    # Time to find the answers on a saved quiz folder
+    layout_parser = subparsers.add_parser("layout", help="answers' shift per screenshot, rows of the question vs layout relocation")
+    layout_parser.add_argument("-d","--directory",required=True,type=str,help="path to a quiz folder")
+
+    # Search tail latency, with and without hedged requests
+    hedge_parser = subparsers.add_parser("hedge", help="search tail latency, single requests vs hedged requests")
+    hedge_parser.add_argument("-n","--searches",default=300,type=int,help="number of searches")
+    hedge_parser.add_argument("--delay",default=0.02,type=float,help="server think time, in seconds")
+    hedge_parser.add_argument("--tail",default=0.02,type=float,help="fraction of slow replies")
+    hedge_parser.add_argument("--tail-delay",default=1.0,type=float,help="extra seconds of a slow reply")
+    hedge_parser.add_argument("--rate",default=None,type=float,help="requests per second of the token bucket")
+
+    # Decision latency and requests per question, with and without the query planner
+    planner_parser = subparsers.add_parser("planner", help="decision latency and requests per question, every query at once vs Planner")
+    planner_parser.add_argument("-n","--questions",default=100,type=int,help="number of questions")
+    planner_parser.add_argument("-s","--sessions",default=4,type=int,help="questions decided at the same time")
+    planner_parser.add_argument("--delay",default=0.05,type=float,help="server think time, in seconds")
+    planner_parser.add_argument("--rate",default=40,type=float,help="requests per second of the token bucket, 0 for no limit")
+
+    # Command line to first decision, cold start against the warm daemon
+    startup_parser = subparsers.add_parser("startup", help="command line to first decided question, Main.py vs Client.py and Daemon.py")
+    startup_parser.add_argument("-d","--directory",required=True,type=str,help="path to a quiz folder")
+    startup_parser.add_argument("-r","--repeat",default=5,type=int,help="runs of each command")
+    startup_parser.add_argument("--offline",action="store_true",help="answer every search from the cache only")
+
+    args = parser.parse_args()
+
+    if args.benchmark == "ocr":
+        benchmark_ocr(args.directory, args.backends)
+    elif args.benchmark == "http":
+        benchmark_http(args.questions, args.delay)
+    elif args.benchmark == "parse":
+        benchmark_parse(args.directory, args.repeat)
+    elif args.benchmark == "sanitize":
+        benchmark_sanitize(args.repeat)
+    elif args.benchmark == "pipeline":
+        benchmark_pipeline(args.directory, args.offline)
+    elif args.benchmark == "knowledge":
+        benchmark_knowledge(args.questions, args.lookups)
+    elif args.benchmark == "reports":
+        benchmark_reports(args.quizzes)
+    elif args.benchmark == "model":
+        benchmark_model(args.questions)
+    elif args.benchmark == "layout":
+        benchmark_layout(args.directory)
+    elif args.benchmark == "hedge":
+        benchmark_hedge(args.searches, args.delay, args.tail, args.tail_delay, args.rate)
+    elif args.benchmark == "planner":
+        benchmark_planner(args.questions, args.sessions, args.delay, args.rate)
+    elif args.benchmark == "startup":
+        benchmark_startup(args.directory, args.repeat, args.offline)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import json
+import sqlite3
+
+from time import time
+from hashlib import blake2b
+from threading import Lock
+from os import makedirs
+from os.path import dirname
+from collections import OrderedDict
+from numpy import ascontiguousarray
+
+# Default location of the search cache, shared by all the quizzes
+SEARCH_CACHE_PATH = "Quizzes/SearchCache.sqlite"
+# Default location of the OCR cache, shared by all the quizzes
+OCR_CACHE_PATH = "Quizzes/OCRCache.sqlite"
+
+
+class SearchCache:
+    # Persistent cache of the search results, keyed by the host and the normalized query
+    # (see Scraping.normalize_query).
+    # Only what the algorithm uses is stored: the text of the results and
+    # the number of total results, not the raw HTML of the page.
+    # Entries older than <ttl> seconds are stale, and when there are more than
+    # <max_entries> the least recently used ones are evicted.
+
+    def __init__(self, path=SEARCH_CACHE_PATH, ttl=7*24*60*60, max_entries=50_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = self.misses = 0
+        if dirname(path):
+            makedirs(dirname(path), exist_ok=True)
+        # A single connection shared by all the threads, serialized by the lock;
+        # other processes (see Evaluate) may be writing too, so wait for them
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS searches (
+                query TEXT PRIMARY KEY,
+                results TEXT NOT NULL,
+                total_results INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS searches_accessed ON searches (accessed)")
+        self.connection.commit()
+
+    def get(self, query):
+        # Return (results, total_results) or None if the query is missing or stale
+        now = time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT results, total_results FROM searches WHERE query = ? AND created >= ?",
+                (query, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute("UPDATE searches SET accessed = ? WHERE query = ?", (now, query))
+            self.connection.commit()
+        return json.loads(row[0]), row[1]
+
+    def put(self, query, results, total_results):
+        now = time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?)",
+                (query, json.dumps(results, ensure_ascii=False), total_results, now, now)
+            )
+            # Evict the least recently used entries over the size cap
+            self.connection.execute(
+                "DELETE FROM searches WHERE query IN ("
+                "SELECT query FROM searches ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self.connection.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0
+        return f"{self.hits} hits, {self.misses} misses ({hit_rate:.0f}% hit rate), {len(self)} entries"
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class OCRCache:
+    # Cache of the OCR results, keyed by a hash of the cropped image and of the
+    # OCR backend and config: a memory tier for the boxes seen in this run, and a persistent
+    # disk tier so repeated evaluations of the same screenshots skip tesseract.
+    # Both tiers are bounded and evict the least recently used entries.
+
+    def __init__(self, path=OCR_CACHE_PATH, memory_entries=1_000, disk_entries=200_000):
+        self.memory = OrderedDict()
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.memory_hits = self.disk_hits = self.misses = 0
+        self.lock = Lock()
+        self.connection = None
+        if path:
+            if dirname(path):
+                makedirs(dirname(path), exist_ok=True)
+            self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS ocr (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    accessed REAL NOT NULL
+                )""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS ocr_accessed ON ocr (accessed)")
+            self.connection.commit()
+
+    @staticmethod
+    def key(image, config):
+        # BLAKE2 is fast enough to hash a whole screenshot in well under a millisecond;
+        # the shape is part of the key, the same bytes could be a different image
+        digest = blake2b(ascontiguousarray(image).tobytes(), digest_size=16)
+        digest.update(f"{image.shape}|{image.dtype}|{config}".encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return self.memory[key]
+            row = None
+            if self.connection:
+                row = self.connection.execute("SELECT text FROM ocr WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self.connection.execute("UPDATE ocr SET accessed = ? WHERE key = ?", (time(), key))
+            self.connection.commit()
+            self.remember(key, row[0])
+            return row[0]
+
+    def put(self, key, text):
+        with self.lock:
+            self.remember(key, text)
+            if self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO ocr VALUES (?, ?, ?)", (key, text, time()))
+                self.connection.execute(
+                    "DELETE FROM ocr WHERE key IN ("
+                    "SELECT key FROM ocr ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_entries,)
+                )
+                self.connection.commit()
+
+    def remember(self, key, text):
+        # Memory tier, the lock is already held
+        self.memory[key] = text
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hit_rate = (self.memory_hits + self.disk_hits) / lookups * 100 if lookups else 0
+        return f"{self.memory_hits} memory hits, {self.disk_hits} disk hits, {self.misses} misses ({hit_rate:.0f}% hit rate)"
+
+    def close(self):
+        with self.lock:
+            if self.connection:
+                self.connection.close()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import Coords
+import Screenshot
+
+from glob import glob
+from os import environ
+from sys import platform
+from threading import local
+from tempfile import NamedTemporaryFile
+from numpy import asarray, memmap, uint8
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional: MSS grabs a region of an X11 (or macOS/Windows) screen straight into memory
+try:
+    from mss import mss
+except ImportError:
+    mss = None
+
+# Reminder: like `screencapture -R`, Coords.emulator holds x, y, width and height
+# of the emulator window, while all the other coordinates are relative to it.
+# Each backend grabs Coords.emulator, or its own <region> with the same meaning
+# (see Sessions, one emulator window for each session)
+
+
+def list_screenshots(path_directory):
+    # Question-1.png, Question-2.png, ... sorted by question number
+    return sorted(
+        glob(f"{path_directory}/Question-*.png"),
+        key=lambda path: int(path.rsplit('-',1)[1].split('.')[0])
+    )
+
+
+class ScreencaptureBackend:
+    # macOS system utility: the fastest on macOS, but it has to go through a file
+    name = "screencapture"
+
+    def __init__(self, region=None):
+        self.region = region
+
+    def grab(self, filename):
+        # The screenshot is already on disk, no need to archive it again
+        return Screenshot.take_screenshot(filename, self.region), True
+
+    def grab_box(self, box):
+        # Only a box of the emulator window (see Watch): still a screencapture process,
+        # but a PNG of the box to write and decode instead of the whole window
+        emulator = self.region or Coords.emulator
+        region = Coords.Coordinate(emulator.x1 + box.x1, emulator.y1 + box.y1, box.x2 - box.x1, box.y2 - box.y1)
+        with NamedTemporaryFile(suffix=".png") as temp_file:
+            return Screenshot.take_screenshot(temp_file.name, region)
+
+
+class X11Backend:
+    # Grab the emulator window from the X11 screen into a NumPy buffer, no files involved
+    name = "x11"
+
+    def __init__(self, region=None):
+        if mss is None:
+            raise RuntimeError("mss is not installed")
+        self.region = region
+        # MSS instances can't be shared between threads
+        self.local = local()
+
+    def grab(self, filename):
+        if not hasattr(self.local, "sct"):
+            self.local.sct = mss()
+        emulator = self.region or Coords.emulator
+        region = {
+            "left": emulator.x1, "top": emulator.y1,
+            "width": emulator.x2, "height": emulator.y2
+        }
+        # MSS returns BGRA pixels
+        screenshot = asarray(self.local.sct.grab(region))
+        return cv2.cvtColor(screenshot, cv2.COLOR_BGRA2GRAY), False
+
+    def grab_box(self, box):
+        # Only a box of the emulator window (see Watch), much cheaper than the whole window
+        if not hasattr(self.local, "sct"):
+            self.local.sct = mss()
+        emulator = self.region or Coords.emulator
+        region = {
+            "left": emulator.x1 + box.x1, "top": emulator.y1 + box.y1,
+            "width": box.x2 - box.x1, "height": box.y2 - box.y1
+        }
+        return cv2.cvtColor(asarray(self.local.sct.grab(region)), cv2.COLOR_BGRA2GRAY)
+
+
+class FramebufferBackend:
+    # Read the emulator window from the Linux framebuffer, for headless boxes without X11
+    name = "framebuffer"
+
+    def __init__(self, device="fb0", region=None):
+        self.region = region
+        with open(f"/sys/class/graphics/{device}/virtual_size") as size_file:
+            self.width, self.height = map(int, size_file.read().strip().split(','))
+        with open(f"/sys/class/graphics/{device}/bits_per_pixel") as bpp_file:
+            self.channels = int(bpp_file.read().strip()) // 8
+        if self.channels != 4:
+            raise RuntimeError("only 32 bits per pixel framebuffers are supported")
+        # Map the device once, every grab is just a copy of the emulator's rows
+        self.buffer = memmap(f"/dev/{device}", dtype=uint8, mode='r', shape=(self.height, self.width, self.channels))
+
+    def grab(self, filename):
+        emulator = self.region or Coords.emulator
+        x, y = emulator.x1, emulator.y1
+        region = self.buffer[y:y + emulator.y2, x:x + emulator.x2]
+        return cv2.cvtColor(region, cv2.COLOR_BGRA2GRAY), False
+
+    def grab_box(self, box):
+        emulator = self.region or Coords.emulator
+        x, y = emulator.x1, emulator.y1
+        region = self.buffer[y + box.y1:y + box.y2, x + box.x1:x + box.x2]
+        return cv2.cvtColor(region, cv2.COLOR_BGRA2GRAY)
+
+
+class ReplayBackend:
+    # Replay saved screenshots, in order, as if they were taken right now
+    name = "replay"
+
+    def __init__(self, paths):
+        self.paths = iter(paths)
+
+    @classmethod
+    def from_directory(cls, path_directory):
+        return cls(list_screenshots(path_directory))
+
+    def grab(self, filename):
+        try:
+            path = next(self.paths)
+        except StopIteration:
+            raise RuntimeError("no more screenshots to replay")
+        # Saved screenshots are already archived
+        return Screenshot.load_image(path), True
+
+
+def create_backend(name=None, region=None):
+    # <name> is one of the backends above, None pick the best one for this machine
+    if name == "screencapture" or (name is None and platform == "darwin"):
+        return ScreencaptureBackend(region)
+    if name == "x11" or (name is None and environ.get("DISPLAY") and mss is not None):
+        return X11Backend(region)
+    if name == "framebuffer" or name is None:
+        return FramebufferBackend(region=region)
+    raise ValueError(f"Unknown capture backend: {name}")
+
+
+class Archiver:
+    # Write the Question-N.png copies on a background thread, off the critical path
+
+    def __init__(self):
+        self.pool = ThreadPoolExecutor(max_workers=1)
+
+    def save(self, filename, screenshot):
+        return self.pool.submit(cv2.imwrite, filename, screenshot)
+
+    def close(self):
+        # Wait for the pending writes
+        self.pool.shutdown()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import json
+import socket
+
+from argparse import ArgumentParser
+
+# The thin client of Daemon: the same questions and answers of Main.play, but the
+# screenshots, the OCR and the searches are done by the daemon, already warm. Only
+# the standard library is imported here, colorama when the first decision is printed,
+# so the client is ready in a few tens of milliseconds instead of the hundreds it takes
+# to import cv2, numpy, lxml and pytesseract and to load the OCR models.
+
+# Default location of the daemon's socket
+DAEMON_SOCKET_PATH = "Quizzes/Daemon.sock"
+
+
+class Connection:
+    # A line of JSON for each command, and one for each reply
+
+    def __init__(self, path=DAEMON_SOCKET_PATH):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.file = self.socket.makefile("rwb")
+
+    def send(self, command, **arguments):
+        self.file.write(json.dumps({"command": command, **arguments}).encode() + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("the daemon closed the connection")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+def print_decision(number, reply):
+    # The same output of Main.play, from the reply of a capture or evaluate command
+    from colorama import Fore, Style
+
+    if reply.get("warning"):
+        print(f"{Fore.YELLOW}{reply['warning']}{Fore.RESET}")
+    print(f"{Style.DIM}Screenshot ready for OCR in {reply['capture']*1000:.0f}ms{Style.RESET_ALL}")
+    print(f"\nQuestion n.{number}: {reply['question']}")
+    print(f"Answers: [{', '.join(reply['answers'])}]")
+
+    guessed = reply["guessed"]
+    if reply["strategy"] in ("knowledge", "match", "reuse"):
+        detail = "known" if reply["strategy"] == "knowledge" else reply["matches"][guessed - 1]
+        print(f"\n{Style.BRIGHT}{Fore.GREEN}{reply['answers'][guessed - 1]:>40} {Fore.CYAN}{detail:<40}{Fore.RESET}{Style.RESET_ALL}")
+    else:
+        print(f"{Style.DIM}{Fore.YELLOW}No match found, here is the more in depth analysis...{Fore.RESET}{Style.RESET_ALL}\n")
+        print(f"{Style.BRIGHT}                 Answer                 Score      Results  Total{Style.RESET_ALL}")
+        for line in reply["lines"]:
+            print(line)
+        if not guessed:
+            print(f"\n{Style.BRIGHT}{Fore.RED}Choose a random answer, the search was not successful!{Fore.RESET}{Style.RESET_ALL}")
+        else:
+            print(f"\n{Style.BRIGHT}{Fore.GREEN}{reply['answers'][guessed - 1]:>40} {Fore.CYAN}{reply['scores'][guessed - 1]:<40}{Fore.RESET}{Style.RESET_ALL}")
+
+    timings = ', '.join(
+        f"{strategy} {timing*1000:.0f}ms" if timing is not None else f"{strategy} cancelled"
+        for strategy, timing in reply["timings"].items()
+    )
+    print(f"{Style.DIM}Search: {timings}, {reply['requests']} requests, stopped because {reply['reason']}{Style.RESET_ALL}")
+
+def play(connection, num_questions, path_directory, path_screenshot, layout=False, capture=None, budget=10, confidence=0, watch=False, detect=False):
+    # Main.play, with the daemon doing the work
+    quiz = connection.send("start", directory=path_directory, screenshot=path_screenshot, capture=capture)
+    print(f"Quiz in {quiz['folder']}")
+    if quiz["first"] > 1:
+        print(f"Resuming the quiz from question n.{quiz['first']}")
+    if watch:
+        print("Watching for new questions, CTRL+C to exit")
+
+    for i in range(quiz["first"], num_questions + 1):
+        if not watch:
+            try:
+                c = input("Press enter to evaluate a new question, e to exit: ")
+            except KeyboardInterrupt:
+                print("")
+                break
+            if c == 'e': break
+        try:
+            reply = connection.send("capture", number=i, layout=layout, budget=budget, confidence=confidence, watch=watch, detect=detect)
+        except KeyboardInterrupt:
+            print("")
+            break
+        # There are no more screenshots to replay
+        if reply.get("done"):
+            break
+        print_decision(i, reply)
+
+        # Only the questions not in the report already, with the correct answer unknown (0) watching, like Main.play
+        if i > quiz["answered"]:
+            connection.send("record", correct=0 if watch else int(input("\nWhat was the correct answer? (1,2,3): ")))
+        print("________________________________________________________________________________\n")
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(prog="Client", description="Play a quiz with the warm daemon (see Daemon.py)")
+    parser.add_argument("-d","--directory",default=None,type=str,help="path to a quiz folder")
+    parser.add_argument("-n","--questions",default=12,type=int,help="number of questions to answer")
+    parser.add_argument("-s","--screenshot",default=None,type=str,help="path to a single image of a quiz question")
+    parser.add_argument("-e","--evaluate",nargs='+',default=None,type=str,help="decide these screenshots, without a quiz")
+    parser.add_argument("--layout",action="store_true",help="single-pass OCR of the whole screenshot")
+    parser.add_argument("--capture",default=None,choices=["screencapture","x11","framebuffer"],help="screen capture backend to use")
+    parser.add_argument("--budget",default=10,type=float,help="seconds to answer each question")
+    parser.add_argument("--confidence",default=0,type=int,help="margin of matches to decide without the concatenated queries")
+    parser.add_argument("-w","--watch",action="store_true",help="start automatically when a new question appears")
+    parser.add_argument("--detect",action="store_true",help="detect the boxes of question and answers on screen")
+    parser.add_argument("--socket",default=DAEMON_SOCKET_PATH,type=str,help="path to the daemon's socket")
+    parser.add_argument("--stats",action="store_true",help="print the daemon's caches and searches stats")
+    parser.add_argument("--shutdown",action="store_true",help="stop the daemon")
+    args = parser.parse_args()
+
+    if args.screenshot and args.directory:
+        exit("Specify only one parameter between --directory and --screenshot!")
+    if args.watch and (args.screenshot or args.directory):
+        exit("--watch works only with live screenshots!")
+
+    try:
+        connection = Connection(args.socket)
+    except (FileNotFoundError, ConnectionRefusedError):
+        exit(f"The daemon is not running on {args.socket}, start it with: python src/Daemon.py")
+
+    try:
+        if args.stats:
+            print(connection.send("stats")["stats"])
+        elif args.shutdown:
+            connection.send("shutdown")
+        elif args.evaluate:
+            for number, path_screenshot in enumerate(args.evaluate, start=1):
+                print_decision(number, connection.send("evaluate", screenshot=path_screenshot, layout=args.layout, budget=args.budget, confidence=args.confidence, detect=args.detect))
+        else:
+            play(connection, args.questions if not args.screenshot else 1, args.directory, args.screenshot, args.layout, args.capture, args.budget, args.confidence, args.watch, args.detect)
+    # An error of the daemon, it keeps running
+    except (RuntimeError, ConnectionError) as error:
+        exit(f"Daemon: {error}")
+    finally:
+        connection.close()
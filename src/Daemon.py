@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+
+import json
+import Cache
+import socket
+import Watch
+import Search
+import Capture
+import Planner
+import Pipeline
+import Sanitize
+import Scraping
+import Knowledge
+import Scheduler
+import Screenshot
+import numpy as np
+
+from Quiz import Quiz, Question
+from os import makedirs, remove
+from select import select
+from os.path import dirname, exists
+from time import perf_counter
+from threading import Thread
+from argparse import ArgumentParser
+from Client import DAEMON_SOCKET_PATH
+from socketserver import ThreadingUnixStreamServer, StreamRequestHandler
+
+# A resident process that keeps everything warm between quizzes: the modules
+# (cv2, numpy, lxml, pytesseract), the OCR engines, the layout of the emulator window,
+# the caches, the knowledge base, the cost model and the pooled HTTP connections.
+# Clients (see Client.py) send their commands over a Unix socket, a line of JSON for
+# each command and for each reply:
+#
+#   start     {directory, screenshot, capture}   a new quiz, live or replayed
+#   capture   {number, layout, budget, confidence, watch, detect}
+#                                                 the next screenshot of the quiz, decided
+#   record    {correct}                           the correct answer of the last question, to the report
+#   evaluate  {screenshot, layout, budget, confidence, detect}
+#                                                 a saved screenshot, decided, without a quiz
+#   stats, shutdown
+#
+# Each connection is a client, and the work of its questions goes to a single
+# Scheduler.FairExecutor shared by all of them, like Sessions.
+
+
+class EvaluateQuiz:
+    # The bare minimum of a Quiz needed by Pipeline, for the evaluate command
+    def new_question(self, text):
+        return Question(text)
+
+
+def decision_reply(question, speculation, decision, capture_time):
+    # What a client needs to print a decision, like Main.play does
+    answers = [question.get_answer(position) for position in range(3)]
+    return {
+        "question": question.get_text(),
+        "answers": [answer.get_text() for answer in answers],
+        "guessed": answers.index(decision.answer) + 1 if decision.answer is not None else 0,
+        "strategy": decision.strategy,
+        "reason": decision.reason,
+        "matches": [answer.get_matches() for answer in answers],
+        "scores": [answer.score for answer in answers],
+        "lines": speculation.concat_lines(),
+        "timings": decision.timings,
+        "requests": speculation.requests,
+        "capture": capture_time,
+    }
+
+
+class ClientHandler(StreamRequestHandler):
+    # A connection: a client, with at most a quiz at a time
+
+    def setup(self):
+        super().setup()
+        self.pool = self.server.executor.session(f"client-{self.client_address or id(self)}")
+        self.quiz = None
+        self.capture_backend = None
+        self.watcher = None
+        self.question = None
+        self.number = 0
+
+    def handle(self):
+        commands = {
+            "start": self.start,
+            "capture": self.capture,
+            "record": self.record,
+            "evaluate": self.evaluate,
+            "stats": self.stats,
+            "shutdown": self.shutdown,
+        }
+        for line in self.rfile:
+            # A malformed line is an error for the client, not the end of its connection
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("a command must be a JSON object")
+                command = request.pop("command", None)
+                if command not in commands:
+                    raise ValueError(f"Unknown command: {command}")
+                reply = commands[command](**request)
+            except Exception as error:
+                reply = {"error": f"{type(error).__name__}: {error}"}
+            try:
+                self.wfile.write(json.dumps(reply, ensure_ascii=False).encode() + b"\n")
+                self.wfile.flush()
+            except OSError:
+                # The client is gone while its command was running
+                break
+
+    def client_gone(self):
+        # The client closed the connection (CTRL+C on Client.py --watch): its end of the
+        # socket is readable, and there's nothing to read
+        try:
+            readable, _, _ = select([self.request], [], [], 0)
+            return bool(readable) and not self.request.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    def finish(self):
+        # The client is gone: every question it decided is in the report already
+        if self.quiz is not None:
+            self.quiz.close()
+        super().finish()
+
+    def start(self, directory=None, screenshot=None, capture=None):
+        if self.quiz is not None:
+            self.quiz.close()
+        self.quiz = Quiz(directory)
+        if screenshot:
+            self.capture_backend = Capture.ReplayBackend([screenshot])
+        elif directory:
+            self.capture_backend = Capture.ReplayBackend.from_directory(directory)
+        else:
+            self.capture_backend = Capture.create_backend(capture or self.server.capture)
+        self.watcher = None
+        # A live quiz interrupted by a crash goes on from the first question not in the report
+        first = self.quiz.answered + 1 if self.quiz.answered and not (screenshot or directory) else 1
+        return {"folder": self.quiz.folder_name, "first": first, "answered": self.quiz.answered}
+
+    def detect(self, screenshot):
+        # Once for the daemon, the layout stays warm for the next quizzes
+        if Screenshot.layout_profile is None:
+            try:
+                Screenshot.detect_layout(screenshot)
+            except ValueError as error:
+                return f"Layout not detected, using Coords: {error}"
+        return None
+
+    def capture(self, number, layout=False, budget=10, confidence=0, watch=False, detect=False):
+        if self.quiz is None:
+            raise RuntimeError("start a quiz first")
+        latency = 0
+        if watch:
+            if self.watcher is None:
+                self.watcher = Watch.Watcher(self.capture_backend)
+            # Not forever: the watcher stops when the client disconnects, and so does this thread
+            latency = self.watcher.wait_new_question(stop=self.client_gone)
+            if latency is None:
+                return {"done": True}
+        deadline = Scheduler.Deadline(budget - latency if budget else budget)
+        filename = f"{self.quiz.folder_name}/Question-{number}.png"
+        start = perf_counter()
+        try:
+            screenshot, archived = self.capture_backend.grab(filename)
+        except RuntimeError:
+            # There are no more screenshots to replay
+            return {"done": True}
+        capture_time = perf_counter() - start
+        if not archived:
+            self.server.archiver.save(filename, screenshot)
+        warning = self.detect(screenshot) if detect else None
+
+        question, speculation = Pipeline.start(self.pool, self.quiz, screenshot, layout, deadline)
+        decision = speculation.result(deadline, confidence)
+        if decision.answer is not None:
+            question.set_guessed_answer(question.answers.index(decision.answer) + 1)
+        self.question, self.number = question, number
+        return {**decision_reply(question, speculation, decision, capture_time), "warning": warning}
+
+    def record(self, correct):
+        # Only the questions not in the report already, like Main.play
+        if self.question is None or self.number <= self.quiz.answered:
+            return {"recorded": False}
+        self.question.set_correct_answer(int(correct))
+        self.quiz.record(self.question)
+        return {"recorded": True}
+
+    def evaluate(self, screenshot, layout=False, budget=10, confidence=0, detect=False):
+        deadline = Scheduler.Deadline(budget)
+        start = perf_counter()
+        image = Screenshot.load_image(screenshot)
+        capture_time = perf_counter() - start
+        warning = self.detect(image) if detect else None
+        question, speculation = Pipeline.start(self.pool, EvaluateQuiz(), image, layout, deadline)
+        decision = speculation.result(deadline, confidence)
+        return {**decision_reply(question, speculation, decision, capture_time), "warning": warning}
+
+    def stats(self):
+        lines = list()
+        if Scraping.cache is not None:
+            lines.append(f"Search cache: {Scraping.cache.stats()}")
+        if Screenshot.ocr_cache is not None:
+            lines.append(f"OCR cache: {Screenshot.ocr_cache.stats()}")
+        if Scraping.backend is not None:
+            lines.append(Scraping.backend.stats())
+        return {"stats": '\n'.join(lines) or "no caches"}
+
+    def shutdown(self):
+        # Not from this thread: shutdown() waits for serve_forever() to return
+        Thread(target=self.server.shutdown).start()
+        return {"shutdown": True}
+
+
+class Daemon(ThreadingUnixStreamServer):
+    # The clients' threads don't keep the daemon alive
+    daemon_threads = True
+
+    def __init__(self, path, workers, capture=None):
+        self.executor = Scheduler.FairExecutor(workers)
+        self.archiver = Capture.Archiver()
+        # Capture backend of the live quizzes, the best one for this machine by default
+        self.capture = capture
+        super().__init__(path, ClientHandler)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown()
+        self.archiver.close()
+
+
+def warm_up(offline=False):
+    # Everything the first question would pay for: the first OCR of each config, and
+    # the connections to Google (see Scraping.HTTPClient.preconnect)
+    blank = np.full((32, 128), 255, dtype=np.uint8)
+    for config in (Screenshot.OCR_CONFIG_QUESTION, Screenshot.OCR_CONFIG_ANSWER):
+        Screenshot.ocr_backend.image_to_string(blank, config)
+    if not offline:
+        try:
+            Scraping.client.preconnect(Scraping.google_url)
+        except OSError as error:
+            print(f"Not connected to Google yet: {error}")
+
+def remove_stale_socket(path):
+    # A socket file left by a daemon that didn't stop cleanly, nobody is listening
+    if not exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        remove(path)
+    else:
+        probe.close()
+        exit(f"A daemon is already running on {path}")
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(prog="Daemon", description="Keep the OCR, the caches and the connections warm, for Client.py")
+    parser.add_argument("--socket",default=DAEMON_SOCKET_PATH,type=str,help="path to the Unix socket")
+    parser.add_argument("-w","--workers",default=Screenshot.OCR_POOL_SIZE,type=int,help="threads shared by the clients")
+    parser.add_argument("--ocr",default=None,choices=["tesserocr","pytesseract"],help="OCR backend to use")
+    parser.add_argument("--capture",default=None,choices=["screencapture","x11","framebuffer"],help="screen capture backend of the live quizzes")
+    parser.add_argument("--cache",default=Cache.SEARCH_CACHE_PATH,type=str,help="path to the search cache")
+    parser.add_argument("--no-cache",action="store_true",help="always search on the network and run the OCR")
+    parser.add_argument("--offline",action="store_true",help="answer every search from the cache only")
+    parser.add_argument("--hedge",default=None,type=str,metavar="URL",help="hedge the slow searches with a duplicate request to this search URL, like https://www.google.com/search?q=")
+    parser.add_argument("--rate",default=None,type=float,help="maximum searches per second")
+    parser.add_argument("--language",default="ita",type=str,help="language profile used to clean the text")
+    parser.add_argument("--knowledge",default=None,nargs='?',const=Knowledge.KNOWLEDGE_PATH,type=str,help="path to the knowledge base of past quizzes")
+    parser.add_argument("--planner",default=None,nargs='?',const=Planner.PLANNER_PATH,type=str,help="plan the searches with this cost model (see Planner)")
+    args = parser.parse_args()
+
+    if args.offline and args.no_cache:
+        exit("Specify only one parameter between --offline and --no-cache!")
+    start = perf_counter()
+    if not args.no_cache:
+        Scraping.cache = Cache.SearchCache(args.cache)
+        Screenshot.ocr_cache = Cache.OCRCache()
+    Scraping.offline = args.offline
+    if args.hedge or args.rate:
+        Scraping.backend = Search.create_backend(args.rate, args.hedge)
+    Scraping.set_client(max_connections_per_host=args.workers)
+    Sanitize.set_language(args.language)
+    if args.knowledge:
+        Knowledge.knowledge = Knowledge.KnowledgeBase(args.knowledge)
+    if args.planner:
+        Planner.model = Planner.CostModel.load(args.planner)
+    Screenshot.set_ocr_backend(args.ocr, pool_size=args.workers)
+    warm_up(args.offline)
+
+    if dirname(args.socket):
+        makedirs(dirname(args.socket), exist_ok=True)
+    remove_stale_socket(args.socket)
+    daemon = Daemon(args.socket, args.workers, args.capture)
+    print(f"Warm in {(perf_counter() - start)*1000:.0f}ms, listening on {args.socket}", flush=True)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    daemon.server_close()
+    remove(args.socket)
+
+    Screenshot.ocr_backend.close()
+    if Scraping.cache is not None:
+        Scraping.cache.close()
+    if Screenshot.ocr_cache is not None:
+        Screenshot.ocr_cache.close()
+    if Scraping.backend is not None:
+        Scraping.backend.close()
+    if Knowledge.knowledge is not None:
+        Knowledge.knowledge.close()
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+import json
+import Cache
+import Capture
+import Planner
+import Sanitize
+import Scraping
+import Screenshot
+
+from math import ceil
+from Quiz import Question
+from os.path import isfile
+from time import perf_counter
+from argparse import ArgumentParser
+from csv import DictReader
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Stages timed for each question, in pipeline order
+STAGES = ["load", "ocr_question", "ocr_answers", "sanitize", "search", "total"]
+
+# ThreadPool of each worker process, for the searches of Scheduler.Speculation
+worker_pool = None
+# True to read each question with Screenshot.extract_layout
+worker_layout = False
+# True to find the boxes on the first screenshot (see Layout)
+worker_detect = False
+
+def init_worker(cache_path, offline, language, layout, detect=False, planner=None):
+    # Called once in each worker process: warm up everything a question needs
+    global worker_pool, worker_layout, worker_detect
+    worker_pool = ThreadPoolExecutor(max_workers=Screenshot.OCR_POOL_SIZE)
+    worker_layout = layout
+    worker_detect = detect
+    # Questions are read one at a time in each process, a single OCR engine is enough
+    Screenshot.set_ocr_backend(pool_size=1)
+    Sanitize.set_language(language)
+    if cache_path:
+        Scraping.cache = Cache.SearchCache(cache_path)
+        Screenshot.ocr_cache = Cache.OCRCache()
+    Scraping.offline = offline
+    if planner:
+        Planner.model = Planner.CostModel.load(planner)
+
+def detect_layout(screenshot):
+    # Once for each worker process, with Coords as they are if the boxes are not found
+    global worker_detect
+    try:
+        Screenshot.detect_layout(screenshot)
+    except ValueError as error:
+        print(f"Layout not detected, using Coords: {error}")
+        worker_detect = False
+
+def read_ground_truth(path_directory):
+    # The correct answers (1,2,3) saved in the report, in question order, 0 if unknown
+    report_path = f"{path_directory}/Report.csv"
+    if not isfile(report_path):
+        return list()
+    with open(report_path, newline='') as report_file:
+        return [int(row["Correct answer"] or 0) for row in DictReader(report_file)]
+
+class LayoutQuiz:
+    # The bare minimum of a Quiz needed by Screenshot.extract_layout
+    def new_question(self, text):
+        return Question(text)
+
+def evaluate_question(path_directory, number, path_screenshot, correct_answer):
+    # Run a single question, without any user interaction, and time each stage
+    timings = dict()
+    start = stage_start = perf_counter()
+
+    def lap(stage):
+        nonlocal stage_start
+        now = perf_counter()
+        timings[stage] = now - stage_start
+        stage_start = now
+
+    screenshot = Screenshot.load_image(path_screenshot)
+    if worker_detect and Screenshot.layout_profile is None:
+        detect_layout(screenshot)
+    lap("load")
+    if worker_layout:
+        question = Screenshot.extract_layout(screenshot, LayoutQuiz())
+        lap("ocr_question")
+        timings["ocr_answers"] = 0.0
+    else:
+        question = Question(Screenshot.extract_question(screenshot))
+        # Shift from the pixels, like Pipeline, not from the rows of the text read
+        question.set_shift(Screenshot.question_shift(screenshot))
+        lap("ocr_question")
+        for position in range(3):
+            Screenshot.extract_answer(screenshot, question, position)
+        lap("ocr_answers")
+    Sanitize.clean_question(question)
+    lap("sanitize")
+    speculation = Planner.speculation(worker_pool, question)
+    decision = speculation.result()
+    lap("search")
+    timings["total"] = perf_counter() - start
+
+    guessed = question.answers.index(decision.answer) + 1 if decision.answer else 0
+    return {
+        "quiz": path_directory,
+        "question": number,
+        "text": question.get_text(),
+        "guessed": guessed,
+        "correct": correct_answer,
+        "strategy": decision.strategy,
+        "reason": decision.reason,
+        # Negated or not whatever the strategy, not only when the concatenated queries decide
+        "usual_question": speculation.usual_question,
+        "requests": speculation.requests,
+        "timings": timings,
+    }
+
+def percentile(values, rank):
+    # Nearest-rank percentile of a list of values
+    values = sorted(values)
+    return values[max(0, ceil(rank / 100 * len(values)) - 1)]
+
+def summarize(records):
+    known = [record for record in records if record["correct"]]
+    right = sum(record["guessed"] == record["correct"] for record in known)
+    print(f"\nQuestions: {len(records)}, with a known correct answer: {len(known)}")
+    if known:
+        print(f"Accuracy: {right}/{len(known)} ({right / len(known) * 100:.1f}%)")
+    if records:
+        print(f"Requests per question: {sum(record['requests'] for record in records) / len(records):.2f}")
+    errors = sum("error" in record for record in records)
+    if errors:
+        print(f"Failed questions, counted as undecided: {errors}")
+
+    # Hit rate of each strategy, for usual and "negated" questions
+    print(f"\n{'Strategy':<12}{'Question':<10}{'Count':>8}{'Right':>8}{'Hit rate':>10}")
+    groups = defaultdict(list)
+    for record in known:
+        groups[(record["strategy"] or "none", "usual" if record["usual_question"] else "negated")].append(record)
+    for (strategy, kind), group in sorted(groups.items()):
+        right = sum(record["guessed"] == record["correct"] for record in group)
+        print(f"{strategy:<12}{kind:<10}{len(group):>8}{right:>8}{right / len(group) * 100:>9.1f}%")
+
+    # Latency percentiles of each stage, in milliseconds
+    print(f"\n{'Stage':<14}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage in STAGES:
+        values = [record["timings"][stage] * 1000 for record in records if stage in record["timings"]]
+        if values:
+            print(f"{stage:<14}{percentile(values, 50):>9.1f}ms{percentile(values, 95):>8.1f}ms{percentile(values, 99):>8.1f}ms")
+
+def evaluate(directories, workers, cache_path, offline, language, layout, detect=False, planner=None):
+    # Every screenshot of every quiz is a task for the process pool
+    tasks = list()
+    for path_directory in directories:
+        ground_truth = read_ground_truth(path_directory)
+        for number, path_screenshot in enumerate(Capture.list_screenshots(path_directory), start=1):
+            correct_answer = ground_truth[number - 1] if number <= len(ground_truth) else 0
+            tasks.append((path_directory, number, path_screenshot, correct_answer))
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(cache_path, offline, language, layout, detect, planner)
+    ) as pool:
+        futures = [pool.submit(evaluate_question, *task) for task in tasks]
+        records = [question_record(future, *task) for future, task in zip(futures, tasks)]
+    return records
+
+def question_record(future, path_directory, number, path_screenshot, correct_answer):
+    # The record of a question, undecided with the error if its OCR or its searches failed:
+    # one question is not worth the whole evaluation
+    try:
+        return future.result()
+    except Exception as error:
+        print(f"{path_screenshot}: {type(error).__name__}: {error}")
+        return {
+            "quiz": path_directory,
+            "question": number,
+            "text": '',
+            "guessed": 0,
+            "correct": correct_answer,
+            "strategy": None,
+            "reason": "error",
+            "usual_question": True,
+            "requests": 0,
+            "timings": dict(),
+            "error": f"{type(error).__name__}: {error}",
+        }
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(prog="Evaluate", description="Non-interactive evaluation of archived quizzes")
+    parser.add_argument("directories",nargs='+',type=str,help="paths to quiz folders, with screenshots and Report.csv")
+    parser.add_argument("-w","--workers",default=None,type=int,help="number of worker processes, one for each CPU by default")
+    parser.add_argument("--cache",default=Cache.SEARCH_CACHE_PATH,type=str,help="path to the search cache")
+    parser.add_argument("--no-cache",action="store_true",help="always search on the network and run the OCR")
+    parser.add_argument("--offline",action="store_true",help="answer every search from the cache only")
+    parser.add_argument("--language",default="ita",type=str,help="language profile used to clean the text")
+    parser.add_argument("--layout",action="store_true",help="single-pass OCR of the whole screenshot")
+    parser.add_argument("--detect",action="store_true",help="find the question and answers' boxes on the first screenshot")
+    parser.add_argument("--planner",default=None,nargs='?',const=Planner.PLANNER_PATH,type=str,help="plan the searches with this cost model (see Planner)")
+    parser.add_argument("-o","--output",default=None,type=str,help="save the result of every question to this JSON file")
+    args = parser.parse_args()
+
+    if args.offline and args.no_cache:
+        exit("Specify only one parameter between --offline and --no-cache!")
+
+    records = evaluate(
+        args.directories, args.workers,
+        None if args.no_cache else args.cache, args.offline, args.language, args.layout, args.detect, args.planner
+    )
+    summarize(records)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(records, output_file, ensure_ascii=False, indent=2)
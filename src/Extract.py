@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import re
+
+from lxml.etree import HTMLParser
+
+# A streaming alternative to PyQuery for the result pages: the page is fed
+# to an event based lxml parser, no DOM is built, only the text of the
+# div.rc results and of div#result-stats is collected, and the parsing
+# stops as soon as the results block (div#search) is over.
+# The text is built with the same rules of PyQuery's .text(), so that
+# the results are the same of the PyQuery path.
+
+# Elements that don't break the text into a new line (same as PyQuery)
+INLINE_TAGS = {
+    'a', 'abbr', 'acronym', 'b', 'bdo', 'big', 'br', 'button', 'cite',
+    'code', 'dfn', 'em', 'i', 'img', 'input', 'kbd', 'label', 'map',
+    'object', 'q', 'samp', 'script', 'select', 'small', 'span', 'strong',
+    'sub', 'sup', 'textarea', 'time', 'tt', 'var'
+}
+
+# HTML whitespaces
+WHITESPACE = re.compile('[\x20\x09\x0C\u200B\x0A\x0D]+')
+
+# Markers of the text parts: a block boundary and a <br>
+BLOCK, BREAK = None, True
+
+# Size of the chunks fed to the parser
+CHUNK_SIZE = 16 * 1024
+
+
+def parts_to_text(parts):
+    # Join the text parts like PyQuery's .text() does: consecutive strings are
+    # merged with their whitespaces squashed, consecutive block boundaries
+    # become a single new line, and leading/trailing boundaries are dropped
+    merged, buffer = list(), list()
+    for part in parts + [BLOCK]:
+        if isinstance(part, str):
+            buffer.append(part)
+            continue
+        if buffer:
+            text = WHITESPACE.sub(' ', ''.join(buffer)).strip()
+            if text:
+                merged.append(text)
+            buffer = list()
+        if part is BREAK or not merged or merged[-1] is not BLOCK:
+            merged.append(part)
+    while merged and not isinstance(merged[0], str):
+        merged.pop(0)
+    while merged and not isinstance(merged[-1], str):
+        merged.pop()
+    return ''.join('\n' if not isinstance(part, str) else part for part in merged).strip()
+
+
+class ResultsTarget:
+    # lxml parser target: receives start/end/data events and collects the text parts
+    # of the elements being captured (div.rc and div#result-stats)
+
+    def __init__(self):
+        self.results = list()
+        self.stats = None
+        # Open captures: [index of the result or "stats", depth, parts]
+        self.captures = list()
+        self.depth = 0
+        self.search_depth = None
+        self.done = False
+
+    def start(self, tag, attrib):
+        self.depth += 1
+        classes = attrib.get("class", "").split()
+        if tag == "div" and "rc" in classes:
+            # Keep the results in document order, even if nested
+            self.results.append(None)
+            self.captures.append([len(self.results) - 1, self.depth, list()])
+        elif tag == "div" and attrib.get("id") == "result-stats":
+            self.captures.append(["stats", self.depth, list()])
+        elif tag == "div" and attrib.get("id") == "search":
+            self.search_depth = self.depth
+        if self.captures:
+            part = BREAK if tag == "br" else (BLOCK if tag not in INLINE_TAGS else False)
+            if part is not False:
+                for capture in self.captures:
+                    # The first element of a capture is its own boundary, dropped anyway
+                    capture[2].append(part)
+
+    def end(self, tag):
+        if self.captures and tag not in INLINE_TAGS:
+            for capture in self.captures:
+                capture[2].append(BLOCK)
+        # Close the captures of this element
+        while self.captures and self.captures[-1][1] == self.depth:
+            kind, _, parts = self.captures.pop()
+            if kind != "stats":
+                self.results[kind] = parts_to_text(parts)
+            elif self.stats is None:
+                self.stats = parts_to_text(parts)
+        if self.depth == self.search_depth:
+            # The results are over, the rest of the page is not needed
+            self.done = True
+        self.depth -= 1
+
+    def data(self, data):
+        for capture in self.captures:
+            capture[2].append(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        return self.results, self.stats or ''
+
+
+def extract(page):
+    # Return the text of every div.rc and the text of div#result-stats of a result page
+    target = ResultsTarget()
+    parser = HTMLParser(target=target)
+    for offset in range(0, len(page), CHUNK_SIZE):
+        parser.feed(page[offset:offset + CHUNK_SIZE])
+        if target.done:
+            break
+    return parser.close()
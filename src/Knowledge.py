@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+import re
+import sqlite3
+
+from os import makedirs
+from threading import Lock
+from os.path import dirname, isfile
+from csv import DictReader
+from collections import namedtuple
+
+# Default location of the knowledge base, built from the reports of all the quizzes
+KNOWLEDGE_PATH = "Quizzes/Knowledge.sqlite"
+
+# A question already answered in a past quiz:
+#  question: the cleaned text of the question
+#  answers: the cleaned text of its three answers
+#  correct: the position (0,1,2) of the correct answer
+#  similarity: how much it looks like the question looked up, 1.0 for the same words
+Known = namedtuple("Known", ["question", "answers", "correct", "similarity"])
+
+WORD_REGEX = re.compile(r"\w+")
+
+def words(text):
+    return WORD_REGEX.findall(text.lower())
+
+def key(text):
+    # Same words in the same order, whatever the punctuation and the case
+    return ' '.join(words(text))
+
+def distinctive(text, negation=None):
+    # What a near duplicate must have in common with a question, or it asks something else:
+    # the <negation> (see Sanitize.Normalizer.negation) and the numbers
+    return (bool(negation) and negation in text, {word for word in words(text) if any(char.isdigit() for char in word)})
+
+
+class KnowledgeBase:
+    # The questions of the past quizzes, with their correct answer: many questions
+    # come back, identical or almost, in later quizzes. An exact hit is a dictionary
+    # lookup; otherwise a full-text index (SQLite FTS5) finds the past questions
+    # sharing the most words, and the best one is a hit if the Jaccard similarity of
+    # its words is at least <min_similarity>, and it's negated or not and has the
+    # same numbers like the question (see distinctive).
+
+    def __init__(self, path=KNOWLEDGE_PATH, min_similarity=0.8, candidates=5):
+        self.min_similarity = min_similarity
+        self.candidates = candidates
+        if dirname(path):
+            makedirs(dirname(path), exist_ok=True)
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS questions USING fts5 (
+                question, answers UNINDEXED, correct UNINDEXED, key UNINDEXED
+            )""")
+        # Exact lookups don't touch the database at all
+        self.exact = {
+            row_key: (question, answers.split('\n'), correct)
+            for question, answers, correct, row_key in self.connection.execute("SELECT * FROM questions")
+        }
+
+    def add(self, question, answers, correct):
+        # <question> and <answers> already cleaned, <correct> 0-indexed
+        question_key = key(question)
+        if not question_key or question_key in self.exact:
+            return False
+        self.exact[question_key] = (question, list(answers), correct)
+        with self.lock:
+            self.connection.execute("INSERT INTO questions VALUES (?, ?, ?, ?)", (question, '\n'.join(answers), correct, question_key))
+        return True
+
+    def add_report(self, report_path):
+        # Every question of a Report.csv with a known correct answer
+        added = 0
+        with open(report_path, newline='') as report_file:
+            for row in DictReader(report_file):
+                correct = int(row["Correct answer"] or 0)
+                if 1 <= correct <= 3:
+                    answers = [row["Cleaned first answer"], row["Cleaned second answer"], row["Cleaned third answer"]]
+                    added += self.add(row["Cleaned question"], answers, correct - 1)
+        with self.lock:
+            self.connection.commit()
+        return added
+
+    def build(self, directories):
+        # Add the reports of the quiz folders, the ones already known are skipped
+        return sum(
+            self.add_report(f"{path_directory}/Report.csv")
+            for path_directory in directories if isfile(f"{path_directory}/Report.csv")
+        )
+
+    def find(self, question, negation=None):
+        # The past question most similar to <question> (cleaned text), None if there isn't a close one.
+        # With a <negation>, a negated question is never a near duplicate of a usual one
+        question_key = key(question)
+        if question_key in self.exact:
+            return Known(*self.exact[question_key], 1.0)
+        question_words = set(question_key.split())
+        if not question_words:
+            return None
+        # Any past question sharing at least a word, best ranked first
+        query = ' OR '.join(f'"{word}"' for word in question_words)
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT question, answers, correct, key FROM questions WHERE questions MATCH ? ORDER BY rank LIMIT ?",
+                (query, self.candidates)
+            ).fetchall()
+        best = None
+        question_distinctive = distinctive(question, negation)
+        for question_text, answers, correct, row_key in rows:
+            # Almost the same words, but the opposite question or other numbers
+            if distinctive(question_text, negation) != question_distinctive:
+                continue
+            row_words = set(row_key.split())
+            similarity = len(question_words & row_words) / len(question_words | row_words)
+            if similarity >= self.min_similarity and (best is None or similarity > best.similarity):
+                best = Known(question_text, answers.split('\n'), correct, similarity)
+        return best
+
+    def __len__(self):
+        return len(self.exact)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def answer_position(known, answers):
+    # Position (0,1,2) of the known correct answer among <answers> (cleaned text),
+    # None if it's not one of them: the same question, but with different answers
+    correct = key(known.answers[known.correct])
+    for position, answer in enumerate(answers):
+        if correct and key(answer) == correct:
+            return position
+    return None
+
+
+# Knowledge base in use, None to always search
+knowledge = None
+
+
+if __name__ == "__main__":
+
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(prog="Knowledge", description="Build the knowledge base from the reports of past quizzes")
+    parser.add_argument("directories",nargs='+',type=str,help="paths to the quiz folders")
+    parser.add_argument("-o","--output",default=KNOWLEDGE_PATH,type=str,help="path to the knowledge base")
+    args = parser.parse_args()
+
+    knowledge_base = KnowledgeBase(args.output)
+    added = knowledge_base.build(args.directories)
+    print(f"Added {added} questions, {len(knowledge_base)} known questions in {args.output}")
+    knowledge_base.close()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import json
+import base64
+import Coords
+import numpy as np
+
+from os import makedirs, replace
+from threading import Lock
+from os.path import dirname, isfile, join
+from Coords import Coordinate
+
+# Layout profiles, one JSON file for each size of the emulator window
+LAYOUTS_PATH = join(dirname(__file__), "..", "profiles", "layouts")
+
+# Pixels of the answers' buttons kept in the template, around their left edge
+TEMPLATE_MARGIN = 4
+TEMPLATE_WIDTH = 16
+# Below this normalized correlation the template is not on screen
+MIN_MATCH_SCORE = 0.6
+
+# Sessions with windows of the same size detect (and save) their profile once
+detect_lock = Lock()
+
+
+class LayoutProfile:
+    # Where the question and the answers are on screen, found once by detect()
+    # and saved as JSON. The answers' buttons move down when the question has more
+    # rows: each frame, relocate() finds how much by matching a template of the left
+    # edge of the three buttons (their border, never their text) in a thin vertical
+    # band of the frame, a fraction of a millisecond.
+
+    def __init__(self, size, question, answers, template, template_box, base_shift=0):
+        # <size> (width, height) of the frames, <template_box> where the template was cut,
+        # <base_shift> the shift of Coords.answers_shift of the frame used to detect the layout
+        self.size = size
+        self.question = question
+        self.answers = answers
+        self.template = template
+        self.template_box = template_box
+        self.base_shift = base_shift
+
+    def relocate(self, screen):
+        # Pixels the answers moved down (or up) since the detection, None if the buttons are not found
+        box = self.template_box
+        band = screen[:, box.x1:box.x2]
+        if band.shape[0] < self.template.shape[0] or band.shape[1] != self.template.shape[1]:
+            return None
+        scores = cv2.matchTemplate(band, self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (_, y) = cv2.minMaxLoc(scores)
+        return y - box.y1 if score >= MIN_MATCH_SCORE else None
+
+    def apply(self):
+        # From now on, the boxes of this profile are the ones cropped by Screenshot
+        Coords.question = self.question
+        Coords.answers = list(self.answers)
+
+    def to_json(self):
+        _, png = cv2.imencode(".png", self.template)
+        return {
+            "size": list(self.size),
+            "question": box_to_list(self.question),
+            "answers": [box_to_list(box) for box in self.answers],
+            "template": base64.b64encode(png.tobytes()).decode("ascii"),
+            "template_box": box_to_list(self.template_box),
+            "base_shift": self.base_shift,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        png = np.frombuffer(base64.b64decode(data["template"]), dtype=np.uint8)
+        return cls(
+            tuple(data["size"]),
+            Coordinate(*data["question"]),
+            [Coordinate(*box) for box in data["answers"]],
+            cv2.imdecode(png, cv2.IMREAD_GRAYSCALE),
+            Coordinate(*data["template_box"]),
+            data["base_shift"],
+        )
+
+    def save(self, path):
+        # Written to a temporary file and renamed, so concurrent readers (see Evaluate)
+        # never see half a profile
+        makedirs(dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'w') as profile_file:
+            json.dump(self.to_json(), profile_file, indent=4)
+        replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as profile_file:
+            return cls.from_json(json.load(profile_file))
+
+
+def box_to_list(box):
+    return [box.x1, box.y1, box.x2, box.y2]
+
+def rectangles(screen):
+    # Bounding boxes of the outlines in the frame, light on dark and dark on light
+    blurred = cv2.GaussianBlur(screen, (5, 5), 0)
+    _, binary = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    boxes = set()
+    for image in (binary, cv2.bitwise_not(binary)):
+        contours, _ = cv2.findContours(image, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        boxes.update(cv2.boundingRect(contour) for contour in contours)
+    return boxes
+
+def detect(screen, base_shift=0):
+    # Find the three answers' buttons, the widest outlines of the same size stacked
+    # at the bottom of the frame, and the question above them. Raise ValueError if
+    # there aren't three buttons
+    height, width = screen.shape[:2]
+    buttons = [
+        (x, y, w, h) for x, y, w, h in rectangles(screen)
+        if w >= width / 2 and height * 0.03 <= h <= height * 0.15
+    ]
+    # Group the outlines of the same size: the buttons are the three lowest of the biggest group
+    groups = dict()
+    for x, y, w, h in buttons:
+        groups.setdefault((round(w / (width * 0.02)), round(h / (height * 0.01))), list()).append((x, y, w, h))
+    group = max(groups.values(), key=len, default=[])
+    # An outline and its border are both in the group, keep one for each button
+    stacked = list()
+    for x, y, w, h in sorted(group, key=lambda box: box[1]):
+        if not stacked or y > stacked[-1][1] + stacked[-1][3] / 2:
+            stacked.append((x, y, w, h))
+    if len(stacked) < 3:
+        raise ValueError(f"Found {len(stacked)} answers' buttons instead of 3")
+    answers = [Coordinate(x, y, x + w, y + h) for x, y, w, h in stacked[-3:]]
+
+    # The question is the biggest outline above the first answer, or everything
+    # between the top of the buttons' column and the first answer
+    above = [
+        (x, y, w, h) for x, y, w, h in rectangles(screen)
+        if w >= width / 2 and y + h <= answers[0].y1 and h > answers[0].y2 - answers[0].y1
+    ]
+    if above:
+        x, y, w, h = max(above, key=lambda box: box[2] * box[3])
+        question = Coordinate(x, y, x + w, y + h)
+    else:
+        question = Coordinate(answers[0].x1, Coords.question.y1, answers[0].x2, answers[0].y1 - 1)
+
+    # Left edge of the three buttons, with a margin to include their border
+    template_box = Coordinate(
+        max(0, answers[0].x1 - TEMPLATE_MARGIN), max(0, answers[0].y1 - TEMPLATE_MARGIN),
+        min(width, answers[0].x1 + TEMPLATE_WIDTH - TEMPLATE_MARGIN), min(height, answers[2].y2 + TEMPLATE_MARGIN)
+    )
+    template = screen[template_box.y1:template_box.y2, template_box.x1:template_box.x2].copy()
+    return LayoutProfile((width, height), question, answers, template, template_box, base_shift)
+
+def profile_path(screen):
+    height, width = screen.shape[:2]
+    return join(LAYOUTS_PATH, f"{width}x{height}.json")
+
+def load_or_detect(screen, base_shift=0):
+    # The profile of the frames of this size, detected on <screen> and saved the first time
+    path = profile_path(screen)
+    with detect_lock:
+        if isfile(path):
+            return LayoutProfile.load(path)
+        profile = detect(screen, base_shift)
+        profile.save(path)
+    print(f"Layout detected and saved in {path}")
+    return profile
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+from time import sleep
+from gzip import compress
+from random import Random
+from threading import Thread
+from zlib import crc32
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# A stand-in for Google: it serves canned result pages, with the same markup
+# parsed by Scraping.search, so that searches can be benchmarked offline
+
+RESULT_TEMPLATE = """<div class="g"><div class="rc"><div class="r"><a href="https://example.com/{index}"><h3>{title}</h3></a></div><div class="s"><span class="st">{body}</span></div></div></div>"""
+
+PAGE_TEMPLATE = """<!doctype html><html><head><meta charset="UTF-8"><title>{query} - Cerca con Google</title></head><body>
+<div id="searchform"><input name="q" value="{query}"></div>
+<div id="result-stats">Circa {total} risultati<nobr> (0,42 secondi)&nbsp;</nobr></div>
+<div id="search"><div id="rso">{results}</div></div>
+<div id="footer">{padding}</div>
+</body></html>"""
+
+def result_page(query, num_results=10):
+    # The page only depends on the query, so the same query always gets the same page
+    seed = crc32(query.encode())
+    results = ''.join(
+        RESULT_TEMPLATE.format(
+            index=index,
+            title=f"{query} - risultato {index}",
+            body=f"Lorem ipsum {query.lower()} dolor sit amet, consectetur adipiscing elit {seed % (index + 7)}."
+        ) for index in range(num_results)
+    )
+    # Real pages are mostly scripts and styles, pad them to a realistic size
+    return PAGE_TEMPLATE.format(
+        query=query,
+        total=f"{seed % 10_000_000:,}".replace(',','.'),
+        results=results,
+        padding="<script>var x = 0;</script>" * 2000
+    ).encode("utf-8")
+
+
+class ResultHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 to keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, don't let Nagle delay the body
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query).get('q', [''])[0]
+        page = result_page(query)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            page = compress(page)
+            encoding = "gzip"
+        else:
+            encoding = None
+        # Simulate the server think time, and a slow reply once in a while
+        sleep(self.server.delay)
+        if self.server.tail and self.server.random.random() < self.server.tail:
+            sleep(self.server.tail_delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=UTF-8")
+        self.send_header("Content-Length", str(len(page)))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, format, *args):
+        # Keep the benchmarks output clean
+        pass
+
+
+def start(port=0, delay=0.0, tail=0.0, tail_delay=1.0, handler=ResultHandler):
+    # Start the server in background and return it, <port> 0 pick a free port.
+    # A <tail> fraction of the requests takes <tail_delay> more seconds
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.tail, server.tail_delay = tail, tail_delay
+    server.random = Random(42)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def search_url(server):
+    # The equivalent of Scraping.google_url, for this server
+    host, port = server.server_address
+    return f"http://{host}:{port}/search?q="
@@ -1,123 +1,153 @@
 # -*- coding: utf-8 -*-
 
+import Cache
+import Trace
+import Watch
+import Search
+import Capture
+import Planner
+import Pipeline
 import Sanitize
 import Scraping
+import Knowledge
+import Scheduler
 import Screenshot
 
 from Quiz import Quiz
+from time import perf_counter
 from argparse import ArgumentParser
 from colorama import Fore, Back, Style
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 
-def play(num_questions,path_directory,path_screenshot):
+def play(num_questions,path_directory,path_screenshot,layout=False,capture=None,trace=False,budget=10,confidence=0,watch=False,detect=False,profile=None):
     # Create a new Quiz
     quiz = Quiz(path_directory)
+    # Trace the stages of each question next to the report
+    if trace:
+        Trace.tracer.enable(f"{quiz.folder_name}/Trace.jsonl")
+    # Profile the whole quiz, saved next to the report too (see Trace.PROFILE_FILES)
+    profiler = Trace.Profiler(profile, f"{quiz.folder_name}/{Trace.PROFILE_FILES[profile]}") if profile else None
+    if profiler:
+        profiler.start()
     # Create a ThreadPool to parallelize the work from here on
-    pool = ThreadPoolExecutor(max_workers=4)
+    pool = ThreadPoolExecutor(max_workers=Screenshot.OCR_POOL_SIZE)
+    # Save a copy of the live screenshots in background
+    archiver = Capture.Archiver()
+
+    # If we are here to evaluate only one question
+    if path_screenshot:
+        # Load the screenshot from disk as cv2 grey object
+        capture_backend = Capture.ReplayBackend([path_screenshot])
+    # Or we have to process an entire directory of questions
+    elif path_directory:
+        # Go through all screenshots in the specified directory
+        capture_backend = Capture.ReplayBackend.from_directory(path_directory)
+    # If there isn't neither a screenshots nor a directory
+    else:
+        # Take black-n-white screenshots of the emulator window
+        capture_backend = Capture.create_backend(capture)
+
+    # Watch the screen for new questions instead of waiting for the user
+    watcher = Watch.Watcher(capture_backend) if watch else None
+    if watcher:
+        print("Watching for new questions, CTRL+C to exit")
+
+    # A live quiz interrupted by a crash goes on from the first question not in the report,
+    # a replayed one starts from its first screenshot anyway
+    first = 1
+    if quiz.answered and not (path_screenshot or path_directory):
+        first = quiz.answered + 1
+        print(f"Resuming the quiz from question n.{first}")
 
     # For each question
-    for i in range(1,num_questions+1):
-        # Waiting for user input...
+    for i in range(first,num_questions+1):
+        # Time passed since the question appeared on screen
+        latency = 0
+        if watcher:
+            try:
+                latency = watcher.wait_new_question()
+            except KeyboardInterrupt:
+                print("")
+                break
+            print(f"{Style.DIM}New question detected, triggered after {latency*1000:.0f}ms{Style.RESET_ALL}")
+        else:
+            # Waiting for user input...
+            try:
+                c = input("Press enter to evaluate a new question, e to exit: ")
+            except KeyboardInterrupt:
+                # If CTRL+C, break
+                print("") # Go to a new line  
+                break
+            # If the user decided to exit, break
+            if c == 'e': break
+
+        Trace.tracer.new_question(i)
+        # The clock is ticking since the question appeared
+        deadline = Scheduler.Deadline(budget - latency if budget else budget)
+        # Define the path for a new screenshot file
+        filename = f"{quiz.folder_name}/Question-{i}.png"
+        # Get the screenshot, already converted to grayscale
+        start = perf_counter()
         try:
-            c = input("Press enter to evaluate a new question, e to exit: ")
-        except KeyboardInterrupt:
-            # If CTRL+C, break
-            print("") # Go to a new line  
+            with Trace.span("capture"):
+                screenshot, archived = capture_backend.grab(filename)
+        except RuntimeError:
+            # There are no more screenshots to replay
             break
-        # If the user decided to exit, break
-        if c == 'e': break
-
-        # If we are here to evaluate only one question
-        if path_screenshot:
-            # Load the screenshot from disk as cv2 grey object
-            screenshot = Screenshot.load_image(path_screenshot)
-        # Or we have to process an entire directory of questions
-        elif path_directory:
-            # Go through all screenshots in the specified directory 
-            filename = f"{path_directory}/Question-{i}.png"
-            screenshot = Screenshot.load_image(filename)
-        # If there isn't neither a screenshots nor a directory
-        else:
-            # Define the path for a new screenshot file
-            filename = f"{quiz.folder_name}/Question-{i}.png"
-            # Take a black-n-white screenshot
-            screenshot = Screenshot.take_screenshot(filename)
-
-        # Create a new Question object and extract the question from the screenshot
-        question = quiz.new_question(Screenshot.extract_question(screenshot))
-
-        # Extract all three answers from the screenshot, in three different threads
-        future_answers = {
-            pool.submit(
-                Screenshot.extract_answer,
-                screenshot,
-                question,
-                position
-            ): position for position in range(3)}
-        future_question = pool.submit(Sanitize.clean_question(question))
-        # Wait until all threads are done
-        for future in as_completed(future_answers): pass
+        capture_time = perf_counter() - start
+        # If the screenshot is only in memory, save a copy in background
+        if not archived:
+            archiver.save(filename, screenshot)
+        print(f"{Style.DIM}Screenshot ready for OCR in {capture_time*1000:.0f}ms ({capture_backend.name}){Style.RESET_ALL}")
+
+        # Find the boxes once, on the first screenshot (see Layout)
+        if detect and Screenshot.layout_profile is None:
+            try:
+                Screenshot.detect_layout(screenshot)
+            except ValueError as error:
+                print(f"{Fore.YELLOW}Layout not detected, using Coords: {error}{Fore.RESET}")
+                detect = False
+
+        # Read the question and its answers, firing each search as soon as its text is ready (see Pipeline)
+        question, speculation = Pipeline.start(pool, quiz, screenshot, layout, deadline)
 
         print(f"\nQuestion n.{i}: {question.get_text()}")
         print(f"Answers: [{question.get_answer(0).get_text()}, {question.get_answer(1).get_text()}, {question.get_answer(2).get_text()}]")
 
         # Briefly ... later
 
-        # Define the query URL
-        query_url = Scraping.define_url(question.get_text())
-        # Get search results from Google 
-        google_results = Scraping.search(query_url)
-
-        # Parallelize the pattern matching process with all the results
-        future_guess = {
-            pool.submit(
-                Scraping.guess_answer,
-                google_results,
-                question.get_answer(position)
-            ): position for position in range(3)
-        }
-        
-        # If at least one result was found
-        for future in as_completed(future_guess):
-            if future.result():
-                question.one_match = True
-
-        # If at least one answer has a match
-        if question.one_match:
-            # Get and print the answer with the highest matches number
-            guessed = question.get_answer_max_matches()
+        # Wait for the first strategy able to decide (see Scheduler)
+        with Trace.span("decision"):
+            decision = speculation.result(deadline, confidence)
+
+        # If the question was already answered in a past quiz
+        if decision.strategy == "knowledge":
+            guessed = decision.answer
+            print(f"\n{Style.BRIGHT}{Fore.GREEN}{guessed.get_text():>40} {Fore.CYAN}{'known':<40}{Fore.RESET}{Style.RESET_ALL}")
+            question.set_guessed_answer(question.answers.index(guessed)+1)
+        # If at least one answer has a match (or a relevant result, see Planner)
+        elif decision.strategy in ("match", "reuse"):
+            # Print the answer with the highest matches number
+            guessed = decision.answer
             print(f"\n{Style.BRIGHT}{Fore.GREEN}{guessed.get_text():>40} {Fore.CYAN}{guessed.get_matches():<40}{Fore.RESET}{Style.RESET_ALL}")
             # Save a reference to the guessed answer (non-zero indexed)
             question.set_guessed_answer(question.answers.index(guessed)+1)
         else:
-            print(f"{Style.DIM}{Fore.YELLOW}No match found, trying a more in depth analysis...{Fore.RESET}{Style.RESET_ALL}\n")
-            # Perform a query built concatenating the question and each answer
+            print(f"{Style.DIM}{Fore.YELLOW}No match found, here is the more in depth analysis...{Fore.RESET}{Style.RESET_ALL}\n")
+            # Queries built concatenating the question and each answer
             
             # Print sort-of table header (17+Answer+17, Score+5, 1+Results+2, Total)
             # I know it's ugly, maybe I'll use Rich lib 
             print(f"{Style.BRIGHT}                 Answer                 Score      Results  Total{Style.RESET_ALL}")
-
-            # Check if this is an usual question or a "negated" question (explaination below)
-            question.usual_question = "NON" not in question.get_text()
-
-            # Parallelize the pattern matching process with all the results
-            future_calculation = {
-                pool.submit(
-                    Scraping.calculate_concat,
-                    question.get_text() if question.usual_question else question.get_text().replace("NON",''),
-                    question.get_answer(position)
-                ): position for position in range(3)
-            }
-            
-            for future in as_completed(future_calculation):
-                print(future.result())
+            for line in speculation.concat_lines():
+                print(line)
 
             # If the answers scored the same, then something went wrong
-            if question.get_answer(0).score == question.get_answer(1).score == question.get_answer(2).score:
+            if decision.answer is None:
                 print(f"\n{Style.BRIGHT}{Fore.RED}Choose a random answer, the search was not successful!{Fore.RESET}{Style.RESET_ALL}") # why not suggest a random answer?
-            # Otherwise, let's assume the answer with the highest score is fair
+            # Otherwise, the answer with the highest (or lowest) score
             else:
-                guessed = question.get_answer_max_score() if question.usual_question else question.get_answer_min_score()
+                guessed = decision.answer
                 print(f"\n{Style.BRIGHT}{Fore.GREEN}{guessed.get_text():>40} {Fore.CYAN}{guessed.score:<40}{Fore.RESET}{Style.RESET_ALL}")
                 # Save a reference to the guessed answer (non-zero indexed)
                 question.set_guessed_answer(question.answers.index(guessed)+1)
@@ -128,20 +158,49 @@ def play(num_questions,path_directory,path_screenshot):
             # the "not" ("NON", in italian) word and the answer is executed and then 
             # the answer that obtains the minimum score instead of the maximum, is taken.
 
+        # Wall-clock time to a decision of each strategy, to see what speculation saves
+        timings = ', '.join(
+            f"{strategy} {timing*1000:.0f}ms" if timing is not None else f"{strategy} cancelled"
+            for strategy, timing in decision.timings.items()
+        )
+        print(f"{Style.DIM}Search: {timings}, {speculation.requests} requests, stopped because {decision.reason}{Style.RESET_ALL}")
+        # Where did the time go?
+        spans = Trace.tracer.flush()
+        if spans:
+            print(f"{Style.DIM}Timing: {Trace.summary(spans)}{Style.RESET_ALL}")
+
         # Save the (real) correct answer for debug and analysis purpose,
-        # but only if the report file doesn't already exist
-        if not quiz.report_exists:
-            question.set_correct_answer(int(input("\nWhat was the correct answer? (1,2,3): ")))
+        # but only if the question is not in the report already,
+        # and append the question to the report right away.
+        # Watching, nobody waits for the prompt: the correct answer is left unknown (0), like Sessions
+        if i > quiz.answered:
+            if not watcher:
+                question.set_correct_answer(int(input("\nWhat was the correct answer? (1,2,3): ")))
+            quiz.record(question)
         
         # Print a bunch (80) of underscore to separate different question
         print("________________________________________________________________________________\n")
     
-    # Shutdown the ThreadPool
+    # Shutdown the ThreadPool, release the OCR engines and wait for the last screenshots to be saved
     pool.shutdown()
+    Screenshot.ocr_backend.close()
+    archiver.close()
+    if Scraping.cache is not None:
+        print(f"Search cache: {Scraping.cache.stats()}")
+        Scraping.cache.close()
+    if Screenshot.ocr_cache is not None:
+        print(f"OCR cache: {Screenshot.ocr_cache.stats()}")
+        Screenshot.ocr_cache.close()
+    if Scraping.backend is not None:
+        print(Scraping.backend.stats())
+        Scraping.backend.close()
+    if Knowledge.knowledge is not None:
+        Knowledge.knowledge.close()
 
-    # Save the report if it doesn't already exist
-    if not quiz.report_exists: 
-        quiz.save_report()
+    # Every question is in the report already, make sure it's on disk
+    quiz.close()
+    if profiler:
+        profiler.stop()
 
 if __name__ == "__main__":
 
@@ -159,13 +218,74 @@ the correct answer based on the results of a Google search.
     parser.add_argument("-n","--questions",default=12,type=int,help="number of questions to answer")
     # Absolute path to a single screenshot of a quiz question (if this is not None, --questions=1)
     parser.add_argument("-s","--screenshot",default=None,type=str,help="path to a single image of a quiz question")
+    # OCR backend, by default the in-process one if tesserocr is installed
+    parser.add_argument("--ocr",default=None,choices=["tesserocr","pytesseract"],help="OCR backend to use")
+    # Read question and answers with a single OCR pass instead of one for each box
+    parser.add_argument("--layout",action="store_true",help="single-pass OCR of the whole screenshot")
+    # Screen capture backend, by default the best one for this machine
+    parser.add_argument("--capture",default=None,choices=["screencapture","x11","framebuffer"],help="screen capture backend to use")
+    # Search results cache, shared by all the quizzes
+    parser.add_argument("--cache",default=Cache.SEARCH_CACHE_PATH,type=str,help="path to the search cache")
+    parser.add_argument("--no-cache",action="store_true",help="always search on the network and run the OCR")
+    # Replay a quiz using only the cached searches, for an instant offline re-evaluation
+    parser.add_argument("--offline",action="store_true",help="answer every search from the cache only")
+    # Send a duplicate of the searches slower than usual to another search engine (or Google domain), the first reply wins
+    parser.add_argument("--hedge",default=None,type=str,metavar="URL",help="hedge the slow searches with a duplicate request to this search URL, like https://www.google.com/search?q=")
+    # Never more than these searches per second, in bursts of four (a question)
+    parser.add_argument("--rate",default=None,type=float,help="maximum searches per second")
+    # Language of the quiz, see the profiles folder
+    parser.add_argument("--language",default="ita",type=str,help="language profile used to clean the text")
+    # Save the timing of each stage of each question in Trace.jsonl, next to the report
+    parser.add_argument("--trace",action="store_true",help="trace the timing of each stage")
+    # Profile the whole quiz, saved in Profile.prof (cProfile) or Profile.txt (sampling) in the quiz folder
+    parser.add_argument("--profile",default=None,choices=["cprofile","sampling"],help="profile the run with cProfile (every thread) or a sampling profiler (pyinstrument, main thread only)")
+    # Seconds available to answer each question, 0 to wait for every search
+    parser.add_argument("--budget",default=10,type=float,help="seconds to answer each question")
+    # Margin of matches between the first two answers needed to stop at the plain query
+    parser.add_argument("--confidence",default=0,type=int,help="margin of matches to decide without the concatenated queries")
+    # Detect new questions on screen instead of pressing enter
+    parser.add_argument("-w","--watch",action="store_true",help="start automatically when a new question appears")
+    # Find the question and answers' boxes on the first screenshot, saved in profiles/layouts
+    parser.add_argument("--detect",action="store_true",help="detect the boxes of question and answers on screen")
+    # Answer the questions of past quizzes without searching, see Knowledge.py to build it
+    parser.add_argument("--knowledge",default=None,nargs='?',const=Knowledge.KNOWLEDGE_PATH,type=str,help="path to the knowledge base of past quizzes")
+    # Plan the searches of each question with a cost model (see Planner)
+    parser.add_argument("--planner",default=None,nargs='?',const=Planner.PLANNER_PATH,type=str,help="path to the cost model of the query planner")
     #parser.add_argument("-v","--verbose",default=1,type=int,help="set verbosity level")
     args = parser.parse_args()
 
     # Could not process a directory and single question at the same time
     if args.screenshot and args.directory:
         exit("Specify only one parameter between --directory and --screenshot!")
+    # Saved screenshots don't change
+    if args.watch and (args.screenshot or args.directory):
+        exit("--watch works only with live screenshots!")
     #print(f"Using these parameters:\n\tQuestions:\t{args.questions}\n\tDirectory:\t{args.directory}\n\tScreenshot:\t{args.screenshot}")
     
+    # Not installed by requirements.txt, better to know before the setup
+    if args.profile == "sampling" and not Trace.sampling_available():
+        exit("--profile sampling needs pyinstrument: pip install pyinstrument, or use --profile cprofile")
+    # Could not replay from the cache without a cache
+    if args.offline and args.no_cache:
+        exit("Specify only one parameter between --offline and --no-cache!")
+    if not args.no_cache:
+        Scraping.cache = Cache.SearchCache(args.cache)
+        Screenshot.ocr_cache = Cache.OCRCache()
+    Scraping.offline = args.offline
+    # Retries, rate limit and hedged requests (see Search)
+    if args.hedge or args.rate:
+        Scraping.backend = Search.create_backend(args.rate, args.hedge)
+
+    Sanitize.set_language(args.language)
+
+    if args.knowledge:
+        Knowledge.knowledge = Knowledge.KnowledgeBase(args.knowledge)
+        print(f"{len(Knowledge.knowledge)} known questions")
+    if args.planner:
+        Planner.model = Planner.CostModel.load(args.planner)
+
+    # Warm up the OCR engines before the first question
+    Screenshot.set_ocr_backend(args.ocr)
+
     # Let's play!
-    play(args.questions if not args.screenshot else 1,args.directory,args.screenshot)
\ No newline at end of file
+    play(args.questions if not args.screenshot else 1,args.directory,args.screenshot,args.layout,args.capture,args.trace,args.budget,args.confidence,args.watch,args.detect,args.profile)
\ No newline at end of file
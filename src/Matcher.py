@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+
+
+class AhoCorasick:
+    # Aho-Corasick automaton: finds which of many patterns occur in a text
+    # with a single scan of the text, instead of one scan for each pattern
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        # Trie of the patterns: transitions, failure links, and the patterns ending in each state
+        self.goto = [dict()]
+        self.fail = [0]
+        self.output = [set()]
+        # An empty pattern is in every text, like `"" in text` is True
+        self.always = {index for index, pattern in enumerate(self.patterns) if pattern == ""}
+
+        for index, pattern in enumerate(self.patterns):
+            if pattern == "":
+                continue
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append(dict())
+                    self.fail.append(0)
+                    self.output.append(set())
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].add(index)
+
+        # Breadth first, so the failure link of a state is always ready before its children
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                # A state also outputs what its failure link outputs
+                self.output[child] |= self.output[self.fail[child]]
+
+    def find(self, text):
+        # Return the set of indexes of the patterns found in <text>
+        found = set(self.always)
+        remaining = len(self.patterns) - len(found)
+        state = 0
+        goto, fail, output = self.goto, self.fail, self.output
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                new = output[state] - found
+                if new:
+                    found |= new
+                    remaining -= len(new)
+                    # Every pattern was found already, no need to read further
+                    if remaining == 0:
+                        break
+        return found
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import Planner
+import Sanitize
+import Screenshot
+
+from concurrent.futures import as_completed, TimeoutError
+
+# The stages of a question, each one started as soon as its inputs are ready:
+#
+#   screenshot ─┬─ question OCR ─┬─ plain search ──────────────┐
+#               │                ├─ cleaning                   ├─ decision
+#               └─ answer OCR x3 ┴─ concat search x3 (each) ───┘
+#
+# The answers' shift comes from the pixels of the question box (see
+# Screenshot.question_shift), so the answers are read together with the question,
+# the plain query is fired as soon as the question is read, and the concatenated
+# query of each answer as soon as that answer is read too.
+
+def start(pool, quiz, screenshot, layout=False, deadline=None, profile=None):
+    # Return the new Question, with all its answers, and the Speculation deciding it.
+    # If the question or the answers are not read before the <deadline> (see Scheduler.Deadline),
+    # they're given up: the question is "OCR Failed" and the answers are left empty (see Answer.given_up).
+    # The boxes are the ones of the layout <profile>, by default the one in use (see Screenshot.boxes)
+    if layout:
+        # A single OCR pass reads everything, then all the queries start together
+        question = Screenshot.extract_layout(screenshot, quiz, profile)
+        # A fraction of a millisecond, not worth a task: the report and the
+        # knowledge base read the cleaned text as soon as the question is returned
+        Sanitize.clean_question(question)
+        return question, Planner.speculation(pool, question)
+
+    shift = Screenshot.question_shift(screenshot, profile)
+    future_question = pool.submit(Screenshot.extract_question, screenshot, profile)
+    future_answers = {
+        pool.submit(Screenshot.read_answer, screenshot, position, shift, profile): position
+        for position in range(3)
+    }
+
+    # The question text is the input of everything else, given up at the deadline like the answers
+    try:
+        question_text = future_question.result(deadline.remaining() if deadline else None)
+    except TimeoutError:
+        future_question.cancel()
+        question_text = "OCR Failed"
+    question = quiz.new_question(question_text)
+    question.set_shift(shift)
+    speculation = Planner.speculation(pool, question, start=False)
+    speculation.start_plain()
+    Sanitize.clean_question(question)
+
+    # Each answer, as soon as it's read, fires its own concatenated query
+    try:
+        for future in as_completed(future_answers, deadline.remaining() if deadline else None):
+            position = future_answers[future]
+            answer_text = future.result()
+            question.add_answer(answer_text, Sanitize.clean_answer(answer_text), position)
+            speculation.start_concat(position)
+    except TimeoutError:
+        for future, position in future_answers.items():
+            if question.get_answer(position) is not None:
+                continue
+            # Done just now, or given up
+            if future.done() and not future.cancelled() and future.exception() is None:
+                answer_text = future.result()
+                question.add_answer(answer_text, Sanitize.clean_answer(answer_text), position)
+                speculation.start_concat(position)
+            else:
+                future.cancel()
+                question.add_answer('', '', position, given_up=True)
+
+    return question, speculation
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+
+import json
+import Scoring
+import Scraping
+import Scheduler
+
+from os import makedirs, replace
+from os.path import dirname
+from time import perf_counter
+from concurrent.futures import TimeoutError
+
+# A hard question costs four searches when the plain query and the three
+# concatenated queries are all fired at once (see Scheduler.Speculation), but most
+# questions are decided by the plain query alone. A PlannedSearch sends the plain
+# query only, and if it's not enough picks the cheapest follow up worth its requests:
+#
+#   match   the answer with the most matches of the plain query       (no more requests)
+#   reuse   the relevant results of the plain query, position weighted (no more requests)
+#   or      a single query with the question and all the answers in OR  (one more request)
+#   concat  the concatenated queries, only for the answers still
+#           in contention after the plain query                       (up to three more)
+#
+# The choice comes from a CostModel: the accuracy of each follow up on the archived
+# quizzes, with and without matches of the plain query, minus a cost for each request.
+
+# Default location of the cost model, learned from the reports of all the quizzes
+PLANNER_PATH = "Quizzes/Planner.json"
+
+# Follow ups available after the plain query, with and without matches
+STRATEGIES = {
+    "matches": ["match", "reuse", "or", "concat"],
+    "no_matches": ["or", "concat"],
+}
+
+
+def or_url(question_text, answers_text):
+    # A single query for all the answers: the question and each answer in quotes, in OR
+    return Scraping.define_url(question_text, ' OR '.join(f'"{answer}"' for answer in answers_text if answer))
+
+def contenders(matches, confidence=0):
+    # Positions of the answers still in contention after the plain query: the ones within
+    # the <confidence> margin of the most matches, all of them if there's no match
+    best = max(matches)
+    if not best:
+        return [0, 1, 2]
+    return [position for position, value in enumerate(matches) if best - value < max(confidence, 1)]
+
+
+class CostModel:
+    # For each condition ("matches", "no_matches") and follow up: the questions it was
+    # measured on, its accuracy and its mean number of requests after the plain query.
+    # A follow up is chosen only if it was measured on at least <min_samples> questions,
+    # otherwise the concatenated queries are, like Scheduler.Speculation does
+
+    def __init__(self, stats=None, cost=0.05, min_samples=10):
+        self.stats = stats or {condition: dict() for condition in STRATEGIES}
+        # Accuracy given up to save a request
+        self.cost = cost
+        self.min_samples = min_samples
+
+    def utility(self, condition, strategy):
+        stats = self.stats[condition][strategy]
+        return stats["accuracy"] - self.cost * stats["requests"]
+
+    def choose(self, condition):
+        measured = [
+            strategy for strategy in STRATEGIES[condition]
+            if self.stats[condition].get(strategy, {}).get("samples", 0) >= self.min_samples
+        ]
+        if not measured:
+            return "concat"
+        return max(measured, key=lambda strategy: self.utility(condition, strategy))
+
+    @classmethod
+    def fit(cls, outcomes, cost=0.05, min_samples=10):
+        # The model of the <outcomes> of archived questions (see replay)
+        stats = {condition: dict() for condition in STRATEGIES}
+        for condition, strategies in STRATEGIES.items():
+            group = [outcome for outcome in outcomes if outcome["condition"] == condition]
+            for strategy in strategies:
+                measured = [outcome for outcome in group if outcome[strategy] is not None]
+                right = sum(outcome[strategy] for outcome in measured)
+                requests = sum(outcome["requests"][strategy] for outcome in measured)
+                stats[condition][strategy] = {
+                    "samples": len(measured),
+                    # Shrunk towards a random guess, the fewer the samples the more
+                    "accuracy": (right + 1) / (len(measured) + 3),
+                    "requests": requests / len(measured) if measured else 3,
+                }
+        return cls(stats, cost, min_samples)
+
+    def to_json(self):
+        return {"cost": self.cost, "min_samples": self.min_samples, "stats": self.stats}
+
+    def save(self, path):
+        if dirname(path):
+            makedirs(dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'w') as model_file:
+            json.dump(self.to_json(), model_file, indent=4)
+        replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path, cost=None):
+        with open(path) as model_file:
+            data = json.load(model_file)
+        return cls(data["stats"], data["cost"] if cost is None else cost, data["min_samples"])
+
+
+class PlannedSearch(Scheduler.Speculation):
+    # A Speculation firing the plain query only: the follow up, if any, is planned
+    # by the <model> once the plain query is done
+
+    def __init__(self, pool, question, model, start=True):
+        self.model = model
+        self.plan = None
+        self.future_or = None
+        self.or_lines = list()
+        super().__init__(pool, question, start)
+
+    def start_concat(self, position):
+        # Not before the plan
+        pass
+
+    @property
+    def requests(self):
+        return super().requests + (self.future_or is not None)
+
+    def decide(self, deadline, confidence):
+        try:
+            one_match = self.run_plain(deadline.remaining())
+        except TimeoutError:
+            return Scheduler.Decision(None, None, self.timings, "deadline")
+        decision = self.decide_match(one_match, confidence)
+        if decision:
+            return decision
+
+        self.plan = self.model.choose("matches" if one_match else "no_matches")
+        if self.plan == "reuse":
+            return self.decide_reuse() or self.fallback(one_match, "complete")
+        if self.plan == "or":
+            return self.decide_or(one_match, deadline) or self.fallback(one_match, "complete")
+        if self.plan == "concat":
+            positions = contenders([self.question.get_answer(position).matches for position in range(3)], confidence)
+            for position in positions:
+                super().start_concat(position)
+            return self.wait_concat(one_match, deadline, positions)
+        return self.fallback(one_match, "complete")
+
+    def decide_reuse(self):
+        # The plain query results scored like the concatenated ones, the first results count more
+        answers = [self.question.get_answer(position) for position in range(3)]
+        matrix = Scoring.relevant_matrix(self.future_plain.result(), [answer.get_text() for answer in answers])
+        scores = Scoring.matches(matrix, "position")
+        if (scores == scores[0]).all():
+            return None
+        self.question.one_match = True
+        return Scheduler.Decision("reuse", answers[int(scores.argmax())], self.timings, "complete")
+
+    def decide_or(self, one_match, deadline):
+        # An answer given up at the deadline is not searched, nor guessed
+        answers = [self.question.get_answer(position) for position in range(3) if not self.question.get_answer(position).given_up]
+        if not answers:
+            return None
+        url = or_url(self.concat_text, [answer.get_text() for answer in answers])
+        self.future_or = self.pool.submit(Scraping.search, url, True)
+        try:
+            google_results, total_results = self.future_or.result(deadline.remaining())
+        except TimeoutError:
+            return self.fallback(one_match, "deadline")
+        self.timings["concat"] = perf_counter() - self.start
+        # Every answer scored on the same results, see Scraping.score_concat
+        self.or_lines = [Scraping.score_concat(google_results, total_results, answer) for answer in answers]
+        self.question.usual_question = self.usual_question
+        if all(answer.score == answers[0].score for answer in answers):
+            return None
+        if self.usual_question:
+            guessed = max(answers, key=lambda answer: answer.score)
+        else:
+            guessed = min(answers, key=lambda answer: answer.score)
+        return Scheduler.Decision("or", guessed, self.timings, "complete")
+
+    def concat_lines(self):
+        return self.or_lines or super().concat_lines()
+
+
+# Cost model in use, None to fire every query at once (see Scheduler.Speculation)
+model = None
+
+def speculation(pool, question, start=True):
+    # The search of a question, planned if there's a cost model
+    if model is not None:
+        return PlannedSearch(pool, question, model, start)
+    return Scheduler.Speculation(pool, question, start)
+
+
+def cached(url, full_page=False):
+    # The search of <url> if it's in the cache (or if it can go to the network), None otherwise
+    if Scraping.offline and Scraping.cache.get(Scraping.normalize_query(url)) is None:
+        return None
+    return Scraping.search(url, full_page)
+
+def score(guess, correct_answer):
+    # 1 if right, 0 if wrong, a random guess if undecided
+    return 1 / 3 if guess is None else float(guess + 1 == correct_answer)
+
+def pick(scores, usual_question=True, among=(0, 1, 2)):
+    # Position of the best score among the positions <among>, None if they're all the same
+    values = [scores[position] for position in among]
+    if all(value == values[0] for value in values):
+        return None
+    best = max(values) if usual_question else min(values)
+    return among[values.index(best)]
+
+def replay(question_text, answers_text, correct_answer, confidence=0):
+    # How every follow up does on an archived question, from its cached searches:
+    # 1 right, 0 wrong, 1/3 undecided, None if its searches are not in the cache
+    import Sanitize
+
+    plain = cached(Scraping.define_url(question_text))
+    if plain is None:
+        return None
+    matches = Scoring.matches(Scoring.match_matrix(plain, answers_text))
+    negation = Sanitize.normalizer.negation
+    usual_question = negation not in question_text
+    concat_text = question_text if usual_question else question_text.replace(negation, '')
+    one_match = bool(matches.any())
+    ranking = sorted(matches, reverse=True)
+    match_guess = int(matches.argmax()) if one_match else None
+    positions = contenders(list(matches), confidence)
+
+    outcome = {
+        "condition": "matches" if one_match else "no_matches",
+        "confident": one_match and ranking[0] - ranking[1] >= confidence,
+        "match": score(match_guess, correct_answer) if one_match else None,
+        "reuse": None, "or": None, "concat": None, "speculation": None,
+        "requests": {"match": 0, "reuse": 0, "or": 1, "concat": len(positions)},
+    }
+    # Undecided follow ups fall back to the matches, like Scheduler.Speculation.fallback
+    if one_match:
+        reuse = pick(Scoring.matches(Scoring.relevant_matrix(plain, answers_text), "position"))
+        outcome["reuse"] = score(match_guess if reuse is None else reuse, correct_answer)
+
+    response = cached(or_url(concat_text, answers_text), full_page=True)
+    if response is not None:
+        results, total_results = response
+        relevant = Scoring.matches(Scoring.relevant_matrix(results, answers_text))
+        guess = pick(Scoring.product(relevant, total_results), usual_question)
+        outcome["or"] = score(match_guess if guess is None else guess, correct_answer)
+
+    responses = [cached(Scraping.define_url(concat_text, answer), full_page=True) for answer in answers_text]
+    if None not in responses:
+        scores = Scoring.concat_scores(*Scoring.concat_matrix(responses, answers_text))
+        guess = pick(scores, usual_question, positions)
+        outcome["concat"] = score(match_guess if guess is None else guess, correct_answer)
+        # What Scheduler.Speculation does: four requests, and the concatenated queries overturn the matches
+        speculated = match_guess if outcome["confident"] else pick(scores, usual_question)
+        outcome["speculation"] = score(match_guess if speculated is None else speculated, correct_answer)
+    return outcome
+
+def simulate(model, outcomes):
+    # Accuracy and requests of the <model> plan on the <outcomes>, and of Scheduler.Speculation
+    planned = speculated = requests = 0
+    for outcome in outcomes:
+        if outcome["confident"]:
+            planned += outcome["match"]
+            requests += 1
+        else:
+            strategy = model.choose(outcome["condition"])
+            planned += outcome[strategy]
+            requests += 1 + outcome["requests"][strategy]
+        speculated += outcome["speculation"]
+    return planned, speculated, requests
+
+def learn(directories, cache_path, confidence=0, cost=0.05, min_samples=10, online=False):
+    # The cost model of the archived quizzes, from the search cache (and from the
+    # network, if <online>, for the searches that are not there yet)
+    import Cache
+
+    Scraping.cache = Cache.SearchCache(cache_path)
+    Scraping.offline = not online
+    start = perf_counter()
+    outcomes = list()
+    for question_text, answers_text, correct_answer in Scoring.read_archive(directories):
+        outcome = replay(question_text, answers_text, correct_answer, confidence)
+        if outcome is not None:
+            outcomes.append(outcome)
+    Scraping.cache.close()
+    print(f"Questions with a known correct answer and a cached plain query: {len(outcomes)} ({perf_counter() - start:.1f}s)")
+
+    model = CostModel.fit(outcomes, cost, min_samples)
+    print(f"\n{'Condition':<12}{'Follow up':<10}{'Samples':>9}{'Accuracy':>10}{'Requests':>10}{'Utility':>9}")
+    for condition, strategies in STRATEGIES.items():
+        for strategy in strategies:
+            stats = model.stats[condition][strategy]
+            print(f"{condition:<12}{strategy:<10}{stats['samples']:>9}{stats['accuracy'] * 100:>9.1f}%{stats['requests']:>10.2f}{model.utility(condition, strategy):>9.3f}")
+        print(f"{condition:<12}chosen: {model.choose(condition)}")
+
+    # Planned against speculative, on the questions with every search in the cache:
+    # each half of them with the model learned on the other half
+    complete = [outcome for outcome in outcomes if None not in (outcome["or"], outcome["concat"])]
+    if complete:
+        halves = [complete[0::2], complete[1::2]]
+        planned = speculated = requests = 0
+        for test, train in (halves, halves[::-1]):
+            results = simulate(CostModel.fit(train, cost, min_samples), test)
+            planned, speculated, requests = planned + results[0], speculated + results[1], requests + results[2]
+        print(f"\nOn {len(complete)} questions with every search cached (two-fold):")
+        print(f"{'Speculation':<14}{speculated / len(complete) * 100:>9.1f}%{4:>10.2f} requests per question")
+        print(f"{'Planned':<14}{planned / len(complete) * 100:>9.1f}%{requests / len(complete):>10.2f} requests per question")
+    return model
+
+
+if __name__ == "__main__":
+
+    from Cache import SEARCH_CACHE_PATH
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(prog="Planner", description="Learn the cost model of the query planner from the archived quizzes")
+    parser.add_argument("directories",nargs='+',type=str,help="paths to the quiz folders")
+    parser.add_argument("--cache",default=SEARCH_CACHE_PATH,type=str,help="path to the search cache")
+    parser.add_argument("-o","--output",default=PLANNER_PATH,type=str,help="path to the cost model")
+    parser.add_argument("--confidence",default=0,type=int,help="margin of matches to decide without a follow up")
+    parser.add_argument("--cost",default=0.05,type=float,help="accuracy given up to save a request")
+    parser.add_argument("--min-samples",default=10,type=int,help="questions needed to trust a follow up")
+    parser.add_argument("--online",action="store_true",help="make the searches missing from the cache")
+    args = parser.parse_args()
+
+    cost_model = learn(args.directories, args.cache, args.confidence, args.cost, args.min_samples, args.online)
+    cost_model.save(args.output)
+    print(f"\nCost model saved in {args.output}")
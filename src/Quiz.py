@@ -1,5 +1,10 @@
 # -*- coding: utf-8 -*-
 
+import Report
+import numpy as np
+
+from sys import intern
+from array import array
 from os import makedirs
 from os.path import isfile
 from datetime import datetime
@@ -12,15 +17,21 @@ CSV_HEADERS = [
     "Cleaned question", "Cleaned first answer", "Cleaned second answer", "Cleaned third answer",
     "Guessed answer", "Correct answer", "Usual question", "One match",
     "Score first answer", "Score second answer", "Score third answer",
-    "Did I guess?"
+    "Did I guess?", "Stop reason"
 ]
 
 class Quiz:
+    # Quiz, Question and Answer have __slots__: no __dict__ for each object, so the
+    # archives of many quizzes take less memory (see also QuestionBatch)
+    __slots__ = ("folder_name", "report_path", "report_exists", "answered", "report_writer", "questions")
     
     def __init__(self,path=None):
         self.folder_name = self.create_folder() if not path else path
         self.report_path = f"{self.folder_name}/Report.csv"
         self.report_exists = isfile(self.report_path)
+        # Questions already in the report, a quiz interrupted by a crash can be resumed from here
+        self.answered = Report.recover(self.report_path)
+        self.report_writer = None
         self.questions = list()
         print("Created new quiz!")
 
@@ -52,6 +63,17 @@ class Quiz:
     def get_current_question(self):
         return self.questions[-1] if self.questions else None
 
+    def record(self, question):
+        # Append the question to the report as soon as it's decided (see Report.ReportWriter)
+        if self.report_writer is None:
+            self.report_writer = Report.ReportWriter(self.report_path, CSV_HEADERS)
+        self.report_writer.append(report_row(question))
+        self.answered += 1
+
+    def close(self):
+        if self.report_writer is not None:
+            self.report_writer.close()
+
     def save_report(self):
         """
         CSV Structure:
@@ -76,6 +98,7 @@ class Quiz:
         Score third answer: a triple with <score, results, total_result> of the third answer
 
         Did I guess?: True if the algorithm has guessed the right answer, False otherwise
+        Stop reason: why the search stopped, "confident", "complete" or "deadline" (see Scheduler.Decision)
         """
         
         # Open a new report file
@@ -86,31 +109,99 @@ class Quiz:
 
             # For each question evaluated
             for question in self.questions:
-                writer.writerow([
-                    question.get_text(), # Question
-                    question.get_answer(0).get_text(), # First answer
-                    question.get_answer(1).get_text(), # Second answer
-                    question.get_answer(2).get_text(), # Third answer
-                    
-                    question.get_cleaned_text(), # Cleaned question
-                    question.get_answer(0).get_cleaned_text(), # Cleaned first answer
-                    question.get_answer(1).get_cleaned_text(), # Cleaned second answer
-                    question.get_answer(2).get_cleaned_text(), # Cleaned third answer
-
-                    question.get_guessed_answer(), # Guessed answer
-                    question.get_correct_answer(), # Correct answer
-                    question.usual_question, # Usual question?
-                    question.one_match, # One match
-                    
-                    question.get_answer(0).score, # Score first answer
-                    question.get_answer(1).score, # Score second answer
-                    question.get_answer(2).score, # Score third answer
-
-                    question.guessed_answer == question.correct_answer # Did I guess?
-                ])
-            
+                writer.writerow(report_row(question))
+
+
+def report_row(question):
+    # The row of <question> in the report, see Quiz.save_report
+    return [
+        question.get_text(), # Question
+        question.get_answer(0).get_text(), # First answer
+        question.get_answer(1).get_text(), # Second answer
+        question.get_answer(2).get_text(), # Third answer
+        
+        question.get_cleaned_text(), # Cleaned question
+        question.get_answer(0).get_cleaned_text(), # Cleaned first answer
+        question.get_answer(1).get_cleaned_text(), # Cleaned second answer
+        question.get_answer(2).get_cleaned_text(), # Cleaned third answer
+
+        question.get_guessed_answer(), # Guessed answer
+        question.get_correct_answer(), # Correct answer
+        question.usual_question, # Usual question?
+        question.one_match, # One match
+        
+        question.get_answer(0).score, # Score first answer
+        question.get_answer(1).score, # Score second answer
+        question.get_answer(2).score, # Score third answer
+
+        question.guessed_answer == question.correct_answer, # Did I guess?
+        question.stop_reason # Stop reason
+    ]
+
+
+class QuestionBatch:
+    # Many questions, stored by column instead of one object for each question:
+    # the columns of the report (see CSV_HEADERS) are arrays of numbers or lists of
+    # interned strings, a few bytes for each question, and become NumPy arrays with to_numpy
+    __slots__ = ("columns",)
+
+    def __init__(self):
+        self.columns = {name: Report.new_column(name, 0) for name in CSV_HEADERS}
+
+    @classmethod
+    def from_reports(cls, directories):
+        # The questions of the reports of all the quiz folders in <directories>,
+        # with a "Quiz" column too (see Report.load_reports)
+        batch = cls()
+        batch.columns = Report.load_reports(directories)
+        # The reports written before a column was added (or no report at all) don't have it
+        rows = len(batch.columns["Quiz"])
+        for name in CSV_HEADERS:
+            if name not in batch.columns:
+                batch.columns[name] = Report.new_column(name, rows)
+        return batch
+
+    def append(self, question):
+        for name, value in zip(CSV_HEADERS, report_row(question)):
+            self.columns[name].append(value if isinstance(self.columns[name], array) else intern(str(value)))
+        # The other columns of the reports, like "Quiz", are empty for this question
+        for name, column in self.columns.items():
+            if name not in CSV_HEADERS:
+                column.append(0 if isinstance(column, array) else '')
+
+    def __len__(self):
+        return len(self.columns["Question"])
+
+    def question(self, index):
+        # The question in position <index>, as a Question object
+        row = {name: column[index] for name, column in self.columns.items()}
+        question = Question(row["Question"])
+        question.set_cleaned_text(row["Cleaned question"])
+        for position, ordinal in enumerate(["first", "second", "third"]):
+            question.add_answer(row[f"{ordinal.capitalize()} answer"], row[f"Cleaned {ordinal} answer"], position)
+            question.get_answer(position).score = row[f"Score {ordinal} answer"]
+        question.set_guessed_answer(row["Guessed answer"])
+        question.set_correct_answer(row["Correct answer"])
+        question.usual_question = bool(row.get("Usual question", True))
+        question.one_match = bool(row.get("One match", False))
+        question.stop_reason = row.get("Stop reason", '')
+        return question
+
+    def to_numpy(self):
+        # A NumPy array for each column: int64 and bool ones are a copy of the
+        # underlying buffer, the text ones are object arrays
+        return {
+            name: np.array(column, dtype=np.int64 if column.typecode == 'q' else bool)
+            if isinstance(column, array) else np.array(column, dtype=object)
+            for name, column in self.columns.items()
+        }
+
 
 class Question:
+    __slots__ = (
+        "text", "cleaned_text", "answers", "guessed_answer", "correct_answer",
+        "usual_question", "one_match", "stop_reason", "shift"
+    )
 
     def __init__(self, text):
         # Remove blank lines and new line
@@ -121,6 +212,7 @@ class Question:
         self.correct_answer = int()
         self.usual_question = True
         self.one_match = False # Assume that no answer was found
+        self.stop_reason = str()
         try:
             rows = len(text.strip().split("\n"))
             self.shift = answers_shift[rows-1]
@@ -133,9 +225,12 @@ class Question:
     def get_shift(self):
         return self.shift
 
-    def add_answer(self,text,cleaned_text,position):
+    def set_shift(self, shift):
+        self.shift = shift
+
+    def add_answer(self,text,cleaned_text,position,given_up=False):
         if 0 <= position <= 2:
-            self.answers[position] = Answer(text,cleaned_text)
+            self.answers[position] = Answer(text,cleaned_text,given_up)
 
     def get_answer(self,position):
         try:
@@ -150,7 +245,8 @@ class Question:
         self.cleaned_text = cleaned_text
 
     def get_answer_max_matches(self):
-        return max(self.answers, key=attrgetter("matches"))
+        # An answer that was never read can't be the guess
+        return max((answer for answer in self.answers if not answer.given_up), key=attrgetter("matches"))
     
     def get_answer_max_score(self):
         return max(self.answers, key=attrgetter("score"))
@@ -171,10 +267,13 @@ class Question:
         return self.guessed_answer
 
 class Answer:
+    __slots__ = ("text", "cleaned_text", "score", "matches", "results", "total_results", "given_up")
 
-    def __init__(self, text, cleaned_text):
+    def __init__(self, text, cleaned_text, given_up=False):
         self.text = text
         self.cleaned_text = cleaned_text
+        # Not read before the deadline (see Pipeline.start): no text, never searched nor guessed
+        self.given_up = given_up
         self.score = 0
         self.matches = 0
         self.results = 0
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+import csv
+
+from os import fsync
+from sys import intern
+from array import array
+from os.path import getsize, isfile
+
+# The report of a quiz is an append-only CSV file: each question is appended as
+# soon as it's decided and flushed to the OS right away, so a crash of the program
+# loses nothing; the file is synced to disk every few rows and when it's closed,
+# so a crash of the machine loses at most the last few rows.
+#
+# The csv module ends each record with "\r\n", while a newline inside a field is
+# a bare "\n": a record cut in half by a crash is everything after the last "\r\n".
+# The reports written before (and the ones edited by hand) end the records with a
+# bare "\n" instead, then a record cut in half is everything after the last "\n".
+
+RECORD_END = b"\r\n"
+LEGACY_RECORD_END = b"\n"
+
+# Columns of the reports parsed as numbers by load_reports, the others are text
+INTEGER_COLUMNS = ["Guessed answer", "Correct answer", "Score first answer", "Score second answer", "Score third answer"]
+BOOLEAN_COLUMNS = ["Usual question", "One match", "Did I guess?"]
+
+
+def recover(path):
+    # Cut the half-written record left by a crash, if any, and return
+    # the number of complete records (the headers excluded)
+    if not isfile(path) or getsize(path) == 0:
+        return 0
+    with open(path, "rb+") as report_file:
+        content = report_file.read()
+        record_end = RECORD_END if RECORD_END in content else LEGACY_RECORD_END
+        if record_end not in content:
+            # Not even the headers are complete: better a report to fix by hand than an empty one
+            print(f"Warning: {path} has no complete record, it's left as it is")
+        else:
+            end = content.rfind(record_end) + len(record_end)
+            if end < len(content):
+                report_file.truncate(end)
+                print(f"{path}: removed a record cut in half ({len(content) - end} bytes)")
+    with open(path, newline='') as report_file:
+        return max(0, sum(1 for _ in csv.reader(report_file)) - 1)
+
+
+class ReportWriter:
+    # Append rows to the report at <path>, writing the <headers> first if it's new.
+    # The rows of <headers> are appended to an existing report with the columns of
+    # its own headers, the ones of an older report: the columns it doesn't have are
+    # left out, and the ones it has but <headers> doesn't are left empty
+
+    def __init__(self, path, headers, sync_every=4):
+        self.sync_every = sync_every
+        self.pending = 0
+        new = not isfile(path) or getsize(path) == 0
+        self.columns = None
+        if not new:
+            with open(path, newline='') as report_file:
+                file_headers = next(csv.reader(report_file), list(headers))
+            if file_headers != list(headers):
+                self.columns = [headers.index(name) if name in headers else None for name in file_headers]
+                missing = [name for name in headers if name not in file_headers]
+                print(f"Warning: {path} has the headers of an older report, the new rows are written without {missing}")
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.writer(self.file, delimiter=',', quotechar='"')
+        if new:
+            self.append(headers)
+
+    def append(self, row):
+        if self.columns is not None:
+            row = [row[index] if index is not None else '' for index in self.columns]
+        self.writer.writerow(row)
+        # In the OS buffers: safe from a crash of the program
+        self.file.flush()
+        self.pending += 1
+        if self.pending >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        # On disk: safe from a crash of the machine
+        fsync(self.file.fileno())
+        self.pending = 0
+
+    def close(self):
+        if self.pending:
+            self.sync()
+        self.file.close()
+
+
+def parse_integer(value):
+    return int(float(value)) if value else 0
+
+def parse_boolean(value):
+    return value == "True"
+
+def load_reports(directories):
+    # Read the reports of all the quiz folders in <directories> into columns:
+    # a dictionary from the column name to an array of numbers (see INTEGER_COLUMNS
+    # and BOOLEAN_COLUMNS) or a list of interned strings (the same answers and
+    # questions come back many times), plus the "Quiz" column with the folder of each row
+    columns = {"Quiz": list()}
+    for path_directory in directories:
+        report_path = f"{path_directory}/Report.csv"
+        if not isfile(report_path):
+            continue
+        with open(report_path, newline='') as report_file:
+            reader = csv.reader(report_file)
+            headers = next(reader, None)
+            if headers is None:
+                continue
+            for name in headers:
+                if name not in columns:
+                    # Rows of older reports, without this column, are empty
+                    columns[name] = new_column(name, len(columns["Quiz"]))
+            records = list(reader)
+            rows = [row for row in records if len(row) == len(headers)]
+            skipped = len(records) - len(rows)
+            if skipped:
+                print(f"Warning: {report_path} has {skipped} rows not matching its headers, they are skipped")
+        if not rows:
+            continue
+        # A whole column at a time: one map() for each column instead of a call for each value
+        for name, values in zip(headers, zip(*rows)):
+            parse = parse_integer if name in INTEGER_COLUMNS else parse_boolean if name in BOOLEAN_COLUMNS else intern
+            columns[name].extend(map(parse, values))
+        for name in columns:
+            if name not in headers and name != "Quiz":
+                columns[name].extend([0 if isinstance(columns[name], array) else ''] * len(rows))
+        columns["Quiz"].extend([intern(path_directory)] * len(rows))
+    return columns
+
+def new_column(name, rows):
+    if name in INTEGER_COLUMNS:
+        return array('q', [0] * rows)
+    if name in BOOLEAN_COLUMNS:
+        return array('b', [0] * rows)
+    return [''] * rows
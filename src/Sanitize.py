@@ -1,94 +1,120 @@
 # -*- coding: utf-8 -*-
 
-from re import search
-
-# Common errors generated by OCR, and other stuffs to remove
-ocr_common_errors = {
-    "?":"", "!":"", "|":"", ":":"",
-    "\n":" ", "‘":" ", "î":"i", "ì":"i",
-    "ﬁ":"fi", "perla":"per la", "ii":"il",
-    " ia ": " la ", "“":"li", "|i":"il",
-    "ò":"o", "\x0c":'', "diun":"di un",
-    "sapen":"saper", "|n":"in", "Ii":"li",
-
-    "\"":'', "-":'' # quote and dash are google search parameters and can skew the results
-}
-
-# Words to remove from question text
-not_allowed_words = [
-    "qual", "quale", "cosa", "chi", "che", "quando", "il", "lo", "la", "i", "gli", "le", "l",
-    "di", "a", "da", "in", "con", "su", "per", "tra", "fra", "del", "dello", "della", "degli",
-    "dei", "delle", "dell", "un", "uno", "una", "è", "é", "questo", "questa", "questi", "queste",
-    "mio", "mia", "miei", "mie", "tuo", "tua", "tuoi", "tue", "suo", "sua", "suoi", "sue",
-    "nostro", "nostra", "nostri", "nostre", "vostro", "vostra", "vostri", "vostre", "loro",
-    "nel", "nello", "nella", "negli", "nelle", "nell", "mai"
-]
-
-# Words to remove from answers text
-not_allowed_words_in_answers = [
-    "il", "lo", "la", "i", "gli", "le", "l", "un", "uno", "una"
-]
+import re
+import json
 
+from Trace import traced
+from os.path import dirname, join
 
+# Language profiles: the OCR errors table and the words to remove, one JSON file
+# for each language in the profiles folder (see profiles/ita.json)
+PROFILES_PATH = join(dirname(__file__), "..", "profiles")
+
+
+def load_profile(language):
+    with open(join(PROFILES_PATH, f"{language}.json"), encoding="utf-8") as profile_file:
+        return json.load(profile_file)
+
+
+def compile_steps(errors):
+    # The (find, replace) couples of <errors>, in order, as steps of fix_ocr_errors: a translation
+    # table for each run of single characters, a (find, replace) couple for the others. A character
+    # joins the table of the run only if no replacement before it in the run contains it: in the
+    # chain that replacement would be replaced again, in a table it's not
+    steps, table = list(), dict()
+    for find, replace in errors.items():
+        if len(find) == 1 and not any(find in previous for previous in table.values()):
+            table[find] = replace
+            continue
+        if table:
+            steps.append(str.maketrans(table))
+            table = dict()
+        if len(find) == 1:
+            table[find] = replace
+        else:
+            steps.append((find, replace))
+    if table:
+        steps.append(str.maketrans(table))
+    return steps
+
+
+class Normalizer:
+    # Everything needed to clean questions and answers of a language, compiled once:
+    # the OCR errors are fixed in the order of the profile, like a chain of str.replace,
+    # but each run of single-character errors that can't feed each other is a single
+    # translation table; the words to remove are looked up in frozensets
+
+    def __init__(self, profile):
+        self.language = profile["language"]
+        # Word that marks a "negated" question (see Main.play)
+        self.negation = profile["negation"]
+
+        self.errors_steps = compile_steps(profile["ocr_common_errors"])
+        self.rewrites = profile["question_rewrites"]
+
+        self.question_stopwords = frozenset(profile["question_stopwords"])
+        self.answer_stopwords = frozenset(profile["answer_stopwords"])
+
+        # If question contain a '?' after some numbers, like a date,
+        # OCR recognize it as '7' (seven), therefore it must be removed
+        # Regexp reminder: \d=any digit numbers; {4} how many digit numbers
+        self.four_digit_regex = re.compile(r"\d{4}7")
+        # A 'è' or 'é' preceded by ' ' (a space) and followed by another char
+        self.accent_regex = re.compile(r"\s(é|è)[a-zA-Zèé]+")
+
+    def fix_ocr_errors(self, text):
+        # Remove common OCR errors
+        for step in self.errors_steps:
+            text = text.translate(step) if isinstance(step, dict) else text.replace(*step)
+        return text
+
+    def clean_question_text(self, text):
+        text = self.fix_ocr_errors(text)
+
+        # Replace words to create a shorter text
+        for find, replace in self.rewrites.items():
+            text = text.replace(find, replace)
+
+        four_digit_match = self.four_digit_regex.search(text)
+        if four_digit_match:
+            # Span is a tuple (x,y) that contain initial-final index of matched substring
+            span = four_digit_match.span()
+            text = text[:span[0]] + str(text[span[0]:span[1]].replace('7','')) + text[span[1]:]
+
+        # Insert ' ' between 'è' and the char that follows it
+        accent_match = self.accent_regex.search(text)
+        if accent_match:
+            span = accent_match.span()
+            text = text[:span[0] + 2] + ' ' + text[span[0] + 2:]
+
+        # Remove the not allowed words and rebuild text as a string
+        return ' '.join(word for word in text.split(' ') if word not in self.question_stopwords)
+
+    def clean_answer_text(self, text):
+        if text == '': return "OCR Failed"
+        text = self.fix_ocr_errors(text)
+        # Remove the not allowed words and rebuild text as a string
+        return ' '.join(word for word in text.split(' ') if word not in self.answer_stopwords)
+
+    def clean(self, question_text, answers_text):
+        # Clean a question and all its answers in one call
+        return self.clean_question_text(question_text), [self.clean_answer_text(text) for text in answers_text]
+
+
+# Normalizer of the language in use
+normalizer = Normalizer(load_profile("ita"))
+
+def set_language(language):
+    global normalizer
+    normalizer = Normalizer(load_profile(language))
+    return normalizer
+
+
+@traced("sanitize")
 def clean_question(question):
-    text = question.get_text()
-    
-    # Remove common OCR errors
-    for find, replace in ocr_common_errors.items():
-        text = text.replace(find, replace)
-
-    # Replace words to create a shorter text
-    text = text.replace("come si chiama", "nome")
-    
-    # If question contain a '?' after some numbers, like a date,
-    # OCR recognize it as '7' (seven), therefore it must be removed
-    # Regexp reminder: \d=any digit numbers; {4} how many digit numbers
-    four_digit_match = search("\d{4}7", text)
-    if four_digit_match:
-        # Span is a tuple (x,y) that contain initial-final index of matched substring
-        span = four_digit_match.span()
-        text = text[:span[0]] + str(text[span[0]:span[1]].replace('7','')) + text[span[1]:]
-    
-    # If question contain a 'è' or 'é' preceded by ' ' (a space) 
-    # and followed by another char, then insert ' ' between 'è' and the char
-    accent_match = search("\s(é|è)[a-zA-Zèé]+", text)
-    if accent_match:
-        span = accent_match.span()
-        text = text[:span[0] + 2] + ' ' + text[span[0] + 2:]
-    
-    # Split question in a list, for each word
-    words = text.split(' ')
-    
-    # Reminder: syntax like `list[:]` mean that Python create a copy of the original list
-    # to prevent index shifting when an item is removed from the list on which the for is iterating
-    for word in words[:]:
-        if word in not_allowed_words:
-            words.remove(word)
-    
-    # Rebuild text as a string 
-    text = ' '.join(words)
-    
-    # Set the new, cleaned text into question object 
-    question.set_cleaned_text(text)
+    # Set the new, cleaned text into question object
+    question.set_cleaned_text(normalizer.clean_question_text(question.get_text()))
 
 
 def clean_answer(answer):
-    if answer == '': return "OCR Failed"
-    
-    # Remove common OCR errors
-    for find, replace in ocr_common_errors.items():
-        answer = answer.replace(find, replace)
-
-    # Split question in a list, for each word
-    words = answer.split(' ')
-    
-    # Reminder: syntax like `list[:]` mean that Python create a copy of the original list
-    # to prevent index shifting when an item is removed from the list on which the for is iterating
-    for word in words[:]:
-        if word in not_allowed_words_in_answers:
-            words.remove(word)
-    
-    # Rebuild text as a string 
-    answer = ' '.join(words)
-    
-    return answer
+    return normalizer.clean_answer_text(answer)
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+import Sanitize
+import Scraping
+import Knowledge
+
+from time import perf_counter
+from contextvars import copy_context
+from operator import attrgetter
+from threading import Event, Condition, Thread
+from collections import namedtuple, deque, OrderedDict
+from concurrent.futures import wait, Future, TimeoutError
+
+# The outcome of a Speculation:
+#  strategy: "match" if decided by the plain query, "concat" by the concatenated ones,
+#            "knowledge" by a question of a past quiz (see Knowledge), "reuse" or "or"
+#            by a follow up of the query planner (see Planner), None if undecided
+#  answer: the guessed Answer, None if the search was not successful
+#  timings: seconds from the start until each strategy was done, None if it was cancelled
+#  reason: why the search stopped, "known" (the question was answered in a past quiz),
+#          "confident" (the plain query found a clear winner),
+#          "complete" (every concatenated query is done) or "deadline" (time is running out)
+Decision = namedtuple("Decision", ["strategy", "answer", "timings", "reason"])
+
+
+class Speculation:
+    # Fire the plain query and the three concatenated queries at the same moment,
+    # instead of waiting for the plain query to fail before running the others.
+    # The plain query decides as soon as it finds a match, and the concatenated
+    # queries still running are cancelled; otherwise they decide as soon as they're all done.
+    # With <start> False the queries are fired one by one, as soon as their inputs
+    # are ready, with start_plain and start_concat (see Pipeline)
+
+    def __init__(self, pool, question, start=True):
+        self.question = question
+        # Check if this is an usual question or a "negated" question (see Main.play)
+        negation = Sanitize.normalizer.negation
+        self.usual_question = negation not in question.get_text()
+        self.concat_text = question.get_text() if self.usual_question else question.get_text().replace(negation,'')
+        self.cancelled = Event()
+        self.timings = {"match": None, "concat": None}
+        self.start = perf_counter()
+        self.pool = pool
+        self.future_plain = None
+        self.future_concat = [None] * 3
+        # Which concatenated queries were actually sent, see requests
+        self.searched = [False] * 3
+        # A past quiz may have the same question: then no query is fired, unless
+        # its correct answer is not one of these answers (see result)
+        self.known = None
+        if Knowledge.knowledge is not None:
+            self.known = Knowledge.knowledge.find(Sanitize.normalizer.clean_question_text(question.get_text()), negation)
+        # Submit everything right away
+        if start:
+            self.start_plain()
+            for position in range(3):
+                self.start_concat(position)
+
+    def start_plain(self):
+        # Only the question text is needed
+        if self.known:
+            return
+        self.future_plain = self.pool.submit(Scraping.search, Scraping.define_url(self.question.get_text()))
+
+    def start_concat(self, position):
+        # The question text and the text of the answer in <position> are needed,
+        # not searched at all if the answer was given up (see Pipeline.start)
+        answer = self.question.get_answer(position)
+        if answer is not None and answer.given_up:
+            return
+        if not self.cancelled.is_set() and not self.known:
+            self.future_concat[position] = self.pool.submit(self.run_concat, position)
+
+    def run_plain(self, timeout=None):
+        google_results = self.future_plain.result(timeout)
+        # Pattern matching of every answer with all the results, in a single pass
+        found = Scraping.match_answers(google_results, [self.question.get_answer(position) for position in range(3)])
+        self.timings["match"] = perf_counter() - self.start
+        return any(found)
+
+    def run_concat(self, position):
+        # Don't even start if the plain query already decided
+        if self.cancelled.is_set():
+            return None
+        answer = self.question.get_answer(position)
+        self.searched[position] = True
+        google_results, total_results = Scraping.search(Scraping.define_url(self.concat_text, answer.get_text()), full_page=True)
+        # The request was already in flight, but there's no need to score it anymore
+        if self.cancelled.is_set():
+            return None
+        return Scraping.score_concat(google_results, total_results, answer)
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in self.future_concat:
+            if future:
+                future.cancel()
+
+    def result(self, deadline=None, confidence=0):
+        # All the answers must be there, and all the queries started.
+        # With a <deadline> (see Deadline), the best current guess is taken when it's near;
+        # the plain query decides only if the margin of matches between the first two
+        # answers is at least <confidence>, otherwise the concatenated queries may still
+        # overturn it. The reason of the stop is saved in the question, for the report.
+        decision = self.recall() or self.decide(deadline or Deadline(None), confidence)
+        # Whatever is still running is not needed anymore
+        self.cancel()
+        self.question.stop_reason = decision.reason
+        return decision
+
+    def recall(self):
+        # Decide with the past quiz, if it had one of these answers as correct answer
+        if not self.known:
+            return None
+        answers = [self.question.get_answer(position).get_cleaned_text() for position in range(3)]
+        position = Knowledge.answer_position(self.known, answers)
+        if position is not None:
+            return Decision("knowledge", self.question.get_answer(position), self.timings, "known")
+        # Same question, different answers: search after all
+        self.known = None
+        self.start_plain()
+        for position in range(3):
+            self.start_concat(position)
+        return None
+
+    @property
+    def requests(self):
+        # Searches sent for this question, even the ones served by the cache
+        return (self.future_plain is not None) + sum(self.searched)
+
+    def decide(self, deadline, confidence):
+        try:
+            one_match = self.run_plain(deadline.remaining())
+        except TimeoutError:
+            one_match = False
+        # Otherwise, wait for the more in depth analysis
+        return self.decide_match(one_match, confidence) or self.wait_concat(one_match, deadline)
+
+    def decide_match(self, one_match, confidence):
+        # The decision of the plain query, None if it's not confident enough
+        if one_match:
+            ranking = sorted((self.question.get_answer(position).matches for position in range(3)), reverse=True)
+            # If at least one answer has a match, the answer with the highest matches number wins
+            if ranking[0] - ranking[1] >= confidence:
+                self.question.one_match = True
+                return Decision("match", self.question.get_answer_max_matches(), self.timings, "confident")
+        return None
+
+    def wait_concat(self, one_match, deadline, positions=range(3)):
+        # Decide with the concatenated queries of the answers in <positions>, or the best guess at the <deadline>.
+        # The answers given up are never searched, there's nothing to wait for
+        futures = [self.future_concat[position] for position in positions if not self.question.get_answer(position).given_up]
+        _, not_done = wait([future for future in futures if future], deadline.remaining())
+        if not_done or None in futures:
+            # Not confident, but better than nothing
+            return self.fallback(one_match, "deadline") if one_match else self.decide_concat("deadline")
+        self.timings["concat"] = perf_counter() - self.start
+        decision = self.decide_concat("complete")
+        # The scores can't tell the answers apart, but the plain query found a match
+        return decision if decision.answer is not None else self.fallback(one_match, "complete")
+
+    def fallback(self, one_match, reason):
+        # The answer with the most matches, if any (never one that was given up)
+        if one_match:
+            self.question.one_match = True
+            return Decision("match", self.question.get_answer_max_matches(), self.timings, reason)
+        return Decision(None, None, self.timings, reason)
+
+    def decide_concat(self, reason):
+        self.question.usual_question = self.usual_question
+        # Only the answers with a score, if the deadline came first, and never one that was given up
+        answers = [
+            self.question.get_answer(position) for position, future in enumerate(self.future_concat)
+            if future and future.done() and not future.cancelled() and future.result() is not None
+            and not self.question.get_answer(position).given_up
+        ]
+        # If the answers scored the same, then something went wrong
+        if not answers or all(answer.score == answers[0].score for answer in answers):
+            return Decision(None, None, self.timings, reason)
+        # Otherwise, let's assume the answer with the highest score is fair
+        # (or the lowest one, for a "negated" question)
+        if self.usual_question:
+            guessed = max(answers, key=attrgetter("score"))
+        else:
+            guessed = min(answers, key=attrgetter("score"))
+        return Decision("concat", guessed, self.timings, reason)
+
+    def concat_lines(self):
+        # The table rows printed by calculate_concat, in the answers' order, of the scored answers
+        return [
+            future.result() for future in self.future_concat
+            if future and future.done() and not future.cancelled() and future.result() is not None
+        ]
+
+
+class Deadline:
+    # The time budget of a question: the quiz gives about ten seconds to answer,
+    # <margin> seconds are kept to read the decision and tap the answer
+
+    def __init__(self, budget=10, margin=1.5):
+        self.at = perf_counter() + budget - margin if budget else None
+
+    def remaining(self):
+        # Seconds left, None if there is no deadline at all
+        return max(0, self.at - perf_counter()) if self.at else None
+
+
+class FairExecutor:
+    # A pool of threads shared by many sessions (see Sessions): each session submits
+    # to its own queue, and the threads take the tasks from the queues in turn,
+    # so a session with many tasks waiting (three OCRs and four searches for each
+    # question) can't starve the others
+
+    def __init__(self, max_workers):
+        self.queues = OrderedDict()
+        self.condition = Condition()
+        self.shutting_down = False
+        self.threads = [Thread(target=self.work, name=f"FairExecutor-{index}", daemon=True) for index in range(max_workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def session(self, name):
+        # What a session uses as its pool, see SessionExecutor
+        return SessionExecutor(self, name)
+
+    def submit(self, session, function, *args, **kwargs):
+        # The task runs in the context of the submitter, with its tracer (see Trace.use)
+        future = Future()
+        with self.condition:
+            if self.shutting_down:
+                raise RuntimeError("cannot submit after shutdown")
+            self.queues.setdefault(session, deque()).append((future, copy_context(), function, args, kwargs))
+            self.condition.notify()
+        return future
+
+    def next_task(self):
+        # The first task of the first session with one, then that session goes last
+        for session, queue in self.queues.items():
+            if queue:
+                self.queues.move_to_end(session)
+                return queue.popleft()
+        return None
+
+    def work(self):
+        while True:
+            with self.condition:
+                task = self.next_task()
+                while task is None:
+                    if self.shutting_down:
+                        return
+                    self.condition.wait()
+                    task = self.next_task()
+            future, context, function, args, kwargs = task
+            # Cancelled while it was waiting
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(context.run(function, *args, **kwargs))
+            except BaseException as error:
+                future.set_exception(error)
+
+    def shutdown(self, wait=True):
+        # The tasks already submitted are still run
+        with self.condition:
+            self.shutting_down = True
+            self.condition.notify_all()
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+
+class SessionExecutor:
+    # The queue of a session in a FairExecutor, with the submit() of a ThreadPoolExecutor
+
+    def __init__(self, executor, name):
+        self.executor = executor
+        self.name = name
+
+    def submit(self, function, *args, **kwargs):
+        return self.executor.submit(self.name, function, *args, **kwargs)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from Matcher import AhoCorasick
+
+# Vectorized scoring of a question: the results of a search become a boolean
+# match matrix, one row for each snippet and one column for each answer, and
+# matches, relevant results and scores of all the answers come out of a few
+# NumPy operations on it. The snippets are weighted by a pluggable weighting
+# (see WEIGHTINGS) and the concatenated queries are scored by a pluggable
+# formula (see FORMULAS), so many scoring schemes can be compared on the same
+# cached searches (see evaluate_archive).
+
+
+def match_matrix(results, answers_text):
+    # matrix[snippet, answer] is True if the answer is in the text of the snippet
+    automaton = AhoCorasick(answers_text)
+    matrix = np.zeros((len(results), len(automaton.patterns)), dtype=bool)
+    for row, result in enumerate(results):
+        # An empty answer (not read, see Pipeline.start) is in no snippet
+        matrix[row, list(automaton.find(result.lower) - automaton.always)] = True
+    return matrix
+
+def relevant_matrix(results, answers_text):
+    # Same as match_matrix, but only the relevant results (see Scraping.score_concat):
+    # not a "Missing words" result, and the answer is not in its "Must include" section
+    automaton = AhoCorasick(answers_text)
+    matrix = np.zeros((len(results), len(automaton.patterns)), dtype=bool)
+    for row, result in enumerate(results):
+        if not result.missing:
+            found = automaton.find(result.lower) - automaton.find(result.must_include) - automaton.always
+            matrix[row, list(found)] = True
+    return matrix
+
+
+# Weight of each snippet, from its position in the results page
+def uniform(rows):
+    return np.ones(rows)
+
+def position_weighted(rows):
+    # Discounted like the DCG: the first results count more than the last ones
+    return 1 / np.log2(np.arange(rows) + 2)
+
+WEIGHTINGS = {
+    "uniform": uniform,
+    "position": position_weighted,
+}
+
+
+# Score of each answer of the concatenated queries, from its relevant results
+# and the total results of its query (arrays with a value for each answer)
+def product(results, totals):
+    # The formula of Scraping.score_concat
+    return totals * np.where(results > 0, results, 1)
+
+def log_product(results, totals):
+    # Totals grow by orders of magnitude, and swamp the results
+    return np.log1p(totals) * np.where(results > 0, results, 1)
+
+def normalized(results, totals):
+    # Share of the totals plus share of the relevant results
+    return totals / max(totals.sum(), 1) + results / max(results.sum(), 1)
+
+FORMULAS = {
+    "product": product,
+    "log_product": log_product,
+    "normalized": normalized,
+}
+
+
+def matches(matrix, weighting="uniform"):
+    # Weighted matches of each answer
+    return WEIGHTINGS[weighting](matrix.shape[0]) @ matrix
+
+def concat_matrix(responses, answers_text):
+    # <responses> is the (results, total_results) of the concatenated query of each answer:
+    # the relevant matrix has a column for each answer, built from its own response,
+    # padded with False up to the longest response
+    rows = max((len(results) for results, _ in responses), default=0)
+    matrix = np.zeros((rows, len(responses)), dtype=bool)
+    for column, ((results, _), answer_text) in enumerate(zip(responses, answers_text)):
+        matrix[:len(results), column] = relevant_matrix(results, [answer_text])[:, 0]
+    totals = np.array([total_results for _, total_results in responses], dtype=float)
+    return matrix, totals
+
+def concat_scores(matrix, totals, weighting="uniform", formula="product"):
+    # Score of each answer, from concat_matrix
+    return FORMULAS[formula](matches(matrix, weighting), totals)
+
+def decide(plain_matrix, concat, usual_question=True, weighting="uniform", formula="product"):
+    # Position (0,1,2) of the guessed answer, None if undecided, and the strategy used:
+    # the same decision of Scheduler.Speculation without a confidence margin.
+    # <concat> is the output of concat_matrix, or None if the concatenated queries were not made
+    plain = matches(plain_matrix, weighting)
+    if plain.any():
+        # argmax returns the first of equal values, like max() in Question.get_answer_max_matches
+        return int(plain.argmax()), "match"
+    if concat is None:
+        return None, None
+    scores = concat_scores(*concat, weighting, formula)
+    if (scores == scores[0]).all():
+        return None, None
+    return int(scores.argmax() if usual_question else scores.argmin()), "concat"
+
+
+def read_archive(directories):
+    # The questions of the reports of <directories> with a known correct answer:
+    # (question text, answers text, correct answer 1-3)
+    from csv import DictReader
+    from os.path import isfile
+
+    questions = list()
+    for path_directory in directories:
+        report_path = f"{path_directory}/Report.csv"
+        if not isfile(report_path):
+            continue
+        with open(report_path, newline='') as report_file:
+            for row in DictReader(report_file):
+                if row["Correct answer"] and int(row["Correct answer"]):
+                    answers = [row["First answer"], row["Second answer"], row["Third answer"]]
+                    questions.append((row["Question"], answers, int(row["Correct answer"])))
+    return questions
+
+def load_responses(question_text, answers_text):
+    # The cached search responses of a question: the results of the plain query and the
+    # (results, total results) of each concatenated query, None if they were never made
+    import Sanitize
+    import Scraping
+
+    plain = Scraping.search(Scraping.define_url(question_text))
+    negation = Sanitize.normalizer.negation
+    usual_question = negation not in question_text
+    concat_text = question_text if usual_question else question_text.replace(negation, '')
+    responses = [Scraping.search(Scraping.define_url(concat_text, answer), full_page=True) for answer in answers_text]
+    # An offline miss is an empty list of results with 1 total result
+    if all(not results for results, _ in responses):
+        responses = None
+    return plain, responses, usual_question
+
+def evaluate_archive(directories, cache_path):
+    # Accuracy of every weighting and formula over the archived quizzes, from the
+    # search cache only: the matrices are built once, then each scheme is a few
+    # NumPy operations on them, without a single request
+    import Cache
+    import Scraping
+    from time import perf_counter
+    from itertools import product as combinations
+
+    Scraping.cache = Cache.SearchCache(cache_path)
+    Scraping.offline = True
+
+    questions = list()
+    for question_text, answers_text, correct_answer in read_archive(directories):
+        plain, responses, usual_question = load_responses(question_text, answers_text)
+        concat = concat_matrix(responses, answers_text) if responses else None
+        questions.append((match_matrix(plain, answers_text), concat, usual_question, correct_answer))
+    Scraping.cache.close()
+    print(f"Questions with a known correct answer: {len(questions)}")
+    if not questions:
+        return
+
+    print(f"\n{'Weighting':<12}{'Formula':<14}{'Right':>8}{'Undecided':>11}{'Accuracy':>10}{'Time':>10}")
+    for weighting, formula in combinations(WEIGHTINGS, FORMULAS):
+        start = perf_counter()
+        guesses = [decide(plain, concat, usual_question, weighting, formula)[0] for plain, concat, usual_question, _ in questions]
+        elapsed = perf_counter() - start
+        right = sum(guess is not None and guess + 1 == correct for guess, (*_, correct) in zip(guesses, questions))
+        undecided = guesses.count(None)
+        print(f"{weighting:<12}{formula:<14}{right:>8}{undecided:>11}{right / len(questions) * 100:>9.1f}%{elapsed * 1000:>8.1f}ms")
+
+
+if __name__ == "__main__":
+
+    from Cache import SEARCH_CACHE_PATH
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(prog="Scoring", description="Compare scoring formulas over the archived quizzes, from the search cache")
+    parser.add_argument("directories",nargs='+',type=str,help="paths to the quiz folders")
+    parser.add_argument("--cache",default=SEARCH_CACHE_PATH,type=str,help="path to the search cache")
+    args = parser.parse_args()
+
+    evaluate_archive(args.directories, args.cache)
@@ -1,76 +1,266 @@
 # -*- coding: utf-8 -*-
 
+import zlib
+import Extract
+import Scoring
+import Search
+
+from gzip import decompress
 from pyquery import PyQuery
-from urllib.request import Request
-from urllib.request import urlopen
-from urllib.parse import quote_plus
+from Trace import traced
+from collections import namedtuple
+from queue import LifoQueue, Empty
+from threading import Lock, BoundedSemaphore
+from urllib.error import HTTPError
+from urllib.parse import quote_plus, urljoin, urlsplit, parse_qs
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+
+# Optional: brotli lets the client accept 'br' encoded responses too
+try:
+    from brotli import decompress as brotli_decompress
+except ImportError:
+    brotli_decompress = None
 
 # Reminder: quote_plus is used for properly quoting 
 # when building up a query string that go into a URL
 # https://docs.python.org/3/library/urllib.parse.html#urllib.parse.quote_plus
 
+# A search result, parsed once:
+#  text: the text of the result, lower: the same text lowercased,
+#  missing: True if Google marked some words of the query as missing ("Mancanti:"),
+#  must_include: the last line of the result, lowercased
+Snippet = namedtuple("Snippet", ["text", "lower", "missing", "must_include"])
+
 # Google URL
 google_url = "https://www.google.it/search?q="
 # User agent for http get
 headers = {'User-Agent':'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'}
 
+
+class HTTPClient:
+    # A small thread safe HTTP client with a pool of keep-alive connections for each host,
+    # so the four queries of a question don't pay a new TCP+TLS handshake each
+
+    def __init__(self, timeout=5, max_connections_per_host=4, max_redirects=5):
+        self.timeout = timeout
+        self.max_connections_per_host = max_connections_per_host
+        self.max_redirects = max_redirects
+        self.headers = dict(headers)
+        self.headers["Accept-Encoding"] = "gzip, deflate" + (", br" if brotli_decompress else "")
+        # Idle connections and connection limit of each (scheme, host) couple
+        self.idle = dict()
+        self.limits = dict()
+        self.lock = Lock()
+
+    def host_pool(self, key):
+        with self.lock:
+            if key not in self.idle:
+                self.idle[key] = LifoQueue()
+                self.limits[key] = BoundedSemaphore(self.max_connections_per_host)
+            return self.idle[key], self.limits[key]
+
+    def connect(self, scheme, host):
+        connection_class = HTTPSConnection if scheme == "https" else HTTPConnection
+        return connection_class(host, timeout=self.timeout)
+
+    def request(self, scheme, host, path):
+        idle, limit = self.host_pool((scheme, host))
+        # Wait for a free slot if there are already too many connections to this host
+        limit.acquire()
+        try:
+            try:
+                # Most recently used first, it's the most likely to be still alive
+                connection, reused = idle.get_nowait(), True
+            except Empty:
+                connection, reused = self.connect(scheme, host), False
+            try:
+                connection.request("GET", path, headers=self.headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (HTTPException, OSError):
+                connection.close()
+                # The server may have closed an idle connection in the meantime, try once more
+                if not reused:
+                    raise
+                connection = self.connect(scheme, host)
+                connection.request("GET", path, headers=self.headers)
+                response = connection.getresponse()
+                body = response.read()
+            # Give the connection back, unless the server wants to close it
+            if response.will_close:
+                connection.close()
+            else:
+                idle.put(connection)
+            return response, body
+        finally:
+            limit.release()
+
+    def preconnect(self, url, count=None):
+        # Open <count> connections to the host of <url> (all the ones allowed by default)
+        # ahead of the first request, so it doesn't pay the TCP+TLS handshake
+        parts = urlsplit(url)
+        idle, _ = self.host_pool((parts.scheme, parts.netloc))
+        for _ in range(count or self.max_connections_per_host):
+            connection = self.connect(parts.scheme, parts.netloc)
+            connection.connect()
+            idle.put(connection)
+
+    def decode(self, response, body):
+        encoding = response.getheader("Content-Encoding", "").lower()
+        if encoding == "gzip":
+            return decompress(body)
+        if encoding == "deflate":
+            return zlib.decompress(body)
+        if encoding == "br" and brotli_decompress:
+            return brotli_decompress(body)
+        return body
+
+    def get(self, url):
+        for _ in range(self.max_redirects + 1):
+            parts = urlsplit(url)
+            path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+            response, body = self.request(parts.scheme, parts.netloc, path)
+            # Follow redirects like urlopen does
+            if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+                url = urljoin(url, response.getheader("Location"))
+                continue
+            if response.status >= 400:
+                raise HTTPError(url, response.status, response.reason, response.headers, None)
+            return self.decode(response, body)
+        raise HTTPError(url, response.status, "Too many redirects", response.headers, None)
+
+    def close(self):
+        with self.lock:
+            for idle in self.idle.values():
+                while not idle.empty():
+                    idle.get_nowait().close()
+
+
+# Shared by all the searches, and by all the threads
+client = HTTPClient()
+
+# Search results cache (see Cache.SearchCache), None to always go to the network
+cache = None
+# Rate limited and hedged providers (see Search.SearchBackend), None to send each search once to google_url
+backend = None
+# How result pages are parsed: "pyquery" or "lxml" (streaming, see Extract). Benchmark.py parse
+# shows no clear gain of lxml on the saved pages, and a higher peak heap, so pyquery stays the default
+html_parser = "pyquery"
+# If True, never go to the network: every search is answered by the cache
+offline = False
+
+def set_client(timeout=5, max_connections_per_host=4):
+    global client
+    client.close()
+    client = HTTPClient(timeout, max_connections_per_host)
+    return client
+
 def define_url(question_text, answer_text=None):
     if answer_text:
         return google_url + quote_plus(f"{question_text} {answer_text}")
     else:
         return google_url + quote_plus(question_text)
 
+@traced("search")
 def search(url, full_page=False):
-    # Create an HTTP Get request
-    request = Request(url, headers=headers)
-    # Make the HTTP Get request
-    page = urlopen(request).read()
-    # Load the HTML into a PyQuery instance
-    pq = PyQuery(page)
-    # Find and return all divs with 'rc' as class
+    # Look for the same query in the cache first
+    cached = cache.get(normalize_query(url)) if cache is not None else None
+    if cached:
+        results, total_results = cached
+    elif offline:
+        # Replaying from the cache only: a miss is a search without results
+        results, total_results = list(), 1
+    else:
+        # Make the HTTP Get request, over a pooled keep-alive connection
+        page, host = backend.get(client, url) if backend is not None else (client.get(url), None)
+        # Extract the text of all divs with 'rc' as class, and of the total results counter
+        results, stats = extract_results(page)
+        total_results = get_google_total_results(stats)
+        # A page without results is more often a throttled search (or a captcha) than
+        # a query without results: better to search again next time
+        if cache is not None and results:
+            cache.put(normalize_query(url, host), results, total_results)
+    # Parse the results once, everything else works on the snippets
+    snippets = parse_results(results)
     # <full_page> is required during "a more in depth analysis" fase,
     # where the algorithm need the number of total results
-    return pq("div.rc") if not full_page else (pq("div.rc"), pq)
+    return snippets if not full_page else (snippets, total_results)
 
+def extract_results(page):
+    # The streaming extractor only reads what is needed, PyQuery builds the whole DOM
+    if html_parser == "lxml":
+        return Extract.extract(page)
+    return extract_results_pyquery(page)
+
+def extract_results_pyquery(page):
+    # Load the HTML into a PyQuery instance
+    pq = PyQuery(page)
+    return [PyQuery(result).text() for result in pq("div.rc")], pq("div#result-stats").text()
+
+def parse_results(results):
+    # Lowercase each result and look for the "Mancanti:" and "must include" parts
+    # once, instead of once for each answer (see score_concat)
+    return [
+        Snippet(text, text.lower(), "Mancanti:" in text, text.split("\n")[-1].lower())
+        for text in results
+    ]
+
+def normalize_query(url, host=None):
+    # The host and the query of a search URL, without the case and spacing differences
+    # that don't change the results, used as key of the cache: the same query gets different
+    # results from a different host (a hedged search answered by another provider, see Search)
+    parts = urlsplit(url)
+    query = parse_qs(parts.query).get('q', [''])[0]
+    return f"{host or parts.netloc} {' '.join(query.lower().split())}"
+
+@traced("match")
 def guess_answer(results, answer):
     # Pattern matching: answer in google result body
     for result in results:
-        # If the answer is in the body of the result
-        if answer.get_text() in PyQuery(result).text().lower():
+        # If the answer is in the body of the result (an empty answer never is)
+        if answer.get_text() and answer.get_text() in result.lower:
             answer.matches += 1
     # Return true if the answer got at least one match, false otherwise
     return answer.matches > 0
 
+@traced("match")
+def match_answers(results, answers):
+    # Same as guess_answer for every answer, but each result is scanned only once
+    # looking for all the answers together (see Scoring.match_matrix). The answers
+    # given up at the deadline are not matched at all
+    read = [answer for answer in answers if not answer.given_up]
+    matrix = Scoring.match_matrix(results, [answer.get_text() for answer in read])
+    for answer, matches in zip(read, Scoring.matches(matrix)):
+        answer.matches += int(matches)
+    # For each answer, true if it got at least one match, false otherwise
+    return [answer.matches > 0 for answer in answers]
+
 def calculate_concat(question_text, answer):
     query_url = define_url(question_text, answer.get_text())
-    google_results, full_page = search(query_url, full_page=True)
-    # Extract the number of total google results
-    answer.total_results = get_google_total_results(full_page)
-
-    for result in google_results:
-        result_text = PyQuery(result).text()
-        # If Google doesn't find enough results, it includes some that aren't really relevant,
-        # adding "Missing words: <keywords>", where keywords are words 
-        # included in the search query (answer, here).
-        # In this context, the results described are not useful and are excluded
-
-        # If the answer is in the result text
-            # If "Mancanti:" is not in the result text (so, it's a relevant result)
-                # If the answer is not in the "Must include" section
-        if answer.get_text() in result_text.lower() and \
-            not "Mancanti:" in result_text and \
-                not answer.get_text() in result_text.split("\n")[-1].lower():
-                    # Yay! This is a relevant result!
-                    answer.results += 1
+    google_results, total_results = search(query_url, full_page=True)
+    return score_concat(google_results, total_results, answer)
+
+@traced("concat")
+def score_concat(google_results, total_results, answer):
+    # The number of total google results
+    answer.total_results = total_results
+
+    # If Google doesn't find enough results, it includes some that aren't really relevant,
+    # adding "Missing words: <keywords>", where keywords are words 
+    # included in the search query (answer, here).
+    # In this context, the results described are not useful and are excluded.
+    # So a result is relevant (see Scoring.relevant_matrix) if the answer is in the
+    # result text, "Mancanti:" is not, and the answer is not in the "Must include" section
+    answer.results += int(Scoring.relevant_matrix(google_results, [answer.get_text()]).sum())
 
     # Calculate the score of the answer
     answer.score = answer.total_results * (answer.results if answer.results > 0 else 1)
 
     return f"{answer.get_text()[:40]:^40}{answer.score:<10}{answer.results:^10}{answer.total_results:<10}"
 
-def get_google_total_results(google_results):
-    # Extract div contain the number of total google results
-    number_results = google_results("div#result-stats").text().split(' ')
+def get_google_total_results(stats):
+    # <stats> is the text of the div containing the number of total google results
+    number_results = stats.split(' ')
     # If there is a result counter on the page
     if number_results:
 
@@ -88,7 +278,7 @@ def get_google_total_results(google_results):
         try:
             return int(number_results[len(number_results) % 3].replace('.',''))
         # Sometimes, due to network/google error, it fail! 
-        except IndexError:
+        except (IndexError, ValueError):
             return 1
     else:
         # If the query is too general, Google does not return the total number of results at all, 
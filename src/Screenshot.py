@@ -1,16 +1,266 @@
 # -*- coding: utf-8 -*-
 
+import re
 import cv2
+import json
+import shlex
 import Coords
+import Layout
 import Sanitize
 
+from queue import Queue
+from Trace import traced
+from threading import Lock
+from os.path import dirname, isfile, join
+from Coords import Coordinate
+from collections import namedtuple
+from numpy import ascontiguousarray
 from os import system as os_system
-from pytesseract import image_to_string
+from pytesseract import image_to_string, image_to_data, Output
+
+# tesserocr binds libtesseract directly: models are loaded once per engine
+# instead of once per call, like pytesseract does by forking the CLI
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
 
 # OCR on Answer config
 OCR_CONFIG_ANSWER = "--oem 0 --psm 7 -l ita+eng"
 # OCR on Question config
 OCR_CONFIG_QUESTION = "--oem 0 -l ita+eng"
+# OCR on the whole emulator window config, for the single-pass layout mode
+OCR_CONFIG_LAYOUT = "--oem 0 --psm 3 -l ita+eng"
+
+# Preprocessing of the question and answers' crops before the OCR (see preprocess), none by default
+PREPROCESS_QUESTION = dict()
+PREPROCESS_ANSWER = dict()
+
+# Configs and preprocessing tuned on the saved screenshots (see Tuning), loaded at startup if there's one
+OCR_PROFILE_PATH = join(dirname(__file__), "..", "profiles", "ocr.json")
+
+# Number of warm OCR engines, one for each worker of the ThreadPool in Main.play
+OCR_POOL_SIZE = 4
+
+
+def parse_config(config):
+    # Split a tesseract CLI config like "--oem 0 --psm 7 -l ita+eng"
+    # into its (lang, oem, psm) components; psm 3 is tesseract's default
+    lang = re.search(r"-l\s+(\S+)", config)
+    oem = re.search(r"--oem\s+(\d+)", config)
+    psm = re.search(r"--psm\s+(\d+)", config)
+    return (
+        lang.group(1) if lang else "eng",
+        int(oem.group(1)) if oem else 3,
+        int(psm.group(1)) if psm else 3
+    )
+
+def parse_variables(config):
+    # The "-c name=value" tesseract variables of a config, like a characters whitelist
+    tokens = shlex.split(config)
+    return dict(
+        value.split('=', 1) for option, value in zip(tokens, tokens[1:])
+        if option == "-c" and '=' in value
+    )
+
+
+# A word read by the OCR, with its bounding box and the line it belongs to
+Word = namedtuple("Word", ["text", "x1", "y1", "x2", "y2", "line"])
+
+
+class PytesseractBackend:
+    # Fallback backend: a new tesseract process for every crop
+    name = "pytesseract"
+
+    def image_to_string(self, image, config):
+        return image_to_string(image, config=config)
+
+    def image_to_words(self, image, config):
+        data = image_to_data(image, config=config, output_type=Output.DICT)
+        return [
+            Word(text, left, top, left + width, top + height, (block, paragraph, line))
+            for text, left, top, width, height, block, paragraph, line in zip(
+                data["text"], data["left"], data["top"], data["width"], data["height"],
+                data["block_num"], data["par_num"], data["line_num"]
+            ) if text.strip()
+        ]
+
+    def close(self):
+        pass
+
+
+class TesserocrBackend:
+    # Long-lived backend: a pool of libtesseract engines, each one
+    # with the models already loaded, shared across questions and threads
+    name = "tesserocr"
+
+    def __init__(self, size=OCR_POOL_SIZE, configs=None):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        self.size = size
+        self.engines = dict()
+        self.lock = Lock()
+        # Warm the models of the question and of the answers before the first crop
+        for config in configs or (OCR_CONFIG_QUESTION, OCR_CONFIG_ANSWER):
+            self.pool(config)
+
+    def pool(self, config):
+        # The engines of the lang, oem and variables of <config>, loaded the first time they're needed:
+        # psm can be switched on a warm engine without reloading the models
+        lang, oem, _ = parse_config(config)
+        variables = parse_variables(config)
+        key = (lang, oem, tuple(sorted(variables.items())))
+        with self.lock:
+            if key not in self.engines:
+                engines = Queue()
+                for _ in range(self.size):
+                    engine = tesserocr.PyTessBaseAPI(lang=lang, oem=oem)
+                    for name, value in variables.items():
+                        engine.SetVariable(name, value)
+                    engines.put(engine)
+                self.engines[key] = engines
+            return self.engines[key]
+
+    def set_image(self, engine, image, psm):
+        engine.SetPageSegMode(psm)
+        # Crops are views on the screenshot, libtesseract wants a packed buffer
+        image = ascontiguousarray(image)
+        height, width = image.shape[:2]
+        channels = image.shape[2] if image.ndim == 3 else 1
+        engine.SetImageBytes(image.tobytes(), width, height, channels, width * channels)
+
+    def image_to_string(self, image, config):
+        _, _, psm = parse_config(config)
+        engines = self.pool(config)
+        # Borrow an engine, blocking if all of them are busy
+        engine = engines.get()
+        try:
+            self.set_image(engine, image, psm)
+            return engine.GetUTF8Text()
+        finally:
+            engines.put(engine)
+
+    def image_to_words(self, image, config):
+        _, _, psm = parse_config(config)
+        engines = self.pool(config)
+        engine = engines.get()
+        try:
+            self.set_image(engine, image, psm)
+            engine.Recognize()
+            words, line = list(), 0
+            iterator = engine.GetIterator()
+            for word in tesserocr.iterate_level(iterator, tesserocr.RIL.WORD):
+                # A new line starts: words are grouped by line, like image_to_data does
+                if word.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                    line += 1
+                text = word.GetUTF8Text(tesserocr.RIL.WORD)
+                box = word.BoundingBox(tesserocr.RIL.WORD)
+                if text and text.strip() and box:
+                    words.append(Word(text, *box, line))
+            return words
+        finally:
+            engines.put(engine)
+
+    def close(self):
+        for engines in self.engines.values():
+            while not engines.empty():
+                engines.get().End()
+
+
+# OCR backend in use, created at the first OCR call if not set explicitly
+ocr_backend = None
+# OCR results cache (see Cache.OCRCache), None to always run the OCR
+ocr_cache = None
+# Layout of the emulator window (see Layout.LayoutProfile), None to use Coords as they are
+layout_profile = None
+
+def set_ocr_backend(name=None, pool_size=OCR_POOL_SIZE):
+    # <name> is "tesserocr" or "pytesseract", None pick the fastest one available
+    global ocr_backend
+    if ocr_backend:
+        ocr_backend.close()
+    if name == "pytesseract" or (name is None and tesserocr is None):
+        ocr_backend = PytesseractBackend()
+    else:
+        ocr_backend = TesserocrBackend(pool_size)
+    return ocr_backend
+
+def ocr(image, config):
+    # Extract text from an image with the current OCR backend
+    if ocr_backend is None:
+        set_ocr_backend()
+    # The same crop with the same config was already read
+    if ocr_cache is not None:
+        # Another backend may read the same crop differently
+        key = ocr_cache.key(image, f"{ocr_backend.name} {config}")
+        text = ocr_cache.get(key)
+        if text is None:
+            text = ocr_backend.image_to_string(image, config)
+            ocr_cache.put(key, text)
+        return text
+    return ocr_backend.image_to_string(image, config)
+
+def ocr_words(image, config):
+    # Extract words and their bounding boxes from an image with the current OCR backend
+    if ocr_backend is None:
+        set_ocr_backend()
+    if ocr_cache is not None:
+        key = ocr_cache.key(image, f"{ocr_backend.name} words {config}")
+        words = ocr_cache.get(key)
+        if words is None:
+            words = ocr_backend.image_to_words(image, config)
+            ocr_cache.put(key, json.dumps(words, ensure_ascii=False))
+            return words
+        return decode_words(words)
+    return ocr_backend.image_to_words(image, config)
+
+def decode_words(words):
+    # JSON has no tuples: the line of pytesseract, (block, paragraph, line), comes back as a
+    # list, which can't be a key of words_to_text
+    return [
+        Word(text, x1, y1, x2, y2, tuple(line) if isinstance(line, list) else line)
+        for text, x1, y1, x2, y2, line in json.loads(words)
+    ]
+
+def load_ocr_profile(path=OCR_PROFILE_PATH):
+    # Use the configs and preprocessing of the OCR profile at <path> (see Tuning), if there's one
+    global OCR_CONFIG_QUESTION, OCR_CONFIG_ANSWER, PREPROCESS_QUESTION, PREPROCESS_ANSWER
+    if not isfile(path):
+        return False
+    with open(path) as profile_file:
+        profile = json.load(profile_file)
+    OCR_CONFIG_QUESTION, PREPROCESS_QUESTION = profile["question"]["config"], profile["question"]["preprocess"]
+    OCR_CONFIG_ANSWER, PREPROCESS_ANSWER = profile["answer"]["config"], profile["answer"]["preprocess"]
+    return True
+
+def text_pixels(image):
+    # Text in white, background in black, whatever the colors of the quiz
+    _, binary = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if cv2.countNonZero(binary) > binary.size / 2:
+        binary = cv2.bitwise_not(binary)
+    return binary
+
+def preprocess(image, steps):
+    # The crop as the OCR gets it, after the <steps>, in this order:
+    #  scale: resize by this factor (less pixels, faster OCR)
+    #  crop: cut to the bounding box of the text, with a few pixels of margin
+    #  binarize: black and white, with Otsu's threshold
+    #  invert: swap light and dark
+    if not steps or image.size == 0:
+        return image
+    if steps.get("scale", 1) != 1:
+        image = cv2.resize(image, None, fx=steps["scale"], fy=steps["scale"], interpolation=cv2.INTER_AREA)
+    if steps.get("crop"):
+        points = cv2.findNonZero(text_pixels(image))
+        if points is not None:
+            x, y, width, height = cv2.boundingRect(points)
+            margin = 4
+            image = image[max(0, y - margin):y + height + margin, max(0, x - margin):x + width + margin]
+    if steps.get("binarize"):
+        _, image = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if steps.get("invert"):
+        image = cv2.bitwise_not(image)
+    return image
 
 def load_image(path):
     # Load the screenshot file from disk
@@ -25,7 +275,7 @@ def load_image(path):
     grey_screenshot = cv2.cvtColor(screenshot,cv2.COLOR_BGR2GRAY)
     return grey_screenshot
 
-def take_screenshot(filename):
+def take_screenshot(filename, region=None):
     # A few words about the fastest way to take a screenshot with Python.
     
     # Initially the Pillow library was used, in particular PIL.ImageGrab(), 
@@ -51,17 +301,23 @@ def take_screenshot(filename):
     #real    0m0.206s
     
     # Take a screenshot of the emulator window
-    os_system(f"screencapture -R {Coords.emulator.to_string()} {filename}")
+    # (or of <region>, with the same x, y, width and height of Coords.emulator)
+    os_system(f"screencapture -R {(region or Coords.emulator).to_string()} {filename}")
     # Returns the screenshot already converted to grayscale
     return load_image(filename)
 
     
-def extract_question(screen):
+def boxes(profile=None):
+    # The question's box and the answers' boxes of a layout <profile> (see Layout),
+    # by default of the one in use, or Coords if there isn't one
+    profile = profile or layout_profile
+    return (profile.question, profile.answers) if profile is not None else (Coords.question, Coords.answers)
+
+@traced("ocr_question")
+def extract_question(screen, profile=None):
     # Crop original screenshot to only question's box using coordinates
-    question_image = screen[
-        Coords.question.y1:Coords.question.y2,
-        Coords.question.x1:Coords.question.x2
-    ]
+    box = question_box(screen, profile)
+    question_image = screen[box.y1:box.y2, box.x1:box.x2]
     
     # Debug, uncomment to:
     # show a window with the question image, cropped from the screenshot until a key is pressed
@@ -69,23 +325,128 @@ def extract_question(screen):
     #cv2.waitKey(0)
 
     # Extract question's text from cropped screenshot as string
-    question_text = image_to_string(question_image, config=OCR_CONFIG_QUESTION)
+    question_text = ocr(preprocess(question_image, PREPROCESS_QUESTION), OCR_CONFIG_QUESTION)
     return question_text if question_text != "" else "OCR Failed"
 
-def extract_answer(screen, question, position):
+def extract_answer(screen, question, position, profile=None):
+    # Extract answer's text from cropped screenshot as string
+    answer_text = read_answer(screen, position, question.get_shift(), profile)
+    # Sanitize the answer and add it to the current question into quiz object
+    question.add_answer(answer_text,Sanitize.clean_answer(answer_text),position)
+
+@traced("ocr_answer")
+def read_answer(screen, position, shift, profile=None):
     # Crop original screenshot to only answer's box using coordinates
-    answer_image = screen[
-        Coords.answers[position].y1 + question.get_shift():Coords.answers[position].y2 + question.get_shift(),
-        Coords.answers[position].x1:Coords.answers[position].x2
-    ]
+    box = boxes(profile)[1][position]
+    answer_image = screen[box.y1 + shift:box.y2 + shift, box.x1:box.x2]
 
     # Debug, uncomment to:
     # show a window with the answer image, cropped from the screenshot until a key is pressed
     #cv2.imshow(f"Answer {position}",answer_image)
     #cv2.waitKey(0)
 
-    # Extract answer's text from cropped screenshot as string
-    answer_text = image_to_string(answer_image,config=OCR_CONFIG_ANSWER).lower().strip()
-    # Sanitize the answer and add it to the current question into quiz object
-    question.add_answer(answer_text,Sanitize.clean_answer(answer_text),position)
-    
\ No newline at end of file
+    return ocr(preprocess(answer_image, PREPROCESS_ANSWER), OCR_CONFIG_ANSWER).lower().strip()
+
+def count_question_rows(screen, min_row_height=5, profile=None):
+    # Count the rows of text of the question straight from the pixels, so the answers' shift
+    # is known before the question is read and the answers can be read at the same time
+    box = boxes(profile)[0]
+    question_image = screen[box.y1:box.y2, box.x1:box.x2]
+    if question_image.size == 0:
+        return 0
+    binary = text_pixels(question_image)
+    # Horizontal projection: a pixel row is text if it has some white pixels,
+    # and a row of text is a run of at least <min_row_height> pixel rows
+    text_rows = (binary > 0).sum(axis=1) > max(1, binary.shape[1] // 100)
+    rows, run = 0, 0
+    for is_text in list(text_rows) + [False]:
+        if is_text:
+            run += 1
+            continue
+        if run >= min_row_height:
+            rows += 1
+        run = 0
+    return rows
+
+def question_shift(screen, profile=None):
+    # With a layout profile, where the answers' buttons are on this frame (see Layout)
+    profile = profile or layout_profile
+    if profile is not None:
+        shift = profile.relocate(screen)
+        if shift is not None:
+            return shift
+    # Otherwise, the answers' shift for the number of rows of the question (see Coords.answers_shift)
+    rows = count_question_rows(screen, profile=profile)
+    shift = Coords.answers_shift[min(rows, len(Coords.answers_shift)) - 1] if rows else 0
+    return shift - profile.base_shift if profile is not None else shift
+
+def question_box(screen, profile=None):
+    # The box of a layout profile is the question of the frame it was detected on:
+    # a longer question pushes the answers down, and grows down by as much
+    profile = profile or layout_profile
+    if profile is None:
+        return Coords.question
+    shift = max(0, question_shift(screen, profile))
+    return Coordinate(profile.question.x1, profile.question.y1, profile.question.x2, profile.question.y2 + shift)
+
+def detect_layout(screen):
+    # Find the boxes on <screen>, or load them from the profile saved for its size
+    # (see Layout.load_or_detect), and crop them from now on
+    global layout_profile
+    profile = Layout.load_or_detect(screen, question_shift(screen))
+    profile.apply()
+    layout_profile = profile
+    return profile
+
+
+def words_to_text(words, separator):
+    # Rebuild the text from a list of words: same line words are joined
+    # by a space, different lines by <separator>
+    lines = dict()
+    for word in words:
+        lines.setdefault(word.line, list()).append(word.text.strip())
+    return separator.join(' '.join(line) for line in lines.values())
+
+def inside(word, box, shift=0):
+    # True if the center of the word falls into the (vertically shifted) box
+    x, y = (word.x1 + word.x2) / 2, (word.y1 + word.y2) / 2
+    return box.x1 <= x <= box.x2 and box.y1 + shift <= y <= box.y2 + shift
+
+@traced("ocr_layout")
+def extract_layout(screen, quiz, profile=None):
+    # Single-pass alternative to extract_question + extract_answer:
+    # the whole emulator window is read once, then each word is assigned
+    # to the question or to an answer based on its position
+    words = ocr_words(screen, OCR_CONFIG_LAYOUT)
+    question_coords, answers_coords = boxes(profile)
+
+    # Instead of guessing the shift from the number of rows of the question,
+    # use the shift that fits the most words, below the question, into the answers' boxes
+    # (or just the shift of the layout profile, if there is one)
+    below_question = [word for word in words if (word.y1 + word.y2) / 2 > question_coords.y2]
+    shift = max(
+        [question_shift(screen, profile)] if (profile or layout_profile) is not None else sorted(set(Coords.answers_shift)),
+        key=lambda shift: sum(
+            any(inside(word, box, shift) for box in answers_coords) for word in below_question
+        )
+    )
+
+    # The question is everything inside its box, and down to the first answer
+    whole_question = Coordinate(
+        question_coords.x1, question_coords.y1,
+        question_coords.x2, max(question_coords.y2, answers_coords[0].y1 + shift - 1)
+    )
+    question_text = words_to_text([word for word in words if inside(word, whole_question)], '\n')
+    question = quiz.new_question(question_text if question_text != "" else "OCR Failed")
+    question.set_shift(shift)
+
+    # Same as extract_answer, for each answer's box
+    for position, box in enumerate(answers_coords):
+        answer_text = words_to_text([word for word in words if inside(word, box, shift)], ' ').lower().strip()
+        question.add_answer(answer_text, Sanitize.clean_answer(answer_text), position)
+
+    return question
+
+
+# The tuned OCR profile, if there's one
+load_ocr_profile()
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+from math import ceil
+from time import perf_counter, sleep
+from threading import Lock
+from collections import deque
+from urllib.error import HTTPError
+from http.client import HTTPException
+from urllib.parse import quote_plus, urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Everything between Scraping.search and the network: the search providers,
+# a token bucket for each one so a burst of queries doesn't get throttled,
+# bounded retries of the failed requests, and hedged requests: if the reply is
+# slower than the 95th percentile of the recent ones, the same query is sent again
+# to the second provider and the first reply wins. Never to the same provider: the
+# duplicate would double the slow requests right where they're being throttled.
+
+# Log-spaced buckets of the latency histograms, in milliseconds
+HISTOGRAM_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000]
+
+
+class LatencyHistogram:
+    # Latencies of the requests of a provider: counts in HISTOGRAM_BUCKETS for the
+    # report, and the last <window> samples for the percentiles
+
+    def __init__(self, window=200):
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.recent = deque(maxlen=window)
+        self.lock = Lock()
+
+    def record(self, seconds):
+        milliseconds = seconds * 1000
+        with self.lock:
+            self.recent.append(milliseconds)
+            bucket = next((index for index, limit in enumerate(HISTOGRAM_BUCKETS) if milliseconds <= limit), len(HISTOGRAM_BUCKETS))
+            self.counts[bucket] += 1
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def percentile(self, rank):
+        # Nearest-rank percentile of the recent latencies, in milliseconds, None if there are none
+        with self.lock:
+            values = sorted(self.recent)
+        return values[max(0, ceil(rank / 100 * len(values)) - 1)] if values else None
+
+    def render(self, width=40):
+        # A text histogram, a line for each bucket from the first to the last one used
+        used = [index for index, count in enumerate(self.counts) if count]
+        if not used:
+            return "no requests"
+        lines = list()
+        most = max(self.counts)
+        for index in range(used[0], used[-1] + 1):
+            label = f"<= {HISTOGRAM_BUCKETS[index]}ms" if index < len(HISTOGRAM_BUCKETS) else f"> {HISTOGRAM_BUCKETS[-1]}ms"
+            bar = '#' * round(self.counts[index] / most * width)
+            lines.append(f"{label:>10} {bar:<{width}} {self.counts[index]}")
+        return '\n'.join(lines)
+
+    def summary(self):
+        p50, p95, p99 = (self.percentile(rank) for rank in (50, 95, 99))
+        return f"{len(self)} requests, p50 {p50:.0f}ms, p95 {p95:.0f}ms, p99 {p99:.0f}ms" if p50 is not None else "no requests"
+
+
+class TokenBucket:
+    # At most <rate> requests per second on average, in bursts of at most <burst>
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = perf_counter()
+        self.lock = Lock()
+
+    def acquire(self, block=True):
+        # Block until there's a token, and take it. Without <block>, take it
+        # only if there's one right now: True if it was taken
+        while True:
+            with self.lock:
+                now = perf_counter()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                if not block:
+                    return False
+                wait_time = (1 - self.tokens) / self.rate
+            sleep(wait_time)
+
+
+class Provider:
+    # A search engine answering with Google-like result pages (see Extract):
+    # the query of a search URL is sent to <base_url> instead
+
+    def __init__(self, name, base_url, rate=None, burst=4):
+        self.name = name
+        self.base_url = base_url
+        self.host = urlsplit(base_url).netloc
+        # No rate limit if <rate> is None
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.latencies = LatencyHistogram()
+
+    def url(self, url):
+        query = parse_qs(urlsplit(url).query).get('q', [''])[0]
+        return self.base_url + quote_plus(query)
+
+    def take(self):
+        # A token for a request right now, without waiting for it
+        return self.bucket is None or self.bucket.acquire(block=False)
+
+    def get(self, client, url, taken=False):
+        # <taken> if the token of this request was already taken (see take)
+        if self.bucket and not taken:
+            self.bucket.acquire()
+        start = perf_counter()
+        page = client.get(self.url(url))
+        self.latencies.record(perf_counter() - start)
+        return page
+
+
+def google(rate=None):
+    from Scraping import google_url
+    return Provider("google", google_url, rate)
+
+def local(server, rate=None, name="local"):
+    # The stand-in server of LocalServer, for tests and benchmarks
+    from LocalServer import search_url
+    return Provider(name, search_url(server), rate)
+
+def create_backend(rate=None, hedge_url=None):
+    # Google, rate limited to <rate> searches per second, and hedged to <hedge_url>
+    # (a search URL like google_url, the query is appended to it), with the same rate
+    providers = [google(rate)]
+    if hedge_url:
+        providers.append(Provider(urlsplit(hedge_url).netloc or "hedge", hedge_url, rate))
+    return SearchBackend(providers, hedge=bool(hedge_url))
+
+
+def retryable(error):
+    # Throttled, a server error, or the network: worth another try
+    if isinstance(error, HTTPError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (HTTPException, OSError))
+
+
+class SearchBackend:
+    # Send each search to the providers, with retries and hedged requests.
+    # <hedge> False, or a single provider, sends every search only once; otherwise the
+    # duplicate is sent to the second provider after
+    # the <hedge_percentile> of the recent latencies of the provider, or after <hedge_delay>
+    # seconds until there are at least <min_samples> of them
+
+    def __init__(self, providers, retries=2, backoff=0.1, hedge=True, hedge_percentile=95, hedge_delay=1.0, min_samples=20, max_workers=16):
+        self.providers = list(providers)
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.min_samples = min_samples
+        # Latencies of the searches as seen by Scraping.search, whichever request won
+        self.latencies = LatencyHistogram()
+        self.hedged = self.hedge_wins = self.hedge_throttled = 0
+        self.lock = Lock()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Search")
+
+    def delay(self, provider):
+        if len(provider.latencies) < self.min_samples:
+            return self.hedge_delay
+        return provider.latencies.percentile(self.hedge_percentile) / 1000
+
+    def get(self, client, url):
+        # The page of the search <url> and the host of the provider that sent it (the
+        # results of different providers are different, see Scraping.normalize_query),
+        # with up to <retries> more tries on a retryable error
+        start = perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                page, host = self.hedged_get(client, url)
+                self.latencies.record(perf_counter() - start)
+                return page, host
+            except Exception as error:
+                if attempt == self.retries or not retryable(error):
+                    raise
+                sleep(self.backoff * 2 ** attempt)
+
+    def hedged_get(self, client, url):
+        primary = self.providers[0]
+        if not self.hedge or len(self.providers) < 2:
+            return primary.get(client, url), primary.host
+        first = self.pool.submit(primary.get, client, url)
+        done, _ = wait([first], self.delay(primary))
+        if done:
+            return first.result(), primary.host
+        # Too slow: the same search again, the first reply wins. Unless the second provider
+        # is out of tokens: a duplicate waiting for its bucket would be late anyway
+        secondary = self.providers[1]
+        if not secondary.take():
+            with self.lock:
+                self.hedge_throttled += 1
+            return first.result(), primary.host
+        second = self.pool.submit(secondary.get, client, url, True)
+        with self.lock:
+            self.hedged += 1
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        with self.lock:
+                            self.hedge_wins += 1
+                    # The other request goes on, its connection goes back to the pool when it's done
+                    return future.result(), (secondary if future is second else primary).host
+        # Both failed
+        return first.result(), primary.host
+
+    def stats(self):
+        lines = [
+            f"searches: {self.latencies.summary()}, {self.hedged} hedged, {self.hedge_wins} won by the duplicate, {self.hedge_throttled} not hedged (rate limit)",
+            self.latencies.render()
+        ]
+        for provider in self.providers:
+            lines.append(f"{provider.name}: {provider.latencies.summary()}")
+            lines.append(provider.latencies.render())
+        return '\n'.join(lines)
+
+    def close(self):
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+import Cache
+import Trace
+import Watch
+import Layout
+import Capture
+import Planner
+import Search
+import Pipeline
+import Sanitize
+import Scraping
+import Scheduler
+import Screenshot
+
+from Quiz import Quiz
+from os import makedirs
+from datetime import datetime
+from time import perf_counter
+from threading import Thread, Lock
+from Coords import Coordinate
+from argparse import ArgumentParser
+
+# Several quizzes at the same time, one for each emulator window: each session has
+# its own capture region, layout, tracer and quiz folder, and runs on its own thread, while
+# the OCR engines, the HTTP client and the search cache are the ones of this process,
+# shared by all the sessions. The work of each question (OCR and searches) goes
+# to a single Scheduler.FairExecutor, that serves the sessions in turn.
+#
+# Nothing here changes the layout of the process (Screenshot.layout_profile and Coords,
+# see Screenshot.detect_layout): a session crops the boxes of its own profile, or the
+# Coords as they are when it has none.
+#
+# Sessions are unattended: they start when a new question is on screen (see Watch),
+# and nobody tells them the correct answer, so it's left unknown (0) in the report.
+
+# One line at a time, from all the sessions
+print_lock = Lock()
+
+
+class Session:
+
+    def __init__(self, name, capture_backend, quiz, profile=None, detect=False, watch=False, record=True, trace=False):
+        self.name = name
+        self.capture_backend = capture_backend
+        self.quiz = quiz
+        # Layout of this emulator window, detected on the first screenshot if <detect>
+        self.profile = profile
+        self.detect = detect
+        self.watcher = Watch.Watcher(capture_backend, box=profile.question if profile else None) if watch else None
+        # Append the new questions to the report (not for a replay)
+        self.record = record
+        # Perf counter when each question was decided
+        self.decided = list()
+        # Spans of this session only, in Trace.jsonl of its quiz folder
+        self.tracer = Trace.Tracer()
+        if trace:
+            self.tracer.enable(f"{quiz.folder_name}/Trace.jsonl")
+
+    def log(self, text):
+        with print_lock:
+            print(f"[{self.name}] {text}")
+
+    def play(self, pool, archiver, num_questions, layout=False, budget=10, confidence=0):
+        Trace.use(self.tracer)
+        for i in range(1, num_questions + 1):
+            latency = self.watcher.wait_new_question() if self.watcher else 0
+            deadline = Scheduler.Deadline(budget - latency if budget else budget)
+            filename = f"{self.quiz.folder_name}/Question-{i}.png"
+            self.tracer.new_question(i)
+            try:
+                with Trace.span("capture"):
+                    screenshot, archived = self.capture_backend.grab(filename)
+            except RuntimeError:
+                # There are no more screenshots to replay
+                break
+            if not archived:
+                archiver.save(filename, screenshot)
+
+            if self.detect and self.profile is None:
+                try:
+                    self.profile = Layout.load_or_detect(screenshot, Screenshot.question_shift(screenshot))
+                    if self.watcher:
+                        self.watcher.box = self.profile.question
+                except ValueError as error:
+                    self.log(f"Layout not detected, using Coords: {error}")
+                    self.detect = False
+
+            question, speculation = Pipeline.start(pool, self.quiz, screenshot, layout, deadline, self.profile)
+            decision = speculation.result(deadline, confidence)
+            self.decided.append(perf_counter())
+            if decision.answer is not None:
+                question.set_guessed_answer(question.answers.index(decision.answer) + 1)
+                self.log(f"Question n.{i}: {decision.answer.get_text()} ({decision.strategy}, {decision.reason})")
+            else:
+                self.log(f"Question n.{i}: choose a random answer ({decision.reason})")
+            spans = self.tracer.flush()
+            if spans:
+                self.log(f"Timing: {Trace.summary(spans)}")
+            # The questions not in the report yet, without the correct answer
+            if self.record and i > self.quiz.answered:
+                self.quiz.record(question)
+        self.quiz.close()
+
+
+def run(sessions, workers, num_questions, layout=False, budget=10, confidence=0):
+    # Play all the <sessions> at the same time, on a pool of <workers> threads,
+    # and print the throughput of each one and of all of them
+    executor = Scheduler.FairExecutor(workers)
+    archiver = Capture.Archiver()
+    threads = [
+        Thread(
+            target=session.play, name=session.name,
+            args=(executor.session(session.name), archiver, num_questions, layout, budget, confidence)
+        ) for session in sessions
+    ]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+    executor.shutdown()
+    archiver.close()
+
+    # Questions decided per minute
+    for session in sessions:
+        print(f"{session.name:<16}{len(session.decided):>6} questions   {len(session.decided) / elapsed * 60:>8.1f} per minute")
+    decided = sum(len(session.decided) for session in sessions)
+    print(f"{'All sessions':<16}{decided:>6} questions   {decided / elapsed * 60:>8.1f} per minute, in {elapsed:.1f}s")
+    return decided / elapsed * 60
+
+def parse_region(text):
+    # "x,y,width,height" of an emulator window, like Coords.emulator
+    return Coordinate(*map(int, text.split(',')))
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(prog="Sessions", description="Play several quizzes at the same time, one for each emulator window")
+    # Each directory, or each region, is a session
+    parser.add_argument("-d","--directories",nargs='+',default=None,type=str,help="replay these quiz folders, one session each")
+    parser.add_argument("-r","--regions",nargs='+',default=None,type=str,help="x,y,width,height of each emulator window, one session each")
+    parser.add_argument("-n","--questions",default=12,type=int,help="number of questions to answer in each session")
+    parser.add_argument("-w","--workers",default=None,type=int,help="threads shared by the sessions, by default OCR engines for each session")
+    parser.add_argument("--ocr",default=None,choices=["tesserocr","pytesseract"],help="OCR backend to use")
+    parser.add_argument("--capture",default=None,choices=["screencapture","x11","framebuffer"],help="screen capture backend to use")
+    parser.add_argument("--layout",action="store_true",help="single-pass OCR of the whole screenshot")
+    parser.add_argument("--detect",action="store_true",help="detect the boxes of question and answers on screen")
+    parser.add_argument("--trace",action="store_true",help="trace the timing of each stage, for each session")
+    parser.add_argument("--cache",default=Cache.SEARCH_CACHE_PATH,type=str,help="path to the search cache")
+    parser.add_argument("--no-cache",action="store_true",help="always search on the network and run the OCR")
+    parser.add_argument("--offline",action="store_true",help="answer every search from the cache only")
+    parser.add_argument("--hedge",default=None,type=str,metavar="URL",help="hedge the slow searches with a duplicate request to this search URL, like https://www.google.com/search?q=")
+    parser.add_argument("--rate",default=None,type=float,help="maximum searches per second, of all the sessions")
+    parser.add_argument("--language",default="ita",type=str,help="language profile used to clean the text")
+    parser.add_argument("--planner",default=None,nargs='?',const=Planner.PLANNER_PATH,type=str,help="plan the searches with this cost model (see Planner)")
+    parser.add_argument("--budget",default=10,type=float,help="seconds to answer each question")
+    parser.add_argument("--confidence",default=0,type=int,help="margin of matches to decide without the concatenated queries")
+    args = parser.parse_args()
+
+    if bool(args.directories) == bool(args.regions):
+        exit("Specify one parameter between --directories and --regions!")
+    if args.offline and args.no_cache:
+        exit("Specify only one parameter between --offline and --no-cache!")
+    if not args.no_cache:
+        Scraping.cache = Cache.SearchCache(args.cache)
+        Screenshot.ocr_cache = Cache.OCRCache()
+    Scraping.offline = args.offline
+    if args.hedge or args.rate:
+        Scraping.backend = Search.create_backend(args.rate, args.hedge)
+    Sanitize.set_language(args.language)
+    if args.planner:
+        Planner.model = Planner.CostModel.load(args.planner)
+
+    sessions = list()
+    if args.directories:
+        for path_directory in args.directories:
+            backend = Capture.ReplayBackend.from_directory(path_directory)
+            sessions.append(Session(path_directory, backend, Quiz(path_directory), detect=args.detect, record=False, trace=args.trace))
+    else:
+        now = datetime.now().strftime("%Y-%m-%d-%H%M")
+        for index, region in enumerate(args.regions, start=1):
+            folder_name = f"Quizzes/{now}-session-{index}"
+            makedirs(folder_name, exist_ok=True)
+            backend = Capture.create_backend(args.capture, parse_region(region))
+            sessions.append(Session(f"session-{index}", backend, Quiz(folder_name), detect=args.detect, watch=True, trace=args.trace))
+
+    workers = args.workers or Screenshot.OCR_POOL_SIZE * len(sessions)
+    # An OCR engine for each thread, and enough connections for the searches of all the sessions
+    Screenshot.set_ocr_backend(args.ocr, pool_size=workers)
+    Scraping.set_client(max_connections_per_host=workers)
+
+    run(sessions, workers, args.questions, args.layout, args.budget, args.confidence)
+
+    Screenshot.ocr_backend.close()
+    if Scraping.cache is not None:
+        print(f"Search cache: {Scraping.cache.stats()}")
+        Scraping.cache.close()
+    if Screenshot.ocr_cache is not None:
+        print(f"OCR cache: {Screenshot.ocr_cache.stats()}")
+        Screenshot.ocr_cache.close()
+    if Scraping.backend is not None:
+        print(Scraping.backend.stats())
+        Scraping.backend.close()
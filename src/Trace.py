@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import json
+import threading
+
+from time import perf_counter
+from functools import wraps
+from contextvars import ContextVar
+from threading import Lock, current_thread
+from contextlib import contextmanager, nullcontext
+
+# Per-stage tracing of each question: every traced stage records a span
+# (start, end, thread) relative to the start of the question.
+# When tracing is off, span() returns a shared no-op context and traced()
+# functions only pay for a flag check, so the overhead is negligible.
+
+# Order in which the stages are printed, the others follow in order of appearance
+STAGES_ORDER = [
+    "capture", "ocr_question", "ocr_answer", "ocr_layout", "sanitize",
+    "search", "match", "concat", "decision"
+]
+
+NO_SPAN = nullcontext()
+
+
+class Tracer:
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.question = 0
+        self.start = perf_counter()
+        self.spans = list()
+        self.lock = Lock()
+
+    def enable(self, path):
+        # Spans are appended to <path>, as JSON lines
+        self.enabled = True
+        self.path = path
+
+    def new_question(self, number):
+        # Following spans belong to question <number>, timed from now
+        self.question = number
+        self.start = perf_counter()
+        self.spans = list()
+
+    @contextmanager
+    def record(self, stage):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            end = perf_counter()
+            with self.lock:
+                self.spans.append({
+                    "question": self.question,
+                    "stage": stage,
+                    "thread": current_thread().name,
+                    "start": round((start - self.start) * 1000, 3),
+                    "end": round((end - self.start) * 1000, 3),
+                })
+
+    def span(self, stage):
+        return self.record(stage) if self.enabled else NO_SPAN
+
+    def flush(self):
+        # Write the spans of the current question and return them
+        with self.lock:
+            spans, self.spans = self.spans, list()
+        if self.enabled and spans:
+            with open(self.path, 'a') as trace_file:
+                trace_file.writelines(json.dumps(span) + '\n' for span in spans)
+        return spans
+
+
+# The tracer of this process
+tracer = Tracer()
+# The tracer of a session, when it's not the one of the process (see Sessions): set by
+# use() in the session's thread, and seen by its tasks on the pool (see Scheduler.FairExecutor)
+session_tracer = ContextVar("session_tracer", default=None)
+
+def use(session):
+    # The spans of this thread, and of the tasks it submits, go to <session>
+    session_tracer.set(session)
+
+def current():
+    return session_tracer.get() or tracer
+
+def span(stage):
+    # Usage: with Trace.span("stage"): ...
+    return current().span(stage)
+
+def traced(stage):
+    # Decorator version of span(), for a whole function
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            active = current()
+            if not active.enabled:
+                return function(*args, **kwargs)
+            with active.record(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def summary(spans):
+    # A compact line with the duration of each stage: "ocr_answer 3x 120ms" means
+    # three spans, the slowest one took 120ms
+    stages = dict()
+    for item in spans:
+        stages.setdefault(item["stage"], list()).append(item["end"] - item["start"])
+    ordered = sorted(stages, key=lambda stage: STAGES_ORDER.index(stage) if stage in STAGES_ORDER else len(STAGES_ORDER))
+    parts = [
+        f"{stage} {len(stages[stage])}x {max(stages[stage]):.0f}ms" if len(stages[stage]) > 1 else f"{stage} {stages[stage][0]:.0f}ms"
+        for stage in ordered
+    ]
+    total = max(item["end"] for item in spans) if spans else 0
+    return f"{' | '.join(parts)} | total {total:.0f}ms"
+
+
+# File of each kind of profile, next to the report of the quiz
+PROFILE_FILES = {"cprofile": "Profile.prof", "sampling": "Profile.txt"}
+
+def sampling_available():
+    # pyinstrument is optional, not in requirements.txt
+    from importlib.util import find_spec
+    return find_spec("pyinstrument") is not None
+
+
+class Profiler:
+    # Optional profiler of a whole run: "cprofile" (deterministic, standard library)
+    # or "sampling" (pyinstrument, if installed, much lower overhead).
+    # The OCR and the searches run on the threads of the pool: cProfile only sees the
+    # thread that enables it, so each thread started after start() gets its own one
+    # (see threading.setprofile), and their stats are merged by stop(). pyinstrument
+    # only samples the main thread, the one waiting for the pool.
+
+    def __init__(self, kind, path):
+        self.kind, self.path = kind, path
+        if kind == "sampling":
+            from pyinstrument import Profiler as SamplingProfiler
+            self.profiler = SamplingProfiler()
+        else:
+            from cProfile import Profile
+            self.profiler = Profile()
+            self.profiles = [self.profiler]
+            self.lock = Lock()
+
+    def start(self):
+        if self.kind == "sampling":
+            self.profiler.start()
+        else:
+            threading.setprofile(self.profile_thread)
+            self.profiler.enable()
+
+    def profile_thread(self, frame, event, arg):
+        # Called by each new thread on its first event, then cProfile takes over the thread
+        from cProfile import Profile
+        profile = Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: cProfile is built on sys.monitoring, the first one already sees every thread
+            sys.setprofile(None)
+            return
+        with self.lock:
+            self.profiles.append(profile)
+
+    def stop(self):
+        if self.kind == "sampling":
+            self.profiler.stop()
+            with open(self.path, 'w') as profile_file:
+                profile_file.write(self.profiler.output_text())
+            print(self.profiler.output_text())
+        else:
+            from pstats import Stats
+            threading.setprofile(None)
+            self.profiler.disable()
+            with self.lock:
+                stats = Stats(*self.profiles)
+            stats.dump_stats(self.path)
+            print(f"{len(self.profiles)} threads profiled")
+            stats.sort_stats("cumulative").print_stats(20)
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+import json
+import Capture
+import Screenshot
+
+from os import makedirs, replace
+from os.path import dirname, isfile
+from math import ceil
+from time import perf_counter
+from csv import DictReader, DictWriter
+from itertools import product
+from argparse import ArgumentParser
+
+# Find the OCR preprocessing (see Screenshot.preprocess) and tesseract settings that
+# read the saved screenshots best: the question and the answers cropped from each
+# Question-N.png are read with every combination, and the text is compared with the
+# ground truth of its quiz. Character accuracy is 1 minus the edit distance over the
+# length of the text, latency is the time of preprocessing and OCR of each crop.
+#
+# The ground truth is Truth.csv, in the quiz folder: the text columns of Report.csv,
+# corrected by hand (--write-truth copies them there, to start from). Report.csv holds
+# the text as read by the current settings, so with it as ground truth (--from-report)
+# the current settings score near 100% by construction: it's only good for a look at
+# the latency, and the results can't be saved.
+#
+# By default the search is greedy: first the preprocessing with the current settings,
+# then the settings with the best preprocessing; --exhaustive tries every couple.
+
+# Ground truth of a quiz folder, with these columns of Report.csv
+TRUTH_FILE = "Truth.csv"
+TRUTH_COLUMNS = ["Question", "First answer", "Second answer", "Third answer"]
+
+# Characters of the questions and of the answers, for the whitelist settings
+WHITELIST = (
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    "àèéìòùÀÈÉÌÒÙ.,;:!?'-()%/&"
+)
+
+
+def edit_distance(first, second):
+    # Levenshtein distance, a row at a time
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, start=1):
+        current = [i]
+        for j, second_char in enumerate(second, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (first_char != second_char)))
+        previous = current
+    return previous[-1]
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+def character_accuracy(text, truth):
+    text, truth = normalize(text), normalize(truth)
+    return max(0.0, 1 - edit_distance(text, truth) / max(len(truth), 1))
+
+def tesseract_config(oem, psm, lang, whitelist=False):
+    config = f"--oem {oem} --psm {psm} -l {lang}"
+    return config + f' -c "tessedit_char_whitelist={WHITELIST}"' if whitelist else config
+
+
+def read_rows(path):
+    with open(path, newline='') as csv_file:
+        return list(DictReader(csv_file))
+
+def write_truth(directories):
+    # Copy the text columns of each Report.csv to a Truth.csv to correct by hand, if there isn't one
+    for path_directory in directories:
+        report_path, truth_path = f"{path_directory}/Report.csv", f"{path_directory}/{TRUTH_FILE}"
+        if not isfile(report_path) or isfile(truth_path):
+            continue
+        with open(truth_path, 'w', newline='') as truth_file:
+            writer = DictWriter(truth_file, TRUTH_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(read_rows(report_path))
+        print(f"{truth_path} written, fix the text read wrong before tuning")
+
+def load_crops(directories, from_report=False):
+    # The question and answers' crops of every screenshot with a row in the ground truth of
+    # its quiz: {"question": [(crop, text)], "answer": [(crop, text)]}, and the number of
+    # screenshots whose ground truth is Report.csv (<from_report>, where there's no Truth.csv)
+    crops = {"question": list(), "answer": list()}
+    uncorrected = 0
+    for path_directory in directories:
+        truth_path, report_path = f"{path_directory}/{TRUTH_FILE}", f"{path_directory}/Report.csv"
+        if isfile(truth_path):
+            rows = read_rows(truth_path)
+        elif from_report and isfile(report_path):
+            rows = read_rows(report_path)
+            uncorrected += min(len(rows), len(Capture.list_screenshots(path_directory)))
+        else:
+            continue
+        for path_screenshot, row in zip(Capture.list_screenshots(path_directory), rows):
+            screen = Screenshot.load_image(path_screenshot)
+            box = Screenshot.question_box(screen)
+            crops["question"].append((screen[box.y1:box.y2, box.x1:box.x2], row["Question"]))
+            # The answers' shift from the pixels, like Pipeline
+            shift = Screenshot.question_shift(screen)
+            for box, column in zip(Screenshot.boxes()[1], ["First answer", "Second answer", "Third answer"]):
+                crops["answer"].append((screen[box.y1 + shift:box.y2 + shift, box.x1:box.x2], row[column]))
+    return crops, uncorrected
+
+def count_differences(crops, steps, config):
+    # Crops whose ground truth is not what <config> reads now: none means the ground truth
+    # is just the output of these settings, and their accuracy says nothing
+    backend = Screenshot.ocr_backend
+    return sum(
+        normalize(backend.image_to_string(Screenshot.preprocess(crop, steps), config)) != normalize(truth)
+        for crop, truth in crops
+    )
+
+def measure(crops, steps, config):
+    # Mean latency and 95th percentile in milliseconds, and mean character accuracy, of a combination
+    backend = Screenshot.ocr_backend
+    # The first crop loads the models, if they're new
+    backend.image_to_string(Screenshot.preprocess(crops[0][0], steps), config)
+    latencies, accuracy = list(), 0.0
+    for crop, truth in crops:
+        start = perf_counter()
+        text = backend.image_to_string(Screenshot.preprocess(crop, steps), config)
+        latencies.append((perf_counter() - start) * 1000)
+        accuracy += character_accuracy(text, truth)
+    latencies.sort()
+    p95 = latencies[max(0, ceil(0.95 * len(latencies)) - 1)]
+    return sum(latencies) / len(latencies), p95, accuracy / len(crops)
+
+def preprocessing_grid(scales):
+    return [
+        {"scale": scale, "crop": crop, "binarize": binarize, "invert": invert}
+        for scale, crop, binarize, invert in product(scales, (False, True), (False, True), (False, True))
+    ]
+
+def settings_grid(oems, psms, langs, whitelist):
+    return [
+        tesseract_config(oem, psm, lang, use_whitelist)
+        for oem, psm, lang, use_whitelist in product(oems, psms, langs, (False, True) if whitelist else (False,))
+    ]
+
+def describe(steps):
+    names = [name for name in ("crop", "binarize", "invert") if steps.get(name)]
+    if steps.get("scale", 1) != 1:
+        names.insert(0, f"scale {steps['scale']}")
+    return '+'.join(names) or "none"
+
+def tune(crops, current, preprocessings, settings, exhaustive=False, tolerance=0.005):
+    # Every combination measured on the <crops> of a box, and the best one: the fastest among
+    # the ones within <tolerance> of the best accuracy. <current> is the (steps, config) in use
+    results = dict()
+
+    def run(steps, config):
+        key = (describe(steps), config)
+        if key not in results:
+            results[key] = (steps, config, *measure(crops, steps, config))
+        return results[key]
+
+    def best():
+        top = max(result[4] for result in results.values())
+        return min((result for result in results.values() if result[4] >= top - tolerance), key=lambda result: result[2])
+
+    baseline = run(*current)
+    if exhaustive:
+        for steps, config in product(preprocessings, settings):
+            run(steps, config)
+    else:
+        for steps in preprocessings:
+            run(steps, current[1])
+        steps = best()[0]
+        for config in settings:
+            run(steps, config)
+    return baseline, best(), list(results.values())
+
+def print_results(field, baseline, chosen, results):
+    # Fastest first, the ones no other combination beats in both latency and accuracy marked with *
+    print(f"\n{field.capitalize()}: {len(results)} combinations")
+    print(f"{'':<2}{'Preprocessing':<32}{'Config':<40}{'Mean':>9}{'p95':>9}{'Accuracy':>10}")
+    for steps, config, mean, p95, accuracy in sorted(results, key=lambda result: result[2]):
+        dominated = any(other[2] < mean and other[4] >= accuracy or other[2] <= mean and other[4] > accuracy for other in results)
+        short = config.replace(f' -c "tessedit_char_whitelist={WHITELIST}"', " whitelist")
+        print(f"{' ' if dominated else '*':<2}{describe(steps):<32}{short:<40}{mean:>7.1f}ms{p95:>7.1f}ms{accuracy * 100:>9.1f}%")
+    for label, (steps, config, mean, p95, accuracy) in (("Current", baseline), ("Best", chosen)):
+        print(f"{label}: {describe(steps)}, {config}, {mean:.1f}ms, {accuracy * 100:.1f}%")
+
+def save_profile(path, profile):
+    # Written to a temporary file and renamed, like Layout.LayoutProfile.save
+    makedirs(dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", 'w') as profile_file:
+        json.dump(profile, profile_file, indent=4)
+    replace(f"{path}.tmp", path)
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(prog="Tuning", description="Tune the OCR preprocessing and settings on the saved screenshots")
+    parser.add_argument("directories",nargs='+',type=str,help="paths to quiz folders, with screenshots and Truth.csv")
+    parser.add_argument("--ocr",default=None,choices=["tesserocr","pytesseract"],help="OCR backend to use")
+    parser.add_argument("--scales",nargs='+',default=[1.0, 0.5],type=float,help="downscale factors to try")
+    parser.add_argument("--oems",nargs='+',default=[0, 1],type=int,help="tesseract engine modes to try")
+    parser.add_argument("--question-psms",nargs='+',default=[3, 6],type=int,help="page segmentation modes to try for the question")
+    parser.add_argument("--answer-psms",nargs='+',default=[7, 6, 13],type=int,help="page segmentation modes to try for the answers")
+    parser.add_argument("--langs",nargs='+',default=["ita+eng", "ita"],type=str,help="tesseract languages to try")
+    parser.add_argument("--no-whitelist",action="store_true",help="don't try the characters whitelist")
+    parser.add_argument("--exhaustive",action="store_true",help="try every preprocessing with every setting")
+    parser.add_argument("--tolerance",default=0.005,type=float,help="accuracy to give up for a faster combination")
+    parser.add_argument("--write-truth",action="store_true",help="copy the text of each Report.csv to a Truth.csv to correct by hand, and exit")
+    parser.add_argument("--from-report",action="store_true",help="use Report.csv as ground truth where there's no Truth.csv (biased, can't be saved)")
+    parser.add_argument("--save",action="store_true",help="write the best combinations to the OCR profile")
+    parser.add_argument("-o","--output",default=Screenshot.OCR_PROFILE_PATH,type=str,help="path to the OCR profile")
+    args = parser.parse_args()
+
+    if args.write_truth:
+        write_truth(args.directories)
+        exit()
+
+    crops, uncorrected = load_crops(args.directories, args.from_report)
+    print(f"Screenshots: {len(crops['question'])}, answers: {len(crops['answer'])}")
+    if not crops["question"]:
+        exit(f"No screenshots with a row in a {TRUTH_FILE}, see --write-truth (or --from-report)!")
+    if uncorrected:
+        print(f"Warning: the ground truth of {uncorrected} screenshots is Report.csv, biased towards the current settings")
+    if args.save and uncorrected:
+        exit(f"--save needs a corrected ground truth: a {TRUTH_FILE} in each quiz folder, see --write-truth")
+
+    # A single engine for each model, one crop at a time
+    Screenshot.set_ocr_backend(args.ocr, pool_size=1)
+
+    profile = dict()
+    current = {
+        "question": (Screenshot.PREPROCESS_QUESTION, Screenshot.OCR_CONFIG_QUESTION),
+        "answer": (Screenshot.PREPROCESS_ANSWER, Screenshot.OCR_CONFIG_ANSWER),
+    }
+    psms = {"question": args.question_psms, "answer": args.answer_psms}
+    for field in ("question", "answer"):
+        different = count_differences(crops[field], *current[field])
+        print(f"\n{field.capitalize()}: {different} of {len(crops[field])} texts of the ground truth differ from a fresh read with the current settings")
+        if not different:
+            print(f"Warning: the ground truth is what the current settings read, was it corrected?")
+        baseline, chosen, results = tune(
+            crops[field], current[field], preprocessing_grid(args.scales),
+            settings_grid(args.oems, psms[field], args.langs, not args.no_whitelist),
+            args.exhaustive, args.tolerance
+        )
+        print_results(field, baseline, chosen, results)
+        # How it was measured, next to what Screenshot loads
+        profile[field] = {
+            "config": chosen[1], "preprocess": chosen[0],
+            "measured": {
+                "crops": len(crops[field]), "mean_ms": round(chosen[2], 1), "accuracy": round(chosen[4], 4),
+                "current_mean_ms": round(baseline[2], 1), "current_accuracy": round(baseline[4], 4),
+            },
+        }
+    Screenshot.ocr_backend.close()
+
+    if args.save:
+        save_profile(args.output, profile)
+        print(f"\nOCR profile saved in {args.output}, loaded by Screenshot at startup")
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import Coords
+
+from time import sleep, perf_counter
+from tempfile import NamedTemporaryFile
+from numpy import int16, abs as np_abs
+
+
+class Watcher:
+    # Wait for a new question without pressing enter: the question box is polled
+    # every <interval> seconds, downscaled to a tiny grey thumbnail and compared with
+    # the previous one by mean absolute difference. A new question is triggered when
+    # the box changed, then stayed the same for <stable_frames> polls (the animation
+    # is over) and it is not empty (there is some text in it).
+
+    def __init__(self, backend, interval=0.1, threshold=6.0, stable_frames=2, min_contrast=12.0, size=(48, 16), box=None, fallback_interval=0.5):
+        self.backend = backend
+        # The question's box to watch, Coords.question by default
+        self.box = box
+        # Grabbing the whole window to crop the box is much slower, don't do it ten times a second
+        self.interval = interval if hasattr(backend, "grab_box") else max(interval, fallback_interval)
+        self.threshold = threshold
+        self.stable_frames = stable_frames
+        self.min_contrast = min_contrast
+        self.size = size
+        # Thumbnail of the last question triggered
+        self.last_question = None
+
+    def grab_question_box(self):
+        # Capture backends able to grab a single box do it, for the others grab
+        # the whole emulator window and crop it
+        box = self.box or Coords.question
+        if hasattr(self.backend, "grab_box"):
+            return self.backend.grab_box(box)
+        with NamedTemporaryFile(suffix=".png") as temp_file:
+            screenshot, _ = self.backend.grab(temp_file.name)
+        return screenshot[box.y1:box.y2, box.x1:box.x2]
+
+    def thumbnail(self):
+        # INTER_AREA averages the pixels: antialiasing and OCR noise don't count
+        return cv2.resize(self.grab_question_box(), self.size, interpolation=cv2.INTER_AREA).astype(int16)
+
+    def difference(self, first, second):
+        return float(np_abs(first - second).mean()) if first is not None else float("inf")
+
+    def wait_new_question(self, stop=None):
+        # Block until a new question is on screen, return the latency between the
+        # first frame where it was detected and the trigger, in seconds.
+        # <stop> is called at every poll: when it returns True, stop watching and return None
+        previous = self.thumbnail()
+        changed_at, stable = None, 0
+        while True:
+            sleep(self.interval)
+            if stop is not None and stop():
+                return None
+            current = self.thumbnail()
+            if self.difference(previous, current) > self.threshold:
+                # Something is moving, wait for it to settle
+                changed_at = changed_at or perf_counter()
+                stable = 0
+            else:
+                stable += 1
+                is_new = self.difference(self.last_question, current) > self.threshold
+                has_text = current.std() > self.min_contrast
+                if stable >= self.stable_frames and is_new and has_text:
+                    self.last_question = current
+                    return perf_counter() - (changed_at or perf_counter())
+                if stable >= self.stable_frames:
+                    # Settled on something that is not a new question
+                    changed_at = None
+            previous = current
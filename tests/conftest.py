@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+from os.path import dirname, join
+
+# The modules of src import each other by name, like when they're run from there
+sys.path.insert(0, join(dirname(dirname(__file__)), "src"))
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import Cache
+import pytest
+import Scraping
+import Screenshot
+import numpy as np
+
+
+class FakeBackend:
+    # A search backend answering each URL with the page of <pages>, from <host>
+
+    def __init__(self, pages, host):
+        self.pages, self.host = pages, host
+
+    def get(self, client, url):
+        return self.pages[url], self.host
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = Cache.SearchCache(str(tmp_path / "SearchCache.sqlite"))
+    monkeypatch.setattr(Scraping, "cache", cache)
+    monkeypatch.setattr(Scraping, "offline", False)
+    monkeypatch.setattr(Scraping, "html_parser", "pyquery")
+    yield cache
+    cache.close()
+
+def page(*results):
+    body = ''.join(f'<div class="rc">{result}</div>' for result in results)
+    return f'<html><body><div id="result-stats">Circa 1.234 risultati</div>{body}</body></html>'.encode()
+
+
+def test_normalize_query_host():
+    assert Scraping.normalize_query("https://www.google.it/search?q=Chi+ha++scritto") == "www.google.it chi ha scritto"
+    assert Scraping.normalize_query("https://www.google.it/search?q=x", "www.google.com") == "www.google.com x"
+
+def test_empty_results_are_not_cached(monkeypatch, cache):
+    url = Scraping.define_url("domanda senza risultati")
+    monkeypatch.setattr(Scraping, "backend", FakeBackend({url: page()}, "www.google.it"))
+    assert Scraping.search(url) == []
+    assert len(cache) == 0
+
+def test_results_are_cached_by_host(monkeypatch, cache):
+    url = Scraping.define_url("capitale d'italia")
+    monkeypatch.setattr(Scraping, "backend", FakeBackend({url: page("Roma è la capitale")}, "www.google.it"))
+    assert Scraping.search(url)[0].text == "Roma è la capitale"
+    assert cache.get(Scraping.normalize_query(url))[0] == ["Roma è la capitale"]
+
+def test_hedged_results_are_cached_by_their_host(monkeypatch, cache):
+    # Answered by the second provider: not what google_url would have answered
+    url = Scraping.define_url("capitale di francia")
+    monkeypatch.setattr(Scraping, "backend", FakeBackend({url: page("Parigi")}, "www.google.com"))
+    Scraping.search(url)
+    assert cache.get(Scraping.normalize_query(url)) is None
+    assert cache.get(Scraping.normalize_query(url, "www.google.com"))[0] == ["Parigi"]
+
+def test_ocr_cache_key_of_backend(monkeypatch):
+    class Backend:
+        def __init__(self, name, text):
+            self.name, self.text = name, text
+        def image_to_string(self, image, config):
+            return self.text
+
+    monkeypatch.setattr(Screenshot, "ocr_cache", Cache.OCRCache(path=None))
+    image = np.zeros((10, 10), dtype=np.uint8)
+    monkeypatch.setattr(Screenshot, "ocr_backend", Backend("pytesseract", "uno"))
+    assert Screenshot.ocr(image, "--psm 7") == "uno"
+    monkeypatch.setattr(Screenshot, "ocr_backend", Backend("tesserocr", "due"))
+    assert Screenshot.ocr(image, "--psm 7") == "due"
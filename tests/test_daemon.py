@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import json
+import pytest
+import Daemon
+import Capture
+import numpy as np
+
+from Client import Connection
+from threading import Thread, Event
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    path = str(tmp_path / "Daemon.sock")
+    server = Daemon.Daemon(path, workers=1)
+    thread = Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05})
+    thread.start()
+    yield path
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def test_malformed_line_gets_an_error_reply(daemon):
+    connection = Connection(daemon)
+    try:
+        for line in (b"not json\n", b"[1, 2]\n"):
+            connection.file.write(line)
+            connection.file.flush()
+            assert "error" in json.loads(connection.file.readline())
+        # The connection is still served
+        assert "stats" in connection.send("stats")
+        with pytest.raises(RuntimeError, match="Unknown command"):
+            connection.send("nothing")
+    finally:
+        connection.close()
+
+
+class BlankBackend:
+    # A screen that never shows a question
+    def grab_box(self, box):
+        return np.zeros((40, 300), dtype=np.uint8)
+
+def test_watching_stops_when_the_client_is_gone(monkeypatch, tmp_path, daemon):
+    monkeypatch.setattr(Capture.ReplayBackend, "from_directory", lambda directory: BlankBackend())
+    finished = Event()
+    finish = Daemon.ClientHandler.finish
+    def finish_and_tell(handler):
+        finish(handler)
+        finished.set()
+    monkeypatch.setattr(Daemon.ClientHandler, "finish", finish_and_tell)
+
+    connection = Connection(daemon)
+    connection.send("start", directory=str(tmp_path))
+    # CTRL+C on Client.py --watch: the client is gone while the daemon waits for a question
+    connection.file.write(json.dumps({"command": "capture", "number": 1, "watch": True}).encode() + b"\n")
+    connection.file.flush()
+    connection.close()
+    assert finished.wait(5)
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+
+import Evaluate
+
+from concurrent.futures import Future
+
+
+def test_failed_question_is_undecided():
+    future = Future()
+    future.set_exception(ConnectionError("search failed"))
+    record = Evaluate.question_record(future, "Quizzes/2020-01-01-AM", 3, "Question-3.png", 2)
+    assert (record["question"], record["guessed"], record["correct"], record["reason"]) == (3, 0, 2, "error")
+    assert record["error"] == "ConnectionError: search failed"
+    # Counted like any other undecided question
+    Evaluate.summarize([record])
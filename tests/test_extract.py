@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import Extract
+import Scraping
+
+from glob import glob
+from os.path import basename, dirname, join
+
+PAGES = sorted(glob(join(dirname(dirname(__file__)), "fixtures", "results", "*.html")))
+
+
+@pytest.mark.parametrize("path", PAGES, ids=basename)
+def test_same_results_as_pyquery(path):
+    # The streaming extractor is not the default parser, it must not drift from it
+    page = open(path, "rb").read()
+    results, stats = Extract.extract(page)
+    assert results and stats
+    assert (results, stats) == Scraping.extract_results_pyquery(page)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import Knowledge
+
+
+@pytest.fixture
+def knowledge_base(tmp_path):
+    knowledge_base = Knowledge.KnowledgeBase(str(tmp_path / "Knowledge.sqlite"))
+    knowledge_base.add("Quale fiume attraversa città Torino", ["po", "tevere", "arno"], 0)
+    knowledge_base.add("Quale anno fine guerra mondiale 1945", ["1945", "1918", "1939"], 0)
+    yield knowledge_base
+    knowledge_base.close()
+
+
+def test_near_duplicate(knowledge_base):
+    known = knowledge_base.find("quale fiume attraversa la città Torino?", "NON")
+    assert known is not None and known.similarity < 1
+    assert Knowledge.answer_position(known, ["arno", "po", "tevere"]) == 1
+    # The same question, but different answers
+    assert Knowledge.answer_position(known, ["arno", "tevere", "adige"]) is None
+
+def test_negated_near_duplicate_is_not_a_hit(knowledge_base):
+    # Almost the same words, but the correct answer of the stored one is the wrong one here
+    assert knowledge_base.find("Quale NON fiume attraversa città Torino", "NON") is None
+
+def test_other_numbers_are_not_a_hit(knowledge_base):
+    assert knowledge_base.find("Quale anno fine guerra mondiale 1918", "NON") is None
+    assert knowledge_base.find("Quale anno fine grande guerra mondiale 1945", "NON") is not None
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import pytest
+import Layout
+import numpy as np
+
+WIDTH, HEIGHT = 400, 700
+QUESTION = (40, 100, 360, 300)
+BUTTONS = [(40, 400 + 80 * position, 360, 460 + 80 * position) for position in range(3)]
+
+
+def frame(shift=0, question=True, buttons=BUTTONS):
+    # A light frame with dark outlines: the question's box, and the answers' buttons moved down by <shift>
+    screen = np.full((HEIGHT, WIDTH), 230, dtype=np.uint8)
+    if question:
+        cv2.rectangle(screen, QUESTION[:2], QUESTION[2:], 40, 3)
+    for x1, y1, x2, y2 in buttons:
+        cv2.rectangle(screen, (x1, y1 + shift), (x2, y2 + shift), 40, 3)
+    return screen
+
+def box(coordinate):
+    return (coordinate.x1, coordinate.y1, coordinate.x2, coordinate.y2)
+
+def near(found, expected, tolerance=5):
+    # The outline is a few pixels thick, its bounding box is around the drawn one
+    return all(abs(a - b) <= tolerance for a, b in zip(found, expected))
+
+
+def test_detect():
+    profile = Layout.detect(frame())
+    assert profile.size == (WIDTH, HEIGHT)
+    assert all(near(box(found), expected) for found, expected in zip(profile.answers, BUTTONS))
+    assert near(box(profile.question), QUESTION)
+
+def test_detect_question_fallback():
+    # No outline around the question: everything above the first answer
+    profile = Layout.detect(frame(question=False))
+    assert profile.question.x1 == profile.answers[0].x1 and profile.question.x2 == profile.answers[0].x2
+    assert profile.question.y2 == profile.answers[0].y1 - 1
+
+def test_detect_without_three_buttons():
+    with pytest.raises(ValueError):
+        Layout.detect(frame(buttons=BUTTONS[:2]))
+
+@pytest.mark.parametrize("shift", [0, 17, 40])
+def test_relocate(shift):
+    profile = Layout.detect(frame())
+    assert profile.relocate(frame(shift)) == shift
+
+def test_relocate_without_buttons():
+    profile = Layout.detect(frame())
+    assert profile.relocate(np.full((HEIGHT, WIDTH), 230, dtype=np.uint8)) is None
+
+def test_save_and_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(Layout, "LAYOUTS_PATH", str(tmp_path))
+    screen = frame()
+    detected = Layout.load_or_detect(screen, base_shift=5)
+    loaded = Layout.load_or_detect(frame(question=False))
+    assert loaded.size == detected.size and loaded.base_shift == 5
+    assert box(loaded.question) == box(detected.question)
+    assert [box(answer) for answer in loaded.answers] == [box(answer) for answer in detected.answers]
+    assert box(loaded.template_box) == box(detected.template_box)
+    assert np.array_equal(loaded.template, detected.template)
+    assert loaded.relocate(frame(23)) == 23
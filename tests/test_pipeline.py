@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import Coords
+import pytest
+import Scheduler
+import Pipeline
+import Scraping
+import Screenshot
+import numpy as np
+
+from Quiz import Quiz
+from Screenshot import Word
+from Coords import Coordinate
+from threading import Event
+from concurrent.futures import ThreadPoolExecutor
+
+
+@pytest.fixture
+def layout(monkeypatch):
+    # A question box and three answers' boxes, and the words of the whole window in them
+    monkeypatch.setattr(Coords, "question", Coordinate(0, 0, 300, 50))
+    monkeypatch.setattr(Coords, "answers", [Coordinate(0, 100 + 60 * position, 300, 140 + 60 * position) for position in range(3)])
+    monkeypatch.setattr(Coords, "answers_shift", [0, 0, 0, 0])
+    words = [
+        Word("Qual", 10, 10, 40, 30, 1), Word("è", 45, 10, 55, 30, 1), Word("la", 60, 10, 75, 30, 1),
+        Word("capitale?", 80, 10, 150, 30, 1),
+        Word("Roma", 10, 110, 60, 130, 2), Word("Milano", 10, 170, 70, 190, 3), Word("Napoli", 10, 230, 70, 250, 4),
+    ]
+    monkeypatch.setattr(Screenshot, "ocr_cache", None)
+    monkeypatch.setattr(Screenshot, "ocr_words", lambda image, config: words)
+    # A box at a time is not what --layout does
+    monkeypatch.setattr(Screenshot, "extract_question", None)
+    monkeypatch.setattr(Scraping, "search", lambda url, full_page=False: (list(), 1) if full_page else list())
+
+
+def test_layout(layout, tmp_path):
+    pool = ThreadPoolExecutor(max_workers=4)
+    quiz = Quiz(str(tmp_path))
+    question, speculation = Pipeline.start(pool, quiz, np.zeros((300, 300), dtype=np.uint8), layout=True)
+    speculation.result()
+    pool.shutdown()
+    assert question.get_text() == "Qual è la capitale?"
+    assert [question.get_answer(position).get_text() for position in range(3)] == ["roma", "milano", "napoli"]
+    # Cleaned before it's returned
+    assert question.get_cleaned_text() == "Qual capitale"
+
+
+def test_answer_given_up_is_never_guessed(monkeypatch, tmp_path):
+    # The first answer is still being read at the deadline: its empty text would be
+    # in every snippet, and get the most matches
+    stuck = Event()
+    def read_answer(screen, position, shift, profile=None):
+        if position == 0:
+            stuck.wait()
+        return ["", "roma", "milano"][position]
+    monkeypatch.setattr(Screenshot, "question_shift", lambda screen, profile=None: 0)
+    monkeypatch.setattr(Screenshot, "extract_question", lambda screen, profile=None: "Qual è la capitale d'Italia?")
+    monkeypatch.setattr(Screenshot, "read_answer", read_answer)
+    results = Scraping.parse_results(["La capitale è Roma", "Roma o Milano"])
+    monkeypatch.setattr(Scraping, "search", lambda url, full_page=False: (results, 100) if full_page else results)
+
+    pool = ThreadPoolExecutor(max_workers=4)
+    try:
+        deadline = Scheduler.Deadline(0.3, margin=0)
+        question, speculation = Pipeline.start(pool, Quiz(str(tmp_path)), np.zeros((10, 10), dtype=np.uint8), deadline=deadline)
+        decision = speculation.result(deadline)
+    finally:
+        stuck.set()
+        pool.shutdown()
+    assert question.get_answer(0).given_up
+    assert [question.get_answer(position).matches for position in range(3)] == [0, 2, 1]
+    assert (decision.strategy, decision.answer.get_text(), decision.reason) == ("match", "roma", "confident")
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from Quiz import Quiz, Question, QuestionBatch, CSV_HEADERS
+
+# A report written before the "Stop reason" column
+BASELINE_HEADERS = ','.join(CSV_HEADERS[:-1])
+BASELINE_ROW = "Chi ha scritto?,manzoni,dante,verga,Chi scritto,manzoni,dante,verga,1,1,True,True,0,0,0,True"
+
+
+def new_question(text, answers, correct):
+    question = Question(text)
+    question.set_cleaned_text(text)
+    for position, answer in enumerate(answers):
+        question.add_answer(answer, answer, position)
+        question.get_answer(position).score = 10 * (position + 1)
+    question.set_guessed_answer(1)
+    question.set_correct_answer(correct)
+    question.one_match = True
+    question.stop_reason = "confident"
+    return question
+
+
+def test_round_trip(tmp_path):
+    quiz = Quiz(str(tmp_path))
+    quiz.record(new_question("Chi ha scritto?", ["manzoni", "dante", "verga"], 1))
+    quiz.record(new_question("Quale capitale?", ["roma", "parigi", "londra"], 2))
+    quiz.close()
+
+    batch = QuestionBatch.from_reports([str(tmp_path)])
+    assert len(batch) == 2
+    question = batch.question(1)
+    assert question.get_text() == "Quale capitale?"
+    assert [question.get_answer(position).get_text() for position in range(3)] == ["roma", "parigi", "londra"]
+    assert [question.get_answer(position).score for position in range(3)] == [10, 20, 30]
+    assert (question.get_guessed_answer(), question.get_correct_answer()) == (1, 2)
+    assert question.one_match and question.stop_reason == "confident"
+    assert batch.columns["Quiz"] == [str(tmp_path)] * 2
+
+    # A question appended to the batch, without a quiz folder
+    batch.append(new_question("Chi ha dipinto?", ["giotto", "raffaello", "tiziano"], 3))
+    assert len(batch) == 3 and batch.columns["Quiz"][-1] == ''
+    assert batch.question(2).get_correct_answer() == 3
+
+def test_to_numpy(tmp_path):
+    batch = QuestionBatch()
+    batch.append(new_question("Chi ha scritto?", ["manzoni", "dante", "verga"], 1))
+    arrays = batch.to_numpy()
+    assert arrays["Correct answer"].dtype == np.int64
+    assert arrays["Score third answer"].tolist() == [30]
+    assert arrays["Did I guess?"].dtype == bool and arrays["Did I guess?"].tolist() == [True]
+    assert arrays["Question"].dtype == object and arrays["Question"].tolist() == ["Chi ha scritto?"]
+
+def test_baseline_report(tmp_path):
+    (tmp_path / "Report.csv").write_text(f"{BASELINE_HEADERS}\n{BASELINE_ROW}\n")
+    batch = QuestionBatch.from_reports([str(tmp_path)])
+    assert len(batch) == 1
+    question = batch.question(0)
+    assert question.get_answer(0).get_text() == "manzoni"
+    assert question.usual_question and question.stop_reason == ''
+    batch.append(new_question("Quale capitale?", ["roma", "parigi", "londra"], 2))
+    assert batch.columns["Stop reason"] == ['', "confident"]
+
+def test_no_reports(tmp_path):
+    batch = QuestionBatch.from_reports([str(tmp_path)])
+    assert len(batch) == 0
+    assert set(CSV_HEADERS) <= set(batch.to_numpy())
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import Report
+
+from Quiz import Quiz
+
+HEADERS = b"Question,First answer,Correct answer"
+
+
+def write(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_recover_baseline_report(tmp_path):
+    # Written before the CSV records ended with "\r\n": nothing to cut
+    content = HEADERS + b"\nChi ha scritto?,Manzoni,1\nQuale capitale?,Parigi,2\n"
+    path = write(tmp_path / "Report.csv", content)
+    assert Report.recover(path) == 2
+    assert (tmp_path / "Report.csv").read_bytes() == content
+
+def test_recover_baseline_report_cut_in_half(tmp_path):
+    content = HEADERS + b"\nChi ha scritto?,Manzoni,1\n"
+    path = write(tmp_path / "Report.csv", content + b"Quale capi")
+    assert Report.recover(path) == 1
+    assert (tmp_path / "Report.csv").read_bytes() == content
+
+def test_recover_report_cut_in_half(tmp_path):
+    content = HEADERS + b'\r\n"Chi ha\nscritto?",Manzoni,1\r\n'
+    path = write(tmp_path / "Report.csv", content + b'"Quale\ncapi')
+    assert Report.recover(path) == 1
+    assert (tmp_path / "Report.csv").read_bytes() == content
+
+def test_recover_without_record_end(tmp_path):
+    # Better a report to fix by hand than an empty one
+    path = write(tmp_path / "Report.csv", HEADERS)
+    assert Report.recover(path) == 0
+    assert (tmp_path / "Report.csv").read_bytes() == HEADERS
+
+def test_open_baseline_quiz(tmp_path):
+    content = HEADERS + b"\nChi ha scritto?,Manzoni,1\n"
+    write(tmp_path / "Report.csv", content)
+    quiz = Quiz(str(tmp_path))
+    assert quiz.answered == 1
+    assert (tmp_path / "Report.csv").read_bytes() == content
+
+def test_append_to_older_report(tmp_path):
+    # Written before the "Stop reason" column: the new rows match its headers
+    content = HEADERS + b"\nChi ha scritto?,Manzoni,1\n"
+    path = write(tmp_path / "Report.csv", content)
+    writer = Report.ReportWriter(path, ["Question", "First answer", "Stop reason", "Correct answer"])
+    writer.append(["Quale capitale?", "Parigi", "confident", 2])
+    writer.close()
+    assert (tmp_path / "Report.csv").read_bytes() == content + b"Quale capitale?,Parigi,2\r\n"
+    columns = Report.load_reports([str(tmp_path)])
+    assert columns["Question"] == ["Chi ha scritto?", "Quale capitale?"]
+    assert list(columns["Correct answer"]) == [1, 2]
+
+def test_load_reports_warns_about_mismatched_rows(tmp_path, capsys):
+    write(tmp_path / "Report.csv", HEADERS + b"\nChi ha scritto?,Manzoni,1\nQuale capitale?,Parigi,2,confident\n")
+    columns = Report.load_reports([str(tmp_path)])
+    assert columns["Question"] == ["Chi ha scritto?"]
+    assert "1 rows not matching its headers" in capsys.readouterr().out
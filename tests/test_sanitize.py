@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import re
+import pytest
+import Sanitize
+
+# Questions and answers read by the OCR, with the errors of the profile,
+# also the ones where a fix creates or hides another one
+QUESTIONS = [
+    "Qual è la città più popolosa\ndel mondo nel 20197",
+    "Chi ha scritto \"I promessi sposi\"?",
+    "Quale di questi NON è un fiume\nitaliano?",
+    "Come si chiama il cane di Topolino?",
+    "Chi è l'autore di-un viaggio\nin Italia?",
+    "In quale città si trova ia Mole Antonelliana?",
+    "Cosa significa sapen|n ‘latino’?",
+    "Chi ha dipinto ﬁori diun \x0cgiardino?",
+    "Quale città è la capitale\ndella Francia? |i",
+]
+ANSWERS = [
+    "tokyo", "la nuova delhi", "", "l'adige", "di-un viaggio", "per-la strada", "g“i",
+    "perla", "ii po", "|i po", "Ii ponte", "sapen", "sud-est", "ﬁat", "“i“", "città ‘del’ sole",
+]
+
+
+def legacy_fix(text):
+    # Sanitize as it was before the Normalizer: one str.replace for each OCR error
+    for find, replace in Sanitize.load_profile("ita")["ocr_common_errors"].items():
+        text = text.replace(find, replace)
+    return text
+
+def legacy_clean_question(text):
+    profile = Sanitize.load_profile("ita")
+    text = legacy_fix(text).replace("come si chiama", "nome")
+    four_digit_match = re.search(r"\d{4}7", text)
+    if four_digit_match:
+        span = four_digit_match.span()
+        text = text[:span[0]] + str(text[span[0]:span[1]].replace('7','')) + text[span[1]:]
+    accent_match = re.search(r"\s(é|è)[a-zA-Zèé]+", text)
+    if accent_match:
+        span = accent_match.span()
+        text = text[:span[0] + 2] + ' ' + text[span[0] + 2:]
+    words = text.split(' ')
+    for word in words[:]:
+        if word in profile["question_stopwords"]:
+            words.remove(word)
+    return ' '.join(words)
+
+def legacy_clean_answer(text):
+    if text == '': return "OCR Failed"
+    words = legacy_fix(text).split(' ')
+    for word in words[:]:
+        if word in Sanitize.load_profile("ita")["answer_stopwords"]:
+            words.remove(word)
+    return ' '.join(words)
+
+
+@pytest.fixture
+def normalizer():
+    return Sanitize.Normalizer(Sanitize.load_profile("ita"))
+
+
+@pytest.mark.parametrize("text", QUESTIONS)
+def test_clean_question_parity(normalizer, text):
+    assert normalizer.clean_question_text(text) == legacy_clean_question(text)
+
+@pytest.mark.parametrize("text", ANSWERS + QUESTIONS)
+def test_clean_answer_parity(normalizer, text):
+    assert normalizer.clean_answer_text(text) == legacy_clean_answer(text)
+
+def test_fix_ocr_errors_order(normalizer):
+    assert normalizer.fix_ocr_errors("di-un viaggio") == "diun viaggio"
+    assert normalizer.fix_ocr_errors("per-la strada") == "perla strada"
+    assert normalizer.fix_ocr_errors("g“i") == "glii"
+
+def test_compile_steps_chained_characters():
+    # "a" becomes "b" and then "c", like in the chain
+    steps = Sanitize.compile_steps({"a": "b", "b": "c", "x": "yy"})
+    assert len(steps) == 2
+    normalizer = Sanitize.Normalizer({**Sanitize.load_profile("ita"), "ocr_common_errors": {"a": "b", "b": "c"}})
+    assert normalizer.fix_ocr_errors("ab") == "cc"
+
+def test_english_keeps_ia():
+    # " ia " is the Italian article "la" misread, not an OCR error in English
+    normalizer = Sanitize.Normalizer(Sanitize.load_profile("eng"))
+    assert normalizer.fix_ocr_errors("Who founded the CIA ia agency?") == "Who founded the CIA ia agency"
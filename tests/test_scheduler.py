@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import Trace
+import pytest
+import Scraping
+import Scheduler
+
+from Quiz import Question
+from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
+
+
+@pytest.fixture
+def pool():
+    pool = ThreadPoolExecutor(max_workers=4)
+    yield pool
+    pool.shutdown()
+
+@pytest.fixture
+def question():
+    question = Question("Qual è la capitale d'Italia?")
+    for position, answer in enumerate(["roma", "milano", "napoli"]):
+        question.add_answer(answer, answer, position)
+    return question
+
+def fake_search(plain_results, concat_results):
+    # The plain query finds <plain_results>, every concatenated query <concat_results>, 100 in total
+    def search(url, full_page=False):
+        if full_page:
+            return Scraping.parse_results(concat_results), 100
+        return Scraping.parse_results(plain_results)
+    return search
+
+
+def test_match_decides(monkeypatch, pool, question):
+    monkeypatch.setattr(Scraping, "search", fake_search(["Roma è la capitale d'Italia"], []))
+    decision = Scheduler.Speculation(pool, question).result(Scheduler.Deadline(None))
+    assert (decision.strategy, decision.answer.get_text(), decision.reason) == ("match", "roma", "confident")
+
+def test_concat_tie_falls_back_to_match(monkeypatch, pool, question):
+    # Not confident enough, and the concatenated queries all score the same
+    monkeypatch.setattr(Scraping, "search", fake_search(["Roma è la capitale d'Italia"], []))
+    decision = Scheduler.Speculation(pool, question).result(Scheduler.Deadline(None), confidence=2)
+    assert (decision.strategy, decision.answer.get_text(), decision.reason) == ("match", "roma", "complete")
+    assert question.one_match
+
+def test_concat_tie_without_match(monkeypatch, pool, question):
+    monkeypatch.setattr(Scraping, "search", fake_search([], []))
+    decision = Scheduler.Speculation(pool, question).result(Scheduler.Deadline(None))
+    assert (decision.strategy, decision.answer, decision.reason) == (None, None, "complete")
+
+def test_fair_executor_traces_each_session_apart(tmp_path):
+    # Two sessions on the same thread of the pool, each one with its own tracer
+    executor = Scheduler.FairExecutor(1)
+    tracers = dict()
+
+    def session(name):
+        tracers[name] = Trace.Tracer()
+        tracers[name].enable(str(tmp_path / f"{name}.jsonl"))
+        Trace.use(tracers[name])
+        pool = executor.session(name)
+        for _ in range(3):
+            pool.submit(Trace.traced(name)(lambda: None)).result()
+
+    threads = [Thread(target=session, args=(name,)) for name in ("first", "second")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    executor.shutdown()
+    assert {name: {span["stage"] for span in tracer.flush()} for name, tracer in tracers.items()} == {"first": {"first"}, "second": {"second"}}
+    assert not Trace.tracer.spans
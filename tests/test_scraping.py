@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import zlib
+import pytest
+import Scraping
+import LocalServer
+
+from time import sleep
+from threading import Lock, Thread
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+
+class Handler(LocalServer.ResultHandler):
+    # The result pages of LocalServer, plus the replies the client has to deal with,
+    # counting the connections and the requests served at the same time
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/redirect":
+            return self.reply(302, b'', [("Location", "/search?q=redirected")])
+        if path == "/loop":
+            return self.reply(302, b'', [("Location", "/loop")])
+        if path == "/missing":
+            return self.reply(404, b'')
+        if path == "/deflate":
+            return self.reply(200, zlib.compress(b"deflated"), [("Content-Encoding", "deflate")])
+        if path == "/br":
+            from brotli import compress
+            return self.reply(200, compress(b"brotli"), [("Content-Encoding", "br")])
+        if path == "/close":
+            return self.reply(200, b"closed", [("Connection", "close")])
+        if path == "/drop":
+            # Closed right after the reply, without telling the client: a stale idle connection
+            self.reply(200, b"dropped")
+            self.close_connection = True
+            return
+        if path == "/slow":
+            with self.server.lock:
+                self.server.active += 1
+                self.server.max_active = max(self.server.max_active, self.server.active)
+            sleep(0.05)
+            with self.server.lock:
+                self.server.active -= 1
+            return self.reply(200, b"slow")
+        super().do_GET()
+
+    def reply(self, status, body, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture(scope="module")
+def local_server():
+    server = LocalServer.start(handler=Handler)
+    server.lock = Lock()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def server(local_server):
+    local_server.connections = local_server.active = local_server.max_active = 0
+    return local_server
+
+@pytest.fixture
+def client():
+    client = Scraping.HTTPClient(timeout=5, max_connections_per_host=2)
+    yield client
+    client.close()
+
+def url(server, path):
+    host, port = server.server_address
+    return f"http://{host}:{port}{path}"
+
+
+def test_keep_alive(server, client):
+    for query in ("uno", "due", "tre"):
+        assert b"Cerca con Google" in client.get(LocalServer.search_url(server) + query)
+    assert server.connections == 1
+
+def test_gzip(server, client):
+    assert "gzip" in client.headers["Accept-Encoding"]
+    page = client.get(LocalServer.search_url(server) + "promessi+sposi")
+    assert page == LocalServer.result_page("promessi sposi")
+
+def test_deflate(server, client):
+    assert client.get(url(server, "/deflate")) == b"deflated"
+
+def test_brotli(server, client):
+    pytest.importorskip("brotli")
+    assert "br" in client.headers["Accept-Encoding"]
+    assert client.get(url(server, "/br")) == b"brotli"
+
+def test_redirect(server, client):
+    page = client.get(url(server, "/redirect"))
+    assert page == LocalServer.result_page("redirected")
+
+def test_too_many_redirects(server, client):
+    with pytest.raises(HTTPError, match="Too many redirects"):
+        client.get(url(server, "/loop"))
+
+def test_http_error(server, client):
+    with pytest.raises(HTTPError) as error:
+        client.get(url(server, "/missing"))
+    assert error.value.code == 404
+
+def test_will_close(server, client):
+    assert client.get(url(server, "/close")) == b"closed"
+    # Not given back to the pool, the next request opens a new connection
+    assert all(idle.empty() for idle in client.idle.values())
+    client.get(url(server, "/deflate"))
+    assert server.connections == 2
+
+def test_retry_stale_connection(server, client):
+    assert client.get(url(server, "/drop")) == b"dropped"
+    # Give the server the time to close it
+    sleep(0.05)
+    assert client.get(url(server, "/deflate")) == b"deflated"
+    assert server.connections == 2
+
+def test_stale_new_connection_is_not_retried(client):
+    # Nobody listening: a new connection fails at once, without a retry
+    with pytest.raises(OSError):
+        client.get("http://127.0.0.1:9/search?q=x")
+
+def test_connections_per_host_limit(server, client):
+    threads = [Thread(target=client.get, args=(url(server, "/slow"),)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert server.max_active <= 2
+    assert server.connections <= 2
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import Cache
+import pytest
+import Screenshot
+import numpy as np
+
+from Screenshot import Word
+
+
+class WordsBackend:
+    # The words of pytesseract, each line a (block, paragraph, line) tuple
+    name = "pytesseract"
+
+    def __init__(self):
+        self.calls = 0
+
+    def image_to_words(self, image, config):
+        self.calls += 1
+        return [
+            Word("Chi", 10, 10, 30, 20, (1, 1, 1)),
+            Word("ha", 35, 10, 50, 20, (1, 1, 1)),
+            Word("scritto?", 10, 30, 60, 40, (1, 1, 2)),
+        ]
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = WordsBackend()
+    monkeypatch.setattr(Screenshot, "ocr_backend", backend)
+    # Memory only, the second read is a hit of the JSON saved by the first one
+    monkeypatch.setattr(Screenshot, "ocr_cache", Cache.OCRCache(path=None))
+    return backend
+
+
+def test_ocr_words_cache_round_trip(backend):
+    image = np.zeros((50, 80), dtype=np.uint8)
+    first = Screenshot.ocr_words(image, "--psm 11")
+    second = Screenshot.ocr_words(image, "--psm 11")
+    assert backend.calls == 1
+    assert second == first
+    assert all(isinstance(word.line, tuple) for word in second)
+    assert Screenshot.words_to_text(second, '\n') == "Chi ha\nscritto?"
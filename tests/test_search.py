@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import Search
+
+from time import sleep
+
+
+class SlowProvider(Search.Provider):
+    # A provider answering after <delay> seconds, without the network
+
+    def __init__(self, name, delay, rate=None, burst=4):
+        super().__init__(name, f"http://{name}/search?q=", rate, burst)
+        self.delay = delay
+        self.requests = 0
+
+    def get(self, client, url, taken=False):
+        if self.bucket and not taken:
+            self.bucket.acquire()
+        self.requests += 1
+        sleep(self.delay)
+        return self.name.encode()
+
+
+def backend(providers):
+    return Search.SearchBackend(providers, hedge_delay=0.01)
+
+
+def test_token_bucket_without_blocking():
+    bucket = Search.TokenBucket(rate=0.1, burst=2)
+    assert bucket.acquire(block=False) and bucket.acquire(block=False)
+    assert not bucket.acquire(block=False)
+
+def test_single_provider_is_not_hedged():
+    provider = SlowProvider("google", 0.1)
+    search = backend([provider])
+    assert search.get(None, "http://google/search?q=x") == (b"google", "google")
+    assert (provider.requests, search.hedged) == (1, 0)
+    search.close()
+
+def test_hedged_to_second_provider():
+    slow, fast = SlowProvider("google", 0.5), SlowProvider("mirror", 0.0)
+    search = backend([slow, fast])
+    assert search.get(None, "http://google/search?q=x") == (b"mirror", "mirror")
+    assert (search.hedged, search.hedge_wins, fast.requests) == (1, 1, 1)
+    search.close()
+
+def test_no_hedge_without_tokens():
+    slow, fast = SlowProvider("google", 0.1), SlowProvider("mirror", 0.0, rate=0.1, burst=1)
+    assert fast.take()
+    search = backend([slow, fast])
+    # The mirror is out of tokens: no duplicate waiting for the bucket
+    assert search.get(None, "http://google/search?q=x") == (b"google", "google")
+    assert (search.hedged, search.hedge_throttled, fast.requests) == (0, 1, 0)
+    search.close()
+
+def test_create_backend():
+    assert len(Search.create_backend(rate=10).providers) == 1
+    search = Search.create_backend(hedge_url="https://www.google.com/search?q=")
+    assert [provider.name for provider in search.providers] == ["google", "www.google.com"]
+    assert search.hedge